@@ -1,13 +1,20 @@
 from typing import Dict, Any, TypedDict, Annotated
-from langgraph.graph import StateGraph, END
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import logging
 import operator
-from .math_agent import MathAgent
-from .poem_agent import PoemAgent
-from .weather_agent import WeatherAgent
-from .code_agent import CodeAgent
-from .finance_agent import FinanceAgent
-from .news_agent import NewsAgent
-from .health_agent import HealthAgent
+import threading
+import time
+from .intent_router import IntentRouter
+from .registry import registry as default_registry, BUILTIN_AGENT_MODULES
+from utils.config import Config
+from utils.metrics import span
+from utils.llm_client import get_llm_client
+from utils.llm_scheduler import priority_var
+from utils.logging_setup import log_payload
+
+logger = logging.getLogger(__name__)
 
 # Define the state for our agent system
 class AgentState(TypedDict):
@@ -20,65 +27,96 @@ class AgentState(TypedDict):
     history: Annotated[list, operator.add]
     error: str
     context: dict
+    stream: bool
+    routes: list
+    partial_responses: Annotated[list, operator.add]
 
 class AgentOrchestrator:
-    def __init__(self, memory_manager):
+    def __init__(self, memory_manager, registry=None):
         self.memory_manager = memory_manager
         
-        # Initialize all agents
-        self.agents = {
-            "math_agent": MathAgent(),
-            "code_agent": CodeAgent(),
-            "finance_agent": FinanceAgent(),
-            "health_agent": HealthAgent(),
-            "poem_agent": PoemAgent(),
-            "weather_agent": WeatherAgent(),
-            "news_agent": NewsAgent()
-        }
+        # Agents register themselves when their module is imported; instances are
+        # only created once a message is routed to them
+        self.registry = registry or default_registry
+        self.registry.load(BUILTIN_AGENT_MODULES + Config.AGENT_MODULES)
+        self.agent_names = self.registry.names()
+        
+        # Compile every agent's routing keywords once, in priority order
+        routing_agents = self.registry.routing_agents()
+        self.router = IntentRouter(routing_agents)
+        if Config.SEMANTIC_ROUTING:
+            # Embedding tier for messages with no or several keyword matches
+            from .semantic_router import SemanticRouter
+            self.router = SemanticRouter(
+                self.router,
+                routing_agents,
+                threshold=Config.SEMANTIC_ROUTING_THRESHOLD,
+                cache_size=Config.SEMANTIC_ROUTING_CACHE_SIZE
+            )
         
-        # Build the LangGraph workflow
-        self.workflow = self._build_workflow()
-        print("✅ LangGraph AgentOrchestrator initialized with graph workflow")
+        # The LangGraph workflow is compiled on first use (or during warm-up);
+        # importing langgraph alone is most of the backend's import time
+        self._workflow = None
+        self._workflow_lock = threading.Lock()
+        logger.info("LangGraph AgentOrchestrator initialized")
+
+    @property
+    def workflow(self):
+        if self._workflow is None:
+            with self._workflow_lock:
+                if self._workflow is None:
+                    self._workflow = self._build_workflow()
+                    logger.info("LangGraph workflow compiled")
+        return self._workflow
+
+    def warm_up(self, connect: bool = True):
+        """Do the first-request work ahead of time: compile the graph, create every
+        agent and, with `connect`, open the shared LLM client's first connection"""
+        with span("warm_up", step="graph"):
+            self.workflow
+        router_warm_up = getattr(self.router, 'warm_up', None)
+        if router_warm_up:
+            with span("warm_up", step="router"):
+                router_warm_up()
+        for agent_name in self.agent_names:
+            with span("warm_up", step="agent", agent=agent_name):
+                self.registry.get(agent_name)
+        if connect:
+            with span("warm_up", step="llm_connection"):
+                get_llm_client().warm_up()
 
     def _build_workflow(self):
         """Build the LangGraph workflow with conditional routing"""
+        from langgraph.graph import StateGraph, END
+        from langchain_core.runnables import RunnableLambda
+        
         workflow = StateGraph(AgentState)
         
-        # Add nodes for each agent
-        workflow.add_node("router", self._route_message)
-        workflow.add_node("math_agent", self._call_math_agent)
-        workflow.add_node("code_agent", self._call_code_agent)
-        workflow.add_node("finance_agent", self._call_finance_agent)
-        workflow.add_node("health_agent", self._call_health_agent)
-        workflow.add_node("poem_agent", self._call_poem_agent)
-        workflow.add_node("weather_agent", self._call_weather_agent)
-        workflow.add_node("news_agent", self._call_news_agent)
+        # Add nodes for each agent; every node has a sync and an async implementation
+        # so the same graph serves workflow.invoke and workflow.ainvoke
+        workflow.add_node("router", RunnableLambda(self._route_message, afunc=self._route_message_async))
+        for agent_name in self.agent_names:
+            workflow.add_node(agent_name, self._agent_node(agent_name))
         workflow.add_node("fallback_agent", self._call_fallback_agent)
-        workflow.add_node("store_memory", self._store_in_memory)
+        workflow.add_node("merge_responses", self._merge_responses)
+        workflow.add_node("store_memory", RunnableLambda(self._store_in_memory, afunc=self._store_in_memory_async))
         
         # Set the entry point
         workflow.set_entry_point("router")
         
-        # Add conditional edges from router
+        # Add conditional edges from router; a multi-intent message fans out to
+        # several agent nodes that run as parallel branches
         workflow.add_conditional_edges(
             "router",
             self._should_route_to_agent,
-            {
-                "math_agent": "math_agent",
-                "code_agent": "code_agent",
-                "finance_agent": "finance_agent",
-                "health_agent": "health_agent",
-                "poem_agent": "poem_agent",
-                "weather_agent": "weather_agent",
-                "news_agent": "news_agent",
-                "fallback_agent": "fallback_agent"
-            }
+            self.agent_names + ["fallback_agent"]
         )
         
-        # Connect all agent nodes to memory storage
-        for agent_name in self.agents.keys():
-            workflow.add_edge(agent_name, "store_memory")
-        workflow.add_edge("fallback_agent", "store_memory")
+        # Connect all agent nodes to the merge step, then to memory storage
+        for agent_name in self.agent_names:
+            workflow.add_edge(agent_name, "merge_responses")
+        workflow.add_edge("fallback_agent", "merge_responses")
+        workflow.add_edge("merge_responses", "store_memory")
         
         # Connect memory storage to end
         workflow.add_edge("store_memory", END)
@@ -87,15 +125,47 @@ class AgentOrchestrator:
 
     def _route_message(self, state: AgentState) -> AgentState:
         """Router node - prepares context and determines initial routing"""
-        print(f"🔍 Routing message: '{state['message']}'")
+        logger.debug("Routing message")
         
         # Get conversation history
-        history = self.memory_manager.get_conversation_history(
-            state['user_id'], state['session_id']
-        )
+        with span("history_load"):
+            history = self.memory_manager.get_conversation_history(
+                state['user_id'], state['session_id']
+            )
+        return self._routed_state(state, history)
+
+    async def _route_message_async(self, state: AgentState) -> AgentState:
+        logger.debug("Routing message")
+        
+        # Memory lookups touch disk, keep them off the event loop
+        with span("history_load"):
+            history = await asyncio.to_thread(
+                self.memory_manager.get_conversation_history, state['user_id'], state['session_id']
+            )
+        return self._routed_state(state, history)
+
+    def _routed_state(self, state: AgentState, history: list) -> AgentState:
+        # Priority-based routing per intent; the news category comes out of the same pass
+        with span("routing"):
+            routes = [
+                {"agent": agent_name, "category": category, "message": text}
+                for agent_name, category, text in self.router.plan(state['message'], Config.MAX_PARALLEL_INTENTS)
+            ]
+        selected_agents = [route["agent"] for route in routes]
+        
+        if state.get('stream'):
+            from langgraph.config import get_stream_writer
+            # Tell the client which agents are answering before any tokens arrive
+            get_stream_writer()({
+                "event": "agent",
+                "agent": ",".join(selected_agents),
+                "agents": selected_agents,
+                "agent_used": " + ".join(self._display_name(name) for name in selected_agents)
+            })
         
         return {
-            **state,
+            "selected_agent": ",".join(selected_agents),
+            "routes": routes,
             "history": history,
             "context": {
                 "user_id": state['user_id'],
@@ -104,73 +174,83 @@ class AgentOrchestrator:
             }
         }
 
-    def _should_route_to_agent(self, state: AgentState) -> str:
-        """Conditional routing logic - determines which agent to use"""
-        message_lower = state['message'].lower()
-        
-        # Priority-based routing (same logic as before)
-        if MathAgent().should_handle(message_lower):
-            return "math_agent"
-        elif CodeAgent().should_handle(message_lower):
-            return "code_agent"
-        elif FinanceAgent().should_handle(message_lower):
-            return "finance_agent"
-        elif HealthAgent().should_handle(message_lower):
-            return "health_agent"
-        elif PoemAgent().should_handle(message_lower):
-            return "poem_agent"
-        elif WeatherAgent().should_handle(message_lower):
-            return "weather_agent"
-        elif NewsAgent().should_handle(message_lower):
-            return "news_agent"
-        else:
-            return "fallback_agent"
-
-    # Agent node functions
-    def _call_math_agent(self, state: AgentState) -> AgentState:
-        print("🎯 Executing Math Agent")
-        agent = self.agents["math_agent"]
-        response = agent.handle_message(state['message'], state['context'])
-        return {**state, "response": response, "agent_used": "Math Agent", "selected_agent": "math_agent"}
-
-    def _call_code_agent(self, state: AgentState) -> AgentState:
-        print("🎯 Executing Code Agent")
-        agent = self.agents["code_agent"]
-        response = agent.handle_message(state['message'], state['context'])
-        return {**state, "response": response, "agent_used": "Code Agent", "selected_agent": "code_agent"}
-
-    def _call_finance_agent(self, state: AgentState) -> AgentState:
-        print("🎯 Executing Finance Agent")
-        agent = self.agents["finance_agent"]
-        response = agent.handle_message(state['message'], state['context'])
-        return {**state, "response": response, "agent_used": "Finance Agent", "selected_agent": "finance_agent"}
-
-    def _call_health_agent(self, state: AgentState) -> AgentState:
-        print("🎯 Executing Health Agent")
-        agent = self.agents["health_agent"]
-        response = agent.handle_message(state['message'], state['context'])
-        return {**state, "response": response, "agent_used": "Health Agent", "selected_agent": "health_agent"}
-
-    def _call_poem_agent(self, state: AgentState) -> AgentState:
-        print("🎯 Executing Poem Agent")
-        agent = self.agents["poem_agent"]
-        response = agent.handle_message(state['message'], state['context'])
-        return {**state, "response": response, "agent_used": "Poem Agent", "selected_agent": "poem_agent"}
-
-    def _call_weather_agent(self, state: AgentState) -> AgentState:
-        print("🎯 Executing Weather Agent")
-        agent = self.agents["weather_agent"]
-        response = agent.handle_message(state['message'], state['context'])
-        return {**state, "response": response, "agent_used": "Weather Agent", "selected_agent": "weather_agent"}
-
-    def _call_news_agent(self, state: AgentState) -> AgentState:
-        print("🎯 Executing News Agent")
-        agent = self.agents["news_agent"]
-        response = agent.handle_message(state['message'], state['context'])
-        return {**state, "response": response, "agent_used": "News Agent", "selected_agent": "news_agent"}
+    def _display_name(self, agent_name: str) -> str:
+        if agent_name not in self.agent_names:
+            return "Fallback"
+        return self.registry.get(agent_name).get_agent_name()
+
+    def _should_route_to_agent(self, state: AgentState) -> list:
+        """Conditional routing logic - one branch per intent found by the router"""
+        from langgraph.types import Send
+        return [
+            Send(route["agent"], {
+                **state,
+                "message": route["message"],
+                "context": {**state["context"], "category": route["category"]}
+            })
+            for route in state["routes"]
+        ]
+
+    def _agent_node(self, agent_name: str):
+        """Graph node that runs one agent, sync or async"""
+        from langchain_core.runnables import RunnableLambda
+        
+        def call_agent(state: AgentState) -> AgentState:
+            agent = self.registry.get(agent_name)
+            logger.debug(f"Executing {agent.get_agent_name()}")
+            context, streamed = self._stream_context(state, agent_name)
+            with span("agent_node", agent=agent_name):
+                response = agent.handle_message(state['message'], context)
+            self._finish_stream(state, agent_name, streamed, response)
+            return self._partial_response(agent_name, response)
+        
+        async def call_agent_async(state: AgentState) -> AgentState:
+            agent = self.registry.get(agent_name)
+            logger.debug(f"Executing {agent.get_agent_name()}")
+            context, streamed = self._stream_context(state, agent_name)
+            with span("agent_node", agent=agent_name):
+                response = await agent.handle_message_async(state['message'], context)
+            self._finish_stream(state, agent_name, streamed, response)
+            return self._partial_response(agent_name, response)
+        
+        return RunnableLambda(call_agent, afunc=call_agent_async, name=agent_name)
+
+    def _partial_response(self, agent_name: str, response: str) -> dict:
+        # Parallel branches may only write to reducer fields of the state
+        return {"partial_responses": [{
+            "agent": agent_name,
+            "agent_used": self._display_name(agent_name),
+            "response": response
+        }]}
+
+    def _stream_context(self, state: AgentState, agent_name: str) -> tuple:
+        """Agent context with an on_token callback when the client asked for a stream"""
+        streamed = []
+        if not state.get('stream'):
+            return state['context'], streamed
+        
+        from langgraph.config import get_stream_writer
+        writer = get_stream_writer()
+        
+        def on_token(text: str):
+            streamed.append(text)
+            writer({"event": "token", "agent": agent_name, "text": text})
+        
+        return {**state['context'], "on_token": on_token}, streamed
+
+    def _finish_stream(self, state: AgentState, agent_name: str, streamed: list, response: str):
+        """Send whatever part of the final response was not streamed token by token"""
+        if not state.get('stream'):
+            return
+        sent = "".join(streamed)
+        # API-backed answers (weather, headlines, quotes) and appended text such as
+        # the health disclaimer never went through the LLM stream
+        if response.startswith(sent) and len(response) > len(sent):
+            from langgraph.config import get_stream_writer
+            get_stream_writer()({"event": "token", "agent": agent_name, "text": response[len(sent):]})
 
     def _call_fallback_agent(self, state: AgentState) -> AgentState:
-        print("🤖 Using Fallback Agent")
+        logger.debug("Using Fallback Agent")
         response = (
             "I'm sorry, this question is outside my domain expertise. "
             "I can help with:\n"
@@ -183,59 +263,225 @@ class AgentOrchestrator:
             "• ❤️ Health and wellness tips\n"
             "• 📄 Questions about uploaded documents"
         )
-        return {**state, "response": response, "agent_used": "Fallback", "selected_agent": "fallback_agent"}
+        self._finish_stream(state, "fallback_agent", [], response)
+        return self._partial_response("fallback_agent", response)
+
+    def _merge_responses(self, state: AgentState) -> AgentState:
+        """Combine the answers of every branch, in the order the intents were asked"""
+        order = [route["agent"] for route in state["routes"]]
+        partials = sorted(state["partial_responses"], key=lambda partial: order.index(partial["agent"]))
+        
+        if len(partials) == 1:
+            response = partials[0]["response"]
+        else:
+            response = "\n\n".join(f"{partial['agent_used']}:\n{partial['response']}" for partial in partials)
+        
+        return {
+            "response": response,
+            "agent_used": " + ".join(partial["agent_used"] for partial in partials),
+            "selected_agent": ",".join(partial["agent"] for partial in partials)
+        }
 
     def _store_in_memory(self, state: AgentState) -> AgentState:
         """Store the interaction in memory"""
-        print("💾 Storing interaction in memory")
-        self.memory_manager.store_interaction(
-            state['user_id'],
-            state['session_id'],
-            state['message'],
-            state['response'],
-            state['agent_used']
-        )
-        return state
+        logger.debug("Storing interaction in memory")
+        with span("memory_store"):
+            self.memory_manager.store_interaction(
+                state['user_id'],
+                state['session_id'],
+                state['message'],
+                state['response'],
+                state['agent_used']
+            )
+        return {}
+
+    async def _store_in_memory_async(self, state: AgentState) -> AgentState:
+        logger.debug("Storing interaction in memory")
+        with span("memory_store"):
+            await asyncio.to_thread(
+                self.memory_manager.store_interaction,
+                state['user_id'],
+                state['session_id'],
+                state['message'],
+                state['response'],
+                state['agent_used']
+            )
+        return {}
+
+    def _initial_state(self, user_id: str, message: str, session_id: str, stream: bool = False) -> AgentState:
+        return {
+            "user_id": user_id,
+            "session_id": session_id,
+            "message": message,
+            "selected_agent": "",
+            "response": "",
+            "agent_used": "",
+            "history": [],
+            "error": "",
+            "context": {},
+            "stream": stream,
+            "routes": [],
+            "partial_responses": []
+        }
+
+    def _result(self, final_state: AgentState, session_id: str) -> Dict[str, Any]:
+        result = {
+            "response": final_state["response"],
+            "agent_used": final_state["agent_used"],
+            "session_id": session_id
+        }
+        
+        log_payload(logger, "LangGraph result", result)
+        return result
+
+    def _error_result(self, error: Exception, session_id: str) -> Dict[str, Any]:
+        logger.error(f"Error in LangGraph process_message: {error}", exc_info=error)
+        
+        error_response = f"I apologize, but I encountered an error: {str(error)}"
+        return {
+            "response": error_response,
+            "agent_used": "Error",
+            "session_id": session_id
+        }
 
     def process_message(self, user_id: str, message: str, session_id: str = "default") -> Dict[str, Any]:
         """Process a message using the LangGraph workflow"""
         try:
-            print(f"🔄 LangGraph processing message for user {user_id}: '{message}'")
-            
-            # Prepare initial state
-            initial_state: AgentState = {
-                "user_id": user_id,
-                "session_id": session_id,
-                "message": message,
-                "selected_agent": "",
-                "response": "",
-                "agent_used": "",
-                "history": [],
-                "error": "",
-                "context": {}
-            }
+            logger.info(f"Processing message for user {user_id}")
+            log_payload(logger, "Message", message)
             
             # Execute the LangGraph workflow
-            final_state = self.workflow.invoke(initial_state)
+            final_state = self.workflow.invoke(self._initial_state(user_id, message, session_id))
+            return self._result(final_state, session_id)
             
-            # Prepare result
-            result = {
-                "response": final_state["response"],
-                "agent_used": final_state["agent_used"],
-                "session_id": session_id
-            }
+        except Exception as e:
+            return self._error_result(e, session_id)
+
+    async def process_message_async(self, user_id: str, message: str, session_id: str = "default") -> Dict[str, Any]:
+        """Process a message on the event loop; upstream calls never block a thread"""
+        try:
+            logger.info(f"Processing message for user {user_id}")
+            log_payload(logger, "Message", message)
+            
+            final_state = await self.workflow.ainvoke(self._initial_state(user_id, message, session_id))
+            return self._result(final_state, session_id)
+            
+        except Exception as e:
+            return self._error_result(e, session_id)
+
+    def process_message_stream(self, user_id: str, message: str, session_id: str = "default"):
+        """Run the workflow and yield stream events as they happen.
+
+        Events are dicts: one "agent" event once routing is done, "token" events
+        carrying response text, then a final "done" event with the same fields as
+        process_message (or an "error" event).
+        """
+        try:
+            logger.info(f"Streaming message for user {user_id}")
+            log_payload(logger, "Message", message)
+            
+            final_state = None
+            initial_state = self._initial_state(user_id, message, session_id, stream=True)
+            for mode, chunk in self.workflow.stream(initial_state, stream_mode=["custom", "values"]):
+                if mode == "custom":
+                    yield chunk
+                else:
+                    final_state = chunk
             
-            print(f"🎉 LangGraph result: {result}")
-            return result
+            yield {"event": "done", **self._result(final_state, session_id)}
             
         except Exception as e:
-            print(f"💥 Error in LangGraph process_message: {e}")
-            import traceback
-            traceback.print_exc()
+            yield {"event": "error", **self._error_result(e, session_id)}
+
+    async def process_message_stream_async(self, user_id: str, message: str, session_id: str = "default"):
+        """Async generator counterpart of process_message_stream"""
+        try:
+            logger.info(f"Streaming message for user {user_id}")
+            log_payload(logger, "Message", message)
+            
+            final_state = None
+            initial_state = self._initial_state(user_id, message, session_id, stream=True)
+            async for mode, chunk in self.workflow.astream(initial_state, stream_mode=["custom", "values"]):
+                if mode == "custom":
+                    yield chunk
+                else:
+                    final_state = chunk
             
-            error_response = f"I apologize, but I encountered an error: {str(e)}"
-            return {
-                "response": error_response,
-                "agent_used": "Error",
-                "session_id": session_id
-            }
\ No newline at end of file
+            yield {"event": "done", **self._result(final_state, session_id)}
+            
+        except Exception as e:
+            yield {"event": "error", **self._error_result(e, session_id)}
+
+    def _batch_item(self, index: int, start: float, result: Dict[str, Any] = None, error: str = None) -> Dict[str, Any]:
+        """One entry of a batch response; failures stay confined to their own item"""
+        if error is None:
+            item = {"index": index, "success": result["agent_used"] != "Error", **result}
+        else:
+            item = {"index": index, "success": False, "error": error}
+        item["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return item
+
+    def _batch_result(self, items: list, concurrency: int, start: float) -> Dict[str, Any]:
+        total = time.perf_counter() - start
+        elapsed = [item["elapsed_ms"] for item in items]
+        return {
+            "results": items,
+            "timing": {
+                "messages": len(items),
+                "succeeded": sum(1 for item in items if item["success"]),
+                "concurrency": concurrency,
+                "total_ms": round(total * 1000, 1),
+                "mean_item_ms": round(sum(elapsed) / len(elapsed), 1) if elapsed else 0.0,
+                "max_item_ms": max(elapsed, default=0.0),
+                "messages_per_second": round(len(items) / total, 2) if total > 0 else 0.0
+            }
+        }
+
+    def process_batch(self, user_id: str, messages: list, session_id: str = "default",
+                      concurrency: int = 4) -> Dict[str, Any]:
+        """Process several messages for one session, at most `concurrency` at a time.
+
+        Results come back in input order, one item per message, with aggregate timing.
+        """
+        logger.info(f"Processing batch of {len(messages)} messages for user {user_id} (concurrency {concurrency})")
+        start = time.perf_counter()
+        
+        def run_item(index, message):
+            # Batch items queue behind interactive chat for rate limit capacity
+            priority_var.set("batch")
+            item_start = time.perf_counter()
+            if not isinstance(message, str) or not message.strip():
+                return self._batch_item(index, item_start, error="Message must be a non-empty string")
+            try:
+                return self._batch_item(index, item_start, result=self.process_message(user_id, message, session_id))
+            except Exception as e:
+                return self._batch_item(index, item_start, error=str(e))
+        
+        # Worker threads start with an empty context; carry the request ID over
+        contexts = [contextvars.copy_context() for _ in messages]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            items = list(executor.map(lambda ctx, index, message: ctx.run(run_item, index, message),
+                                      contexts, range(len(messages)), messages))
+        return self._batch_result(items, concurrency, start)
+
+    async def process_batch_async(self, user_id: str, messages: list, session_id: str = "default",
+                                  concurrency: int = 4) -> Dict[str, Any]:
+        """Async counterpart of process_batch, bounded by a semaphore"""
+        logger.info(f"Processing batch of {len(messages)} messages for user {user_id} (concurrency {concurrency})")
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run_item(index, message):
+            async with semaphore:
+                priority_var.set("batch")
+                item_start = time.perf_counter()
+                if not isinstance(message, str) or not message.strip():
+                    return self._batch_item(index, item_start, error="Message must be a non-empty string")
+                try:
+                    result = await self.process_message_async(user_id, message, session_id)
+                    return self._batch_item(index, item_start, result=result)
+                except Exception as e:
+                    return self._batch_item(index, item_start, error=str(e))
+        
+        items = await asyncio.gather(*(run_item(index, message) for index, message in enumerate(messages)))
+        return self._batch_result(list(items), concurrency, start)
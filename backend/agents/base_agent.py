@@ -1,22 +1,40 @@
 from abc import ABC, abstractmethod
-from groq import Groq
-import os
+import asyncio
+import logging
+from utils.config import Config
+from utils.llm_client import get_llm_client, TruncatedCompletion
+from utils.single_flight import single_flight, payload_key
+
+logger = logging.getLogger(__name__)
 
 class BaseAgent(ABC):
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        # List of CURRENTLY AVAILABLE models (from your check_models.py)
-        self.available_models = [
-            "llama-3.3-70b-versatile",    # Most powerful available
-            "llama-3.1-8b-instant",       # Fast and reliable
-            "gemma2-9b-it",               # Google's model
-            "qwen/qwen3-32b",             # Alternative model
-        ]
+    # Routing metadata, compiled once into the orchestrator's IntentRouter
+    keywords = []
+    patterns = []
+    # Keyword hits only count when the message also contains a number
+    keywords_require_numbers = False
+    # Seconds LLM answers are kept in the response cache: None for LLM_CACHE_TTL,
+    # 0 for agents whose answers must always be fresh
+    cache_ttl = None
+    # Whether near-duplicate questions may be answered from the semantic cache
+    semantic_cache = True
+    # Graph node name, set by @register_agent
+    node_name = None
+
+    @classmethod
+    def routing_keywords(cls) -> list:
+        """All substrings that make should_handle() return True"""
+        return list(cls.keywords)
     
     @abstractmethod
     def get_agent_name(self):
         pass
     
+    @property
+    def caller(self) -> str:
+        """The agent's label in metrics and logs: its node name, as in the orchestrator's spans"""
+        return self.node_name or self.get_agent_name()
+    
     @abstractmethod
     def should_handle(self, message: str) -> bool:
         pass
@@ -25,26 +43,132 @@ class BaseAgent(ABC):
     def handle_message(self, message: str, context: dict = None) -> str:
         pass
     
-    def call_llm(self, prompt: str, system_message: str = None) -> str:
+    async def handle_message_async(self, message: str, context: dict = None) -> str:
+        """Async variant of handle_message; agents without one run the sync path in a worker thread"""
+        return await asyncio.to_thread(self.handle_message, message, context)
+    
+    def token_callback(self, context: dict = None):
+        """Streaming callback the orchestrator puts in the context for /api/chat/stream"""
+        return (context or {}).get('on_token')
+    
+    def build_messages(self, prompt: str, system_message: str = None) -> list:
         messages = []
         if system_message:
             messages.append({"role": "system", "content": system_message})
         messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def _semantic_cache(self):
+        """The semantic cache, unless it is off or this agent opts out"""
+        if not (Config.SEMANTIC_CACHE and self.semantic_cache and self.cache_ttl != 0):
+            return None
+        from utils.semantic_cache import get_semantic_cache
+        return get_semantic_cache()
+    
+    def _embed_query(self, cache, query: str):
+        try:
+            return cache.embed_query(query)
+        except Exception as e:
+            logger.warning(f"[{self.caller}] Semantic cache embedding failed: {e}")
+            return None
+    
+    def _all_models_failed(self) -> str:
+        return f"Error: All available models failed for {self.get_agent_name()}. Please check your Groq API configuration."
+    
+    def _cached_answer(self, messages: list, on_token):
+        """An exact-match cached answer, looked up before paying for an embedding"""
+        content = get_llm_client().cached(messages, caller=self.caller, cache_ttl=self.cache_ttl)
+        if content is not None and on_token:
+            on_token(content)
+        return content
+    
+    def _flight_key(self, messages: list) -> str:
+        return payload_key([self.caller, messages])
+    
+    def _truncated_answer(self, error: TruncatedCompletion, shared: bool, on_token) -> str:
+        """The partial text of a stream that broke off, marked as cut short; never cached"""
+        logger.warning(f"[{self.caller}] Answer cut short: {error}")
+        notice = "\n\n[The answer was interrupted by a model error. Please try again.]"
+        if on_token:
+            # Only the caller that made the call saw the partial text streamed
+            on_token(error.partial + notice if shared else notice)
+        return error.partial + notice
+    
+    def _finish_llm_call(self, content, shared: bool, on_token, cache, vector) -> str:
+        if content is None:
+            return self._all_models_failed()
+        if shared:
+            # Only the caller that made the call saw it streamed
+            if on_token:
+                on_token(content)
+        elif vector is not None:
+            cache.store(self.caller, vector, content)
+        return content
+    
+    def call_llm(self, prompt: str, system_message: str = None, on_token=None, query: str = None) -> str:
+        """Get a completion through the shared LLM client.
+
+        When on_token is given the completion is streamed and every text chunk is
+        passed to it as it arrives; the full text is still returned at the end.
+        `query` is the user's question as the semantic cache should compare it,
+        the prompt by default. Concurrent identical calls to this agent share
+        a single completion. The exact-match response cache is checked before
+        the question is embedded for the semantic cache.
+        """
+        messages = self.build_messages(prompt, system_message)
+        cache = self._semantic_cache()
+        vector = None
+        if cache:
+            content = self._cached_answer(messages, on_token)
+            if content is not None:
+                return content
+            vector = self._embed_query(cache, query or prompt)
+        if vector is not None:
+            cached = cache.lookup(self.caller, vector)
+            if cached is not None:
+                if on_token:
+                    on_token(cached)
+                return cached
+        
+        leader = []
+        
+        def complete():
+            leader.append(True)
+            return get_llm_client().complete(messages, caller=self.caller, on_token=on_token,
+                                             cache_ttl=self.cache_ttl)
+        
+        try:
+            content, shared = single_flight.do("llm", self._flight_key(messages), complete)
+        except TruncatedCompletion as e:
+            return self._truncated_answer(e, not leader, on_token)
+        return self._finish_llm_call(content, shared, on_token, cache, vector)
+    
+    async def call_llm_async(self, prompt: str, system_message: str = None, on_token=None, query: str = None) -> str:
+        messages = self.build_messages(prompt, system_message)
+        cache = self._semantic_cache()
+        vector = None
+        if cache:
+            content = self._cached_answer(messages, on_token)
+            if content is not None:
+                return content
+            # Embedding is CPU work, keep it off the event loop
+            vector = await asyncio.to_thread(self._embed_query, cache, query or prompt)
+        if vector is not None:
+            cached = cache.lookup(self.caller, vector)
+            if cached is not None:
+                if on_token:
+                    on_token(cached)
+                return cached
+        
+        leader = []
         
-        # Try each model until one works
-        for model in self.available_models:
-            try:
-                print(f"🤖 [{self.get_agent_name()}] Trying model: {model}")
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=1024
-                )
-                print(f"✅ [{self.get_agent_name()}] Model {model} succeeded!")
-                return response.choices[0].message.content
-            except Exception as e:
-                print(f"❌ [{self.get_agent_name()}] Model {model} failed: {str(e)}")
-                continue  # Try next model
+        def acomplete():
+            leader.append(True)
+            return get_llm_client().acomplete(messages, caller=self.caller, on_token=on_token,
+                                              cache_ttl=self.cache_ttl)
         
-        return f"Error: All available models failed for {self.get_agent_name()}. Please check your Groq API configuration."
\ No newline at end of file
+        try:
+            content, shared = await single_flight.do_async("llm", self._flight_key(messages), acomplete)
+        except TruncatedCompletion as e:
+            return self._truncated_answer(e, not leader, on_token)
+        return self._finish_llm_call(content, shared, on_token, cache, vector)
@@ -1,26 +1,35 @@
 from .base_agent import BaseAgent
+from .registry import register_agent
 
+@register_agent("code_agent", priority=20)
 class CodeAgent(BaseAgent):
+    keywords = [
+        'code', 'programming', 'function', 'debug', 'python', 'javascript', 'java',
+        'c++', 'html', 'css', 'sql', 'algorithm', 'bubble sort', 'quick sort',
+        'merge sort', 'binary search', 'data structure', 'stack', 'queue',
+        'linked list', 'array', 'variable', 'loop', 'if statement', 'class',
+        'object', 'api', 'framework', 'library', 'compile', 'syntax', 'error',
+        'exception', 'try catch', 'git', 'github', 'docker', 'kubernetes',
+        'backend', 'frontend', 'fullstack', 'web development', 'mobile app',
+        'database', 'mysql', 'mongodb', 'postgresql', 'orm', 'rest api',
+        'graphql', 'authentication', 'authorization', 'encryption', 'security',
+        'for loop', 'while loop', 'method', 'parameter', 'return', 'import',
+        'package', 'module', 'script', 'development', 'software', 'application'
+    ]
+
     def get_agent_name(self):
         return "Code Agent"
     
     def should_handle(self, message: str) -> bool:
-        code_keywords = [
-            'code', 'programming', 'function', 'debug', 'python', 'javascript', 'java',
-            'c++', 'html', 'css', 'sql', 'algorithm', 'bubble sort', 'quick sort',
-            'merge sort', 'binary search', 'data structure', 'stack', 'queue',
-            'linked list', 'array', 'variable', 'loop', 'if statement', 'class',
-            'object', 'api', 'framework', 'library', 'compile', 'syntax', 'error',
-            'exception', 'try catch', 'git', 'github', 'docker', 'kubernetes',
-            'backend', 'frontend', 'fullstack', 'web development', 'mobile app',
-            'database', 'mysql', 'mongodb', 'postgresql', 'orm', 'rest api',
-            'graphql', 'authentication', 'authorization', 'encryption', 'security',
-            'for loop', 'while loop', 'method', 'parameter', 'return', 'import',
-            'package', 'module', 'script', 'development', 'software', 'application'
-        ]
-        return any(keyword in message.lower() for keyword in code_keywords)
+        return any(keyword in message.lower() for keyword in self.keywords)
     
-    def handle_message(self, message: str, context: dict = None) -> str:
+    def build_prompt(self, message: str) -> tuple:
         system_msg = "You are an expert programming assistant. Help with code generation, debugging, and explanations. Provide clean, efficient code with examples."
         prompt = f"Help with this programming request: {message}"
-        return self.call_llm(prompt, system_msg)
\ No newline at end of file
+        return prompt, system_msg
+    
+    def handle_message(self, message: str, context: dict = None) -> str:
+        return self.call_llm(*self.build_prompt(message), on_token=self.token_callback(context), query=message)
+    
+    async def handle_message_async(self, message: str, context: dict = None) -> str:
+        return await self.call_llm_async(*self.build_prompt(message), on_token=self.token_callback(context), query=message)
\ No newline at end of file
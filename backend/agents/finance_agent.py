@@ -1,21 +1,34 @@
 from .base_agent import BaseAgent
-import yfinance as yf
+from .registry import register_agent
+import asyncio
+import logging
+import requests
+from utils.config import Config
+from utils.metrics import span
+from utils.single_flight import single_flight
 
+logger = logging.getLogger(__name__)
+
+@register_agent("finance_agent", priority=30)
 class FinanceAgent(BaseAgent):
+    # Quotes and market answers must be current; never answer from the response cache
+    cache_ttl = 0
+
+    keywords = [
+        'stock', 'price', 'finance', 'investment', 'market', 'bitcoin',
+        'crypto', 'currency', 'money', 'bank', 'loan', 'interest', 'compound',
+        'savings', 'budget', 'economy', 'trading', 'invest', 'portfolio',
+        'dividend', 'revenue', 'profit', 'loss', 'asset', 'liability',
+        'balance sheet', 'income statement', 'cash flow', 'roi', 'return',
+        'mutual fund', 'etf', 'bond', 'security', 'option', 'future',
+        'hedge fund', 'venture capital', 'ipo', 'merger', 'acquisition'
+    ]
+
     def get_agent_name(self):
         return "Finance Agent"
     
     def should_handle(self, message: str) -> bool:
-        finance_keywords = [
-            'stock', 'price', 'finance', 'investment', 'market', 'bitcoin',
-            'crypto', 'currency', 'money', 'bank', 'loan', 'interest', 'compound',
-            'savings', 'budget', 'economy', 'trading', 'invest', 'portfolio',
-            'dividend', 'revenue', 'profit', 'loss', 'asset', 'liability',
-            'balance sheet', 'income statement', 'cash flow', 'roi', 'return',
-            'mutual fund', 'etf', 'bond', 'security', 'option', 'future',
-            'hedge fund', 'venture capital', 'ipo', 'merger', 'acquisition'
-        ]
-        return any(keyword in message.lower() for keyword in finance_keywords)
+        return any(keyword in message.lower() for keyword in self.keywords)
     
     def handle_message(self, message: str, context: dict = None) -> str:
         # Only extract stock symbol if message is clearly about stock prices
@@ -25,9 +38,22 @@ class FinanceAgent(BaseAgent):
             if stock_data:
                 return self.format_stock_response(stock_data, symbol)
         
+        return self.call_llm(*self.build_prompt(message), on_token=self.token_callback(context))
+    
+    async def handle_message_async(self, message: str, context: dict = None) -> str:
+        symbol = self.extract_stock_symbol(message)
+        if symbol and self.is_stock_price_query(message):
+            # yfinance has no async API
+            stock_data = await asyncio.to_thread(self.get_stock_data, symbol)
+            if stock_data:
+                return self.format_stock_response(stock_data, symbol)
+        
+        return await self.call_llm_async(*self.build_prompt(message), on_token=self.token_callback(context))
+    
+    def build_prompt(self, message: str) -> tuple:
         system_msg = "You are a financial expert. Provide accurate financial information and market insights about stocks, investments, banking, and economic concepts."
         prompt = f"Provide financial information about: {message}"
-        return self.call_llm(prompt, system_msg)
+        return prompt, system_msg
     
     def extract_stock_symbol(self, message: str):
         words = message.upper().split()
@@ -44,10 +70,20 @@ class FinanceAgent(BaseAgent):
         return any(indicator in message_lower for indicator in price_indicators)
     
     def get_stock_data(self, symbol: str):
+        # Concurrent quotes for the same symbol share one lookup
+        stock_data, _ = single_flight.do("yfinance", symbol, lambda: self.fetch_stock_data(symbol))
+        return stock_data
+    
+    def fetch_stock_data(self, symbol: str):
+        if Config.STOCK_QUOTE_URL:
+            return self.fetch_quote(symbol)
+        # yfinance pulls in pandas; only pay for it once a quote is actually asked for
+        import yfinance as yf
         try:
-            stock = yf.Ticker(symbol)
-            info = stock.info
-            history = stock.history(period="1d")
+            with span("external_api", api="yfinance"):
+                stock = yf.Ticker(symbol)
+                info = stock.info
+                history = stock.history(period="1d")
             
             if history.empty:
                 return None
@@ -60,6 +96,24 @@ class FinanceAgent(BaseAgent):
         except:
             return None
     
+    def fetch_quote(self, symbol: str):
+        """Quote from the STOCK_QUOTE_URL service, in the same shape as the yfinance lookup"""
+        try:
+            with span("external_api", api="quote_service"):
+                response = requests.get(f"{Config.STOCK_QUOTE_URL.rstrip('/')}/{symbol}", timeout=10)
+            if response.status_code != 200:
+                logger.warning(f"Quote service error: {response.status_code}")
+                return None
+            quote = response.json()
+            return {
+                'current_price': quote['current_price'],
+                'change': quote['current_price'] - quote['open'],
+                'company_name': quote.get('company_name', 'N/A')
+            }
+        except Exception as e:
+            logger.warning(f"Quote service exception: {e}")
+            return None
+    
     def format_stock_response(self, data: dict, symbol: str) -> str:
         change_percent = (data['change'] / (data['current_price'] - data['change'])) * 100
         change_dir = "+" if data['change'] >= 0 else ""
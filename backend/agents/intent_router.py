@@ -0,0 +1,186 @@
+import re
+
+DEFAULT_CATEGORY = 'general'
+
+# Where a message may switch from one request to the next
+CLAUSE_SEPARATOR = re.compile(r'\s*(?:[,;]|\band\b|\balso\b|\bthen\b)\s*', re.IGNORECASE)
+# Word matching: text and keywords become space-separated words with a space at either end
+NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def padded_words(text: str) -> str:
+    return f" {NON_WORD.sub(' ', text).strip()} "
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over a set of keywords, compiled down to a DFA.
+
+    Each keyword carries a bitmask of labels. scan() walks the text once and
+    ORs together the labels of every keyword occurring anywhere in it, including
+    overlapping occurrences, so the result matches `keyword in text` checks.
+    """
+
+    def __init__(self, keyword_labels: dict):
+        goto = [{}]
+        output = [0]
+
+        # Build the keyword trie
+        for keyword, labels in keyword_labels.items():
+            state = 0
+            for ch in keyword:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    output.append(0)
+                state = next_state
+            output[state] |= labels
+
+        # Failure links in breadth-first order, folding the transitions of the
+        # failure state into each node so scanning never has to backtrack
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = []
+        for child in goto[0].values():
+            delta[child] = dict(delta[0])
+            delta[child].update(goto[child])
+            queue.append(child)
+        for state in queue:
+            for ch, child in goto[state].items():
+                fallback = delta[fail[state]].get(ch, 0)
+                fail[child] = fallback
+                output[child] |= output[fallback]
+                delta[child] = dict(delta[fallback])
+                delta[child].update(goto[child])
+                queue.append(child)
+
+        self._delta = delta
+        self._output = output
+
+    def scan(self, text: str) -> int:
+        delta = self._delta
+        output = self._output
+        state = 0
+        labels = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            labels |= output[state]
+        return labels
+
+
+class IntentRouter:
+    """Routes a message to an agent with a single pass over the text.
+
+    Built once from the agents' routing metadata (keywords, regex patterns and
+    optional category mappings); agents are given as (name, agent class) pairs in
+    priority order and the first one that would handle the message wins, exactly
+    like calling each agent's should_handle() in turn.
+    """
+
+    def __init__(self, agents: list):
+        self._labels = {}
+        keyword_labels = {}
+
+        def label(name):
+            if name not in self._labels:
+                self._labels[name] = 1 << len(self._labels)
+            return self._labels[name]
+
+        # The same keywords as whole words only, for deciding whether to split a message;
+        # ones that are not plain words (like "c++") never count as a whole-word match
+        word_labels = {}
+
+        def add_keyword(keyword, bit):
+            keyword_labels[keyword] = keyword_labels.get(keyword, 0) | bit
+            if re.fullmatch(r'[a-z0-9]+(?: [a-z0-9]+)*', keyword):
+                word = f" {keyword} "
+                word_labels[word] = word_labels.get(word, 0) | bit
+
+        # Any digit satisfies keywords_require_numbers
+        self._digit_bit = label('digit')
+        for digit in '0123456789':
+            keyword_labels[digit] = keyword_labels.get(digit, 0) | self._digit_bit
+
+        self._rules = []
+        for name, agent_cls in agents:
+            bit = label(name)
+            for keyword in agent_cls.routing_keywords():
+                add_keyword(keyword, bit)
+
+            pattern = None
+            if agent_cls.patterns:
+                pattern = re.compile('|'.join(f'(?:{p})' for p in agent_cls.patterns))
+
+            categories = []
+            for category, keywords in getattr(agent_cls, 'category_mapping', {}).items():
+                category_bit = label(f'{name}:{category}')
+                for keyword in keywords:
+                    add_keyword(keyword, category_bit)
+                categories.append((category, category_bit))
+
+            self._rules.append((name, bit, agent_cls.keywords_require_numbers, pattern, categories))
+
+        self._automaton = KeywordAutomaton(keyword_labels)
+        self._word_automaton = KeywordAutomaton(word_labels)
+
+    def scan(self, message: str, whole_words: bool = False) -> list:
+        """Return (agent name, category) for every matching agent in priority order.
+
+        Keywords match anywhere in the text, like should_handle(); with
+        `whole_words` only where they are words of their own, so "ai" does not
+        match "explain".
+        """
+        text = message.lower().strip()
+        labels = self._automaton.scan(text)
+        has_numbers = bool(labels & self._digit_bit)
+        if whole_words:
+            labels = self._word_automaton.scan(padded_words(text))
+
+        matches = []
+        for name, bit, require_numbers, pattern, categories in self._rules:
+            keyword_hit = bool(labels & bit) and (has_numbers or not require_numbers)
+            if not keyword_hit and not (pattern and pattern.search(text)):
+                continue
+
+            category = None
+            if categories:
+                category = next(
+                    (category for category, category_bit in categories if labels & category_bit),
+                    DEFAULT_CATEGORY
+                )
+            matches.append((name, category))
+        return matches
+
+    def route(self, message: str, default: str = "fallback_agent") -> tuple:
+        """Return (agent name, category) of the highest priority match"""
+        matches = self.scan(message)
+        return matches[0] if matches else (default, None)
+
+    def plan(self, message: str, max_intents: int = 3, default: str = "fallback_agent") -> list:
+        """Split a message into (agent name, category, text) routes, one per intent.
+
+        The message is cut into clauses at commas and conjunctions and each clause
+        is routed on its own, on whole-word keywords and patterns only. Only when
+        every clause has such a match and they resolve to different agents is the
+        message fanned out; otherwise it is routed whole, exactly like route().
+        """
+        routes = []
+        for clause in CLAUSE_SEPARATOR.split(message):
+            if not clause.strip():
+                continue
+            matches = self.scan(clause, whole_words=True)
+            if not matches:
+                # Part of the message has no clear intent of its own: keep it as one request
+                return [self.route(message, default) + (message,)]
+            agent, category = matches[0]
+            route = next((route for route in routes if route[0] == agent), None)
+            if route:
+                route[2].append(clause)
+            else:
+                routes.append([agent, category, [clause]])
+
+        if len(routes) < 2:
+            return [self.route(message, default) + (message,)]
+        return [(agent, category, " and ".join(clauses)) for agent, category, clauses in routes[:max_intents]]
@@ -1,60 +1,269 @@
 from .base_agent import BaseAgent
+from .registry import register_agent
 import re
+import ast
+import math
+import time
+import operator
+import threading
+from utils.metrics import metrics
 
+NUMBER = r'\d+(?:\.\d+)?'
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+FUNCTIONS = {
+    'sqrt': math.sqrt, 'cbrt': lambda x: math.copysign(abs(x) ** (1 / 3), x),
+    'exp': math.exp, 'ln': math.log, 'log': math.log10, 'log10': math.log10, 'log2': math.log2,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan, 'asin': math.asin, 'acos': math.acos, 'atan': math.atan,
+    'abs': abs, 'round': round, 'floor': math.floor, 'ceil': math.ceil, 'factorial': math.factorial,
+    'gcd': math.gcd, 'min': min, 'max': max, 'hypot': math.hypot, 'degrees': math.degrees, 'radians': math.radians
+}
+TRIG_FUNCTIONS = {'sin', 'cos', 'tan', 'asin', 'acos', 'atan'}
+CONSTANTS = {'pi': math.pi, 'e': math.e, 'tau': math.tau}
+
+# Keeps "2 ** 99999999" and "factorial(10**6)" from tying up a worker
+MAX_RESULT_BITS = 4096
+
+# Phrases around the expression itself: "what is ...?", "calculate ..."
+LEAD_IN = re.compile(r"^(?:(?:please|can you|could you|what is|what's|whats|how much is|calculate|compute|"
+                     r"evaluate|solve|find|tell me|give me|the value of|the result of)\s+)+")
+
+# Words for operators, longest phrases first
+WORD_OPERATORS = [
+    (r'\bto the power of\b', '**'), (r'\braised to(?: the)?\b', '**'), (r'\bmultiplied by\b', '*'),
+    (r'\bdivided by\b', '/'), (r'\bsquared\b', '**2'), (r'\bcubed\b', '**3'), (r'\btimes\b', '*'),
+    (r'\bplus\b', '+'), (r'\bminus\b', '-'), (r'\bmod(?:ulo)?\b', '%'),
+    (r'(?<=[\d)])\s*x\s*(?=[\d(])', '*'), ('×', '*'), ('÷', '/'), (r'\^', '**')
+]
+
+# Spelled-out operations on two numbers: "add 5 and 3", "subtract 10 from 20"
+WORD_OPERATIONS = [
+    (rf'^(?:add|sum(?: of)?|the sum of)\s+({NUMBER})\s+(?:and|to|plus)\s+({NUMBER})$', r'\1 + \2'),
+    (rf'^subtract\s+({NUMBER})\s+from\s+({NUMBER})$', r'\2 - \1'),
+    (rf'^(?:multiply|the product of|product of)\s+({NUMBER})\s+(?:by|and|with)\s+({NUMBER})$', r'\1 * \2'),
+    (rf'^divide\s+({NUMBER})\s+by\s+({NUMBER})$', r'\1 / \2'),
+]
+
+
+class FastPathUnsupported(ValueError):
+    """The message is not a plain expression the fast path can evaluate"""
+
+
+def _checked(value):
+    """Complex numbers and overflows to inf or nan are not answers the fast path should give"""
+    if isinstance(value, complex) or (isinstance(value, float) and not math.isfinite(value)):
+        raise FastPathUnsupported(f"no real, finite result: {value}")
+    return value
+
+
+def _evaluate(node):
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        return CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) > 1 and abs(left) > 1 and \
+                abs(right) * math.log2(abs(left)) > MAX_RESULT_BITS:
+            raise FastPathUnsupported("result too large")
+        return _checked(BINARY_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS \
+            and not node.keywords:
+        args = [_evaluate(arg) for arg in node.args]
+        if node.func.id == 'factorial' and (len(args) != 1 or (
+                args[0] > 1 and math.lgamma(args[0] + 1) / math.log(2) > MAX_RESULT_BITS)):
+            raise FastPathUnsupported("factorial too large")
+        return _checked(FUNCTIONS[node.func.id](*args))
+    raise FastPathUnsupported(f"unsupported syntax: {type(node).__name__}")
+
+
+def normalize_expression(message: str) -> tuple:
+    """(expression as the user wrote it, Python expression), or (None, None) when it is not one"""
+    shown = LEAD_IN.sub('', message.strip().lower()).strip()
+    # Trailing punctuation, except the ! of a factorial; "3!!" keeps its second ! and is declined
+    shown = re.sub(r'(?:(?<![\d!])!|[\s?.=])+$', '', shown)
+    expression = re.sub(r'(?<=\d),(?=\d{3}\b)', '', shown)
+    for pattern, replacement in WORD_OPERATIONS:
+        expression = re.sub(pattern, replacement, expression)
+    expression = re.sub(rf'\b(square root|sqrt) of\s*({NUMBER}|\([^()]*\))', r'sqrt(\2)', expression)
+    expression = re.sub(rf'\bcube root of\s*({NUMBER}|\([^()]*\))', r'cbrt(\1)', expression)
+    expression = re.sub(rf'\bfactorial of\s*({NUMBER})', r'factorial(\1)', expression)
+    expression = re.sub(rf'({NUMBER})!', r'factorial(\1)', expression)
+    # "20% of 150"; a % between two numbers stays modulo, and any other % ("100 - 20%") is
+    # left to the LLM, since it may mean 20% of 100 rather than 0.2
+    expression = re.sub(rf'({NUMBER})\s*%\s*of\b', r'\1/100*', expression)
+    for pattern, replacement in WORD_OPERATORS:
+        expression = re.sub(pattern, replacement, expression)
+    # "sqrt 16", "log 100"
+    expression = re.sub(rf'\b({"|".join(FUNCTIONS)})\s+({NUMBER})', r'\1(\2)', expression)
+    if not re.search(r'\d', expression) or not re.fullmatch(r'[\d\s.+\-*/%(),a-z_]+', expression):
+        return None, None
+    return shown, expression
+
+
+def evaluate_expression(expression: str):
+    """Value of an arithmetic expression, allowing only numbers, operators and whitelisted functions"""
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise FastPathUnsupported(str(e))
+    return _evaluate(tree)
+
+
+def format_number(value) -> str:
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return f"{value:.10g}"
+    return str(value)
+
+@register_agent("math_agent", priority=10)
 class MathAgent(BaseAgent):
+    # "what is 12 * 7" and "what is 12 * 8" embed almost identically
+    semantic_cache = False
+
+    # Common math patterns
+    patterns = [
+        # Basic arithmetic: "123 + 456", "5*3", "10/2"
+        r'\d+\s*[\+\-\*\/\=]\s*\d+',
+        # Questions with numbers: "what is 123 + 456", "calculate 5 times 3"
+        r'(what|calculate|solve|find).*\d+',
+        # Direct math questions: "add 5 and 3", "subtract 10 from 20"
+        r'(add|plus|sum|total|subtract|minus|multiply|times|divide).*\d+',
+        # Percentage questions: "what is 20% of 100"
+        r'\d+\s*%.*(of|from)',
+        # Simple number questions that are likely math
+        r'^\d+[\+\-\*\/]\d+$',
+        # Powers, roots and functions: "2^10", "sqrt(16)", "square root of 81"
+        r'\d+\s*(\^|\*\*)\s*\d+',
+        r'^\d+!$',
+        r'\b(sqrt|square root|cube root|factorial|log\d*|ln|sin|cos|tan|power of)\b.*\d'
+    ]
+
+    # Math keywords only count when the message also contains numbers
+    keywords = [
+        'calculate', 'solve', 'math', 'equation', 'formula', 'algebra',
+        'calculus', 'statistics', 'probability', 'trigonometry', 'geometry',
+        'addition', 'subtraction', 'multiplication', 'division', 'add', 'plus',
+        'minus', 'times', 'multiply', 'divide', 'sum', 'total', 'equals',
+        'answer', 'result', 'solution'
+    ]
+
+    keywords_require_numbers = True
+
+    # Simple word problems with numbers
+    word_problem_indicators = [
+        'has', 'gives', 'left', 'more', 'less', 'total', 'together', 
+        'each', 'share', 'divided', 'combined', 'remaining', 'spent',
+        'bought', 'sold', 'cost', 'price', 'amount'
+    ]
+
+    # Shared by every instance: hits and misses of the local fast path, the
+    # smoothed latency of LLM answers and the time the fast path saved
+    fast_path_stats = {"hits": 0, "misses": 0, "llm_latency": None, "saved_seconds": 0.0}
+    _stats_lock = threading.Lock()
+
+    @classmethod
+    def routing_keywords(cls) -> list:
+        return cls.keywords + cls.word_problem_indicators
+
     def get_agent_name(self):
         return "Math Agent"
     
     def should_handle(self, message: str) -> bool:
         message_lower = message.lower().strip()
         
-        # Common math patterns
-        math_patterns = [
-            # Basic arithmetic: "123 + 456", "5*3", "10/2"
-            r'\d+\s*[\+\-\*\/\=]\s*\d+',
-            # Questions with numbers: "what is 123 + 456", "calculate 5 times 3"
-            r'(what|calculate|solve|find).*\d+',
-            # Direct math questions: "add 5 and 3", "subtract 10 from 20"
-            r'(add|plus|sum|total|subtract|minus|multiply|times|divide).*\d+',
-            # Percentage questions: "what is 20% of 100"
-            r'\d+\s*%.*(of|from)',
-            # Simple number questions that are likely math
-            r'^\d+[\+\-\*\/]\d+$'
-        ]
-        
         # Check if any pattern matches
-        for pattern in math_patterns:
+        for pattern in self.patterns:
             if re.search(pattern, message_lower):
                 return True
         
-        # Check for math keywords in context
-        math_keywords = [
-            'calculate', 'solve', 'math', 'equation', 'formula', 'algebra',
-            'calculus', 'statistics', 'probability', 'trigonometry', 'geometry',
-            'addition', 'subtraction', 'multiplication', 'division', 'add', 'plus',
-            'minus', 'times', 'multiply', 'divide', 'sum', 'total', 'equals',
-            'answer', 'result', 'solution'
-        ]
-        
         # If message contains numbers and math keywords, it's likely math
         has_numbers = bool(re.search(r'\d+', message_lower))
-        has_math_keywords = any(keyword in message_lower for keyword in math_keywords)
+        has_math_keywords = any(keyword in message_lower for keyword in self.keywords)
         
-        # ADD THIS: Handle simple word problems with numbers
-        word_problem_indicators = [
-            'has', 'gives', 'left', 'more', 'less', 'total', 'together', 
-            'each', 'share', 'divided', 'combined', 'remaining', 'spent',
-            'bought', 'sold', 'cost', 'price', 'amount'
-        ]
-        if has_numbers and any(indicator in message_lower for indicator in word_problem_indicators):
+        if has_numbers and any(indicator in message_lower for indicator in self.word_problem_indicators):
             return True
         
         return has_numbers and has_math_keywords
     
-    def handle_message(self, message: str, context: dict = None) -> str:
+    def build_prompt(self, message: str) -> tuple:
         system_msg = """You are a helpful math expert. Provide clear, step-by-step solutions to mathematical problems. 
         For simple calculations, give the direct answer first, then show the steps if helpful.
         Be accurate and educational in your explanations."""
         
         prompt = f"Please solve this mathematical problem: {message}"
-        return self.call_llm(prompt, system_msg)
\ No newline at end of file
+        return prompt, system_msg
+    
+    def answer_directly(self, message: str):
+        """The answer to a plain calculation, worked out locally; None for anything the LLM should handle"""
+        start = time.perf_counter()
+        shown, expression = normalize_expression(message)
+        answer = None
+        if expression is not None:
+            try:
+                value = evaluate_expression(expression)
+                answer = f"{shown} = {format_number(value)}"
+                if TRIG_FUNCTIONS.intersection(re.findall(r'[a-z]+', expression)):
+                    answer += " (angles in radians)"
+            except ZeroDivisionError:
+                answer = f"{shown} is undefined: division by zero."
+            except (FastPathUnsupported, ValueError, TypeError, OverflowError):
+                answer = None
+        self._record_fast_path(answer is not None, time.perf_counter() - start)
+        return answer
+    
+    def _record_fast_path(self, hit: bool, seconds: float):
+        metrics.inc("math_fast_path_total", help_text="Math messages by whether they were answered locally",
+                    result="hit" if hit else "miss")
+        with self._stats_lock:
+            stats = self.fast_path_stats
+            stats["hits" if hit else "misses"] += 1
+            hit_rate = stats["hits"] / (stats["hits"] + stats["misses"])
+            saved = max(0.0, stats["llm_latency"] - seconds) if hit and stats["llm_latency"] else 0.0
+            stats["saved_seconds"] += saved
+        metrics.set_gauge("math_fast_path_hit_ratio", hit_rate,
+                          help_text="Share of math messages answered without the LLM")
+        if saved:
+            metrics.inc("math_fast_path_saved_seconds_total", saved,
+                        help_text="LLM time saved by answering math locally, at the average LLM latency")
+    
+    def _record_llm_latency(self, seconds: float):
+        with self._stats_lock:
+            stats = self.fast_path_stats
+            previous = stats["llm_latency"]
+            stats["llm_latency"] = seconds if previous is None else previous + 0.2 * (seconds - previous)
+    
+    def handle_message(self, message: str, context: dict = None) -> str:
+        on_token = self.token_callback(context)
+        answer = self.answer_directly(message)
+        if answer is not None:
+            if on_token:
+                on_token(answer)
+            return answer
+        start = time.perf_counter()
+        response = self.call_llm(*self.build_prompt(message), on_token=on_token)
+        self._record_llm_latency(time.perf_counter() - start)
+        return response
+    
+    async def handle_message_async(self, message: str, context: dict = None) -> str:
+        on_token = self.token_callback(context)
+        # Microseconds of CPU, fine to run on the event loop
+        answer = self.answer_directly(message)
+        if answer is not None:
+            if on_token:
+                on_token(answer)
+            return answer
+        start = time.perf_counter()
+        response = await self.call_llm_async(*self.build_prompt(message), on_token=on_token)
+        self._record_llm_latency(time.perf_counter() - start)
+        return response
\ No newline at end of file
@@ -1,138 +1,168 @@
 from .base_agent import BaseAgent
+from .registry import register_agent
 import requests
 import os
+import logging
+from utils.config import Config
+from utils.metrics import span
+from utils.single_flight import single_flight
+from utils.http_clients import get_async_client
 
+logger = logging.getLogger(__name__)
+
+@register_agent("news_agent", priority=70)
 class NewsAgent(BaseAgent):
+    # Headlines go stale within minutes; never answer from the response cache
+    cache_ttl = 0
+
+    # Expanded news and current events keywords
+    keywords = [
+        'news', 'headlines', 'latest', 'update', 'breaking', 'current events',
+        'politics', 'business', 'sports', 'technology', 'tech', 'entertainment',
+        'health', 'science', 'world', 'national', 'local', 'headline', 'report',
+        'coverage', 'journalism', 'media', 'press', 'bulletin', 'alert',
+        'developments', 'happening', 'occurring', 'incident', 'event'
+    ]
+
+    # Category-specific content that indicates news interest
+    category_indicators = [
+        # Sports
+        'football', 'basketball', 'soccer', 'baseball', 'tennis', 'cricket', 'golf',
+        'nfl', 'nba', 'mlb', 'nhl', 'fifa', 'uefa', 'tournament', 'match', 'game',
+        'score', 'player', 'team', 'championship', 'olympics', 'athlete', 'coach',
+        'stadium', 'arena', 'victory', 'defeat', 'record', 'statistics',
+        # Entertainment
+        'movie', 'film', 'tv', 'television', 'celebrity', 'hollywood', 'oscar',
+        'grammy', 'award', 'nomination', 'premiere', 'release', 'netflix',
+        'disney', 'marvel', 'actor', 'actress', 'singer', 'band', 'album',
+        'cinema', 'theater', 'director', 'producer', 'box office', 'trailer',
+        'red carpet', 'festival', 'broadway', 'series', 'episode', 'season',
+        # Technology
+        'apple', 'google', 'microsoft', 'iphone', 'android', 'ai', 'software',
+        'update', 'announcement', 'launch', 'product', 'computer', 'gadget',
+        'robot', 'drone', 'virtual reality', 'blockchain', 'crypto',
+        # Business
+        'stock', 'market', 'finance', 'economy', 'company', 'investment',
+        'bank', 'money', 'trading', 'revenue', 'profit', 'ceo', 'executive',
+        # Health
+        'medical', 'health', 'hospital', 'doctor', 'disease', 'treatment',
+        'vaccine', 'research', 'study', 'patient', 'fitness', 'wellness',
+        # Science
+        'science', 'space', 'nasa', 'research', 'discovery', 'climate',
+        'environment', 'physics', 'chemistry', 'biology', 'astronomy',
+        # Politics
+        'government', 'election', 'congress', 'senate', 'president', 'law',
+        'policy', 'democrat', 'republican', 'vote', 'campaign'
+    ]
+
+    # Checked in priority order by extract_category
+    category_mapping = {
+        'sports': [
+            'sports', 'football', 'basketball', 'soccer', 'baseball', 'tennis', 
+            'olympics', 'nfl', 'nba', 'mlb', 'hockey', 'cricket', 'golf', 
+            'athlete', 'game', 'match', 'tournament', 'championship', 'score',
+            'player', 'team', 'league', 'super bowl', 'world cup', 'nhl',
+            'fifa', 'uefa', 'premier league', 'champions league', 'ncaa',
+            'playoff', 'final', 'semifinal', 'quarterfinal', 'victory', 'defeat',
+            'coach', 'training', 'stadium', 'arena', 'olympic', 'paralympic',
+            'medal', 'gold', 'silver', 'bronze', 'record', 'statistics'
+        ],
+        'entertainment': [
+            'entertainment', 'movie', 'music', 'celebrity', 'hollywood', 
+            'tv', 'film', 'actor', 'actress', 'singer', 'band', 'album',
+            'release', 'premiere', 'oscar', 'grammy', 'award', 'show',
+            'netflix', 'disney', 'marvel', 'star wars', 'cinema', 'theater',
+            'director', 'producer', 'screen', 'box office', 'trailer',
+            'nomination', 'red carpet', 'festival', 'broadway', 'comedy',
+            'drama', 'action', 'horror', 'romance', 'documentary', 'series',
+            'episode', 'season', 'preview', 'review', 'critic', 'rating',
+            'soundtrack', 'concert', 'tour', 'performance', 'exhibition'
+        ],
+        'technology': [
+            'tech', 'technology', 'computer', 'software', 'ai', 
+            'artificial intelligence', 'gadget', 'iphone', 'android',
+            'google', 'microsoft', 'apple', 'facebook', 'twitter', 'instagram',
+            'internet', 'web', 'digital', 'innovation', 'startup', 'app',
+            'robot', 'drone', 'virtual reality', 'blockchain', 'crypto',
+            'iphone', 'ipad', 'macbook', 'windows', 'linux', 'programming',
+            'developer', 'code', 'update', 'announcement', 'launch', 'product'
+        ],
+        'business': [
+            'business', 'finance', 'economy', 'market', 'stock', 
+            'investment', 'money', 'bank', 'company', 'corporate', 'enterprise',
+            'entrepreneur', 'startup', 'wall street', 'trading', 'exchange',
+            'revenue', 'profit', 'loss', 'merger', 'acquisition', 'deal',
+            'ceo', 'executive', 'board', 'share', 'dividend', 'ipo'
+        ],
+        'health': [
+            'health', 'medical', 'medicine', 'hospital', 'doctor', 'nurse',
+            'fitness', 'wellness', 'disease', 'treatment', 'vaccine', 'clinic',
+            'nutrition', 'diet', 'exercise', 'mental health', 'therapy',
+            'surgery', 'patient', 'healthcare', 'pharmacy', 'drug', 'pill'
+        ],
+        'science': [
+            'science', 'research', 'discovery', 'space', 'nasa', 'esa',
+            'climate', 'environment', 'physics', 'chemistry', 'biology',
+            'astronomy', 'planet', 'universe', 'experiment', 'laboratory',
+            'scientist', 'researcher', 'theory', 'hypothesis', 'evidence'
+        ],
+        'politics': [
+            'politics', 'government', 'election', 'congress', 'senate',
+            'president', 'prime minister', 'law', 'policy', 'democrat',
+            'republican', 'vote', 'campaign', 'international', 'diplomacy',
+            'treaty', 'summit', 'parliament', 'senator', 'representative'
+        ]
+    }
+
+    @classmethod
+    def routing_keywords(cls) -> list:
+        return cls.keywords + cls.category_indicators
+
     def get_agent_name(self):
         return "News Agent"
     
     def should_handle(self, message: str) -> bool:
         message_lower = message.lower()
         
-        # Expanded news and current events keywords
-        news_keywords = [
-            'news', 'headlines', 'latest', 'update', 'breaking', 'current events',
-            'politics', 'business', 'sports', 'technology', 'tech', 'entertainment',
-            'health', 'science', 'world', 'national', 'local', 'headline', 'report',
-            'coverage', 'journalism', 'media', 'press', 'bulletin', 'alert',
-            'developments', 'happening', 'occurring', 'incident', 'event'
-        ]
-        
         # Check for news keywords
-        if any(keyword in message_lower for keyword in news_keywords):
+        if any(keyword in message_lower for keyword in self.keywords):
             return True
         
-        # Check for category-specific content that indicates news interest
-        category_indicators = [
-            # Sports
-            'football', 'basketball', 'soccer', 'baseball', 'tennis', 'cricket', 'golf',
-            'nfl', 'nba', 'mlb', 'nhl', 'fifa', 'uefa', 'tournament', 'match', 'game',
-            'score', 'player', 'team', 'championship', 'olympics', 'athlete', 'coach',
-            'stadium', 'arena', 'victory', 'defeat', 'record', 'statistics',
-            # Entertainment
-            'movie', 'film', 'tv', 'television', 'celebrity', 'hollywood', 'oscar',
-            'grammy', 'award', 'nomination', 'premiere', 'release', 'netflix',
-            'disney', 'marvel', 'actor', 'actress', 'singer', 'band', 'album',
-            'cinema', 'theater', 'director', 'producer', 'box office', 'trailer',
-            'red carpet', 'festival', 'broadway', 'series', 'episode', 'season',
-            # Technology
-            'apple', 'google', 'microsoft', 'iphone', 'android', 'ai', 'software',
-            'update', 'announcement', 'launch', 'product', 'computer', 'gadget',
-            'robot', 'drone', 'virtual reality', 'blockchain', 'crypto',
-            # Business
-            'stock', 'market', 'finance', 'economy', 'company', 'investment',
-            'bank', 'money', 'trading', 'revenue', 'profit', 'ceo', 'executive',
-            # Health
-            'medical', 'health', 'hospital', 'doctor', 'disease', 'treatment',
-            'vaccine', 'research', 'study', 'patient', 'fitness', 'wellness',
-            # Science
-            'science', 'space', 'nasa', 'research', 'discovery', 'climate',
-            'environment', 'physics', 'chemistry', 'biology', 'astronomy',
-            # Politics
-            'government', 'election', 'congress', 'senate', 'president', 'law',
-            'policy', 'democrat', 'republican', 'vote', 'campaign'
-        ]
-        
         # If message contains category indicators, it's likely news-related
-        if any(indicator in message_lower for indicator in category_indicators):
+        if any(indicator in message_lower for indicator in self.category_indicators):
             return True
         
         return False
     
     def handle_message(self, message: str, context: dict = None) -> str:
-        category = self.extract_category(message)
+        # The orchestrator's router resolves the category in the same pass as routing
+        category = (context or {}).get('category') or self.extract_category(message)
         news_data = self.get_news_data(category)
         
         if news_data:
             return self.format_news_response(news_data, category)
         else:
-            system_msg = "You are a news reporter. Provide current news and updates."
-            prompt = f"Tell me about recent news regarding: {message}"
-            return self.call_llm(prompt, system_msg)
+            return self.call_llm(*self.build_prompt(message), on_token=self.token_callback(context))
+    
+    async def handle_message_async(self, message: str, context: dict = None) -> str:
+        category = (context or {}).get('category') or self.extract_category(message)
+        news_data = await self.get_news_data_async(category)
+        
+        if news_data:
+            return self.format_news_response(news_data, category)
+        else:
+            return await self.call_llm_async(*self.build_prompt(message), on_token=self.token_callback(context))
+    
+    def build_prompt(self, message: str) -> tuple:
+        system_msg = "You are a news reporter. Provide current news and updates."
+        prompt = f"Tell me about recent news regarding: {message}"
+        return prompt, system_msg
     
     def extract_category(self, message: str) -> str:
         message_lower = message.lower()
         
-        category_mapping = {
-            'sports': [
-                'sports', 'football', 'basketball', 'soccer', 'baseball', 'tennis', 
-                'olympics', 'nfl', 'nba', 'mlb', 'hockey', 'cricket', 'golf', 
-                'athlete', 'game', 'match', 'tournament', 'championship', 'score',
-                'player', 'team', 'league', 'super bowl', 'world cup', 'nhl',
-                'fifa', 'uefa', 'premier league', 'champions league', 'ncaa',
-                'playoff', 'final', 'semifinal', 'quarterfinal', 'victory', 'defeat',
-                'coach', 'training', 'stadium', 'arena', 'olympic', 'paralympic',
-                'medal', 'gold', 'silver', 'bronze', 'record', 'statistics'
-            ],
-            'entertainment': [
-                'entertainment', 'movie', 'music', 'celebrity', 'hollywood', 
-                'tv', 'film', 'actor', 'actress', 'singer', 'band', 'album',
-                'release', 'premiere', 'oscar', 'grammy', 'award', 'show',
-                'netflix', 'disney', 'marvel', 'star wars', 'cinema', 'theater',
-                'director', 'producer', 'screen', 'box office', 'trailer',
-                'nomination', 'red carpet', 'festival', 'broadway', 'comedy',
-                'drama', 'action', 'horror', 'romance', 'documentary', 'series',
-                'episode', 'season', 'preview', 'review', 'critic', 'rating',
-                'soundtrack', 'concert', 'tour', 'performance', 'exhibition'
-            ],
-            'technology': [
-                'tech', 'technology', 'computer', 'software', 'ai', 
-                'artificial intelligence', 'gadget', 'iphone', 'android',
-                'google', 'microsoft', 'apple', 'facebook', 'twitter', 'instagram',
-                'internet', 'web', 'digital', 'innovation', 'startup', 'app',
-                'robot', 'drone', 'virtual reality', 'blockchain', 'crypto',
-                'iphone', 'ipad', 'macbook', 'windows', 'linux', 'programming',
-                'developer', 'code', 'update', 'announcement', 'launch', 'product'
-            ],
-            'business': [
-                'business', 'finance', 'economy', 'market', 'stock', 
-                'investment', 'money', 'bank', 'company', 'corporate', 'enterprise',
-                'entrepreneur', 'startup', 'wall street', 'trading', 'exchange',
-                'revenue', 'profit', 'loss', 'merger', 'acquisition', 'deal',
-                'ceo', 'executive', 'board', 'share', 'dividend', 'ipo'
-            ],
-            'health': [
-                'health', 'medical', 'medicine', 'hospital', 'doctor', 'nurse',
-                'fitness', 'wellness', 'disease', 'treatment', 'vaccine', 'clinic',
-                'nutrition', 'diet', 'exercise', 'mental health', 'therapy',
-                'surgery', 'patient', 'healthcare', 'pharmacy', 'drug', 'pill'
-            ],
-            'science': [
-                'science', 'research', 'discovery', 'space', 'nasa', 'esa',
-                'climate', 'environment', 'physics', 'chemistry', 'biology',
-                'astronomy', 'planet', 'universe', 'experiment', 'laboratory',
-                'scientist', 'researcher', 'theory', 'hypothesis', 'evidence'
-            ],
-            'politics': [
-                'politics', 'government', 'election', 'congress', 'senate',
-                'president', 'prime minister', 'law', 'policy', 'democrat',
-                'republican', 'vote', 'campaign', 'international', 'diplomacy',
-                'treaty', 'summit', 'parliament', 'senator', 'representative'
-            ]
-        }
-        
         # Check categories in priority order
-        for category, keywords in category_mapping.items():
+        for category, keywords in self.category_mapping.items():
             if any(keyword in message_lower for keyword in keywords):
                 return category
         
@@ -142,25 +172,53 @@ class NewsAgent(BaseAgent):
         api_key = os.getenv('NEWS_API_KEY')
         if not api_key:
             return None
-            
+        # A breaking story brings many identical headline requests at once; they share one
+        news_data, _ = single_flight.do("newsapi", category, lambda: self.fetch_news_data(category, api_key))
+        return news_data
+    
+    async def get_news_data_async(self, category: str = 'general'):
+        api_key = os.getenv('NEWS_API_KEY')
+        if not api_key:
+            return None
+        news_data, _ = await single_flight.do_async(
+            "newsapi", category, lambda: self.fetch_news_data_async(category, api_key)
+        )
+        return news_data
+    
+    def fetch_news_data(self, category: str, api_key: str):
         try:
-            # Build URL with category if specified
-            if category == 'general':
-                url = f"https://newsapi.org/v2/top-headlines?country=us&apiKey={api_key}"
+            with span("external_api", api="newsapi"):
+                response = requests.get(self.news_url(category, api_key), timeout=10)
+            if response.status_code == 200:
+                articles = response.json().get('articles', [])
+                return articles[:5]  # Return top 5 articles
             else:
-                url = f"https://newsapi.org/v2/top-headlines?country=us&category={category}&apiKey={api_key}"
-            
-            response = requests.get(url, timeout=10)
+                logger.warning(f"News API error: {response.status_code}")
+                return None
+        except Exception as e:
+            logger.warning(f"News API exception: {e}")
+            return None
+    
+    async def fetch_news_data_async(self, category: str, api_key: str):
+        try:
+            with span("external_api", api="newsapi"):
+                response = await get_async_client("newsapi").get(self.news_url(category, api_key))
             if response.status_code == 200:
                 articles = response.json().get('articles', [])
                 return articles[:5]  # Return top 5 articles
             else:
-                print(f"News API error: {response.status_code}")
+                logger.warning(f"News API error: {response.status_code}")
                 return None
         except Exception as e:
-            print(f"News API exception: {e}")
+            logger.warning(f"News API exception: {e}")
             return None
     
+    def news_url(self, category: str, api_key: str) -> str:
+        # Build URL with category if specified
+        if category == 'general':
+            return f"{Config.NEWS_API_URL}?country=us&apiKey={api_key}"
+        return f"{Config.NEWS_API_URL}?country=us&category={category}&apiKey={api_key}"
+    
     def format_news_response(self, articles: list, category: str) -> str:
         if not articles:
             return f"❌ No {category} news available at the moment."
@@ -1,19 +1,28 @@
 from .base_agent import BaseAgent
+from .registry import register_agent
 
+@register_agent("poem_agent", priority=50)
 class PoemAgent(BaseAgent):
+    keywords = [
+        'poem', 'poetry', 'verse', 'rhyme', 'write a poem', 'haiku', 
+        'sonnet', 'limerick', 'stanza', 'couplet', 'ode', 'ballad',
+        'create a poem', 'compose a poem', 'write poetry', '4-line rhyme',
+        'short poem', 'rhyming poem', 'poetic', 'verses'
+    ]
+
     def get_agent_name(self):
         return "Poem Agent"
     
     def should_handle(self, message: str) -> bool:
-        poem_keywords = [
-            'poem', 'poetry', 'verse', 'rhyme', 'write a poem', 'haiku', 
-            'sonnet', 'limerick', 'stanza', 'couplet', 'ode', 'ballad',
-            'create a poem', 'compose a poem', 'write poetry', '4-line rhyme',
-            'short poem', 'rhyming poem', 'poetic', 'verses'
-        ]
-        return any(keyword in message.lower() for keyword in poem_keywords)
+        return any(keyword in message.lower() for keyword in self.keywords)
     
-    def handle_message(self, message: str, context: dict = None) -> str:
+    def build_prompt(self, message: str) -> tuple:
         system_msg = "You are a creative poet. Write beautiful, engaging poems using creative language and consistent structure. Focus on the requested theme and format."
         prompt = f"Write a poem about: {message}"
-        return self.call_llm(prompt, system_msg)
\ No newline at end of file
+        return prompt, system_msg
+    
+    def handle_message(self, message: str, context: dict = None) -> str:
+        return self.call_llm(*self.build_prompt(message), on_token=self.token_callback(context), query=message)
+    
+    async def handle_message_async(self, message: str, context: dict = None) -> str:
+        return await self.call_llm_async(*self.build_prompt(message), on_token=self.token_callback(context), query=message)
\ No newline at end of file
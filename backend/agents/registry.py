@@ -0,0 +1,93 @@
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Modules whose agents ship with the platform; more can be added with AGENT_MODULES
+BUILTIN_AGENT_MODULES = [
+    "agents.math_agent",
+    "agents.code_agent",
+    "agents.finance_agent",
+    "agents.health_agent",
+    "agents.poem_agent",
+    "agents.weather_agent",
+    "agents.news_agent",
+]
+
+
+class AgentSpec:
+    """A registered agent: graph node name, routing priority and its class"""
+
+    def __init__(self, name: str, priority: int, agent_cls: type):
+        self.name = name
+        self.priority = priority
+        self.agent_cls = agent_cls
+
+
+class AgentRegistry:
+    """Agents declared with @register_agent, instantiated on first use.
+
+    The routing metadata (keywords, patterns, category mapping) lives on the
+    agent class, so the orchestrator can compile its router and graph from the
+    registry without creating a single agent. An agent object, with whatever
+    clients and libraries it sets up, is only built when a message is routed to it.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, priority: int, agent_cls: type):
+        existing = self._specs.get(name)
+        if existing and existing.agent_cls is not agent_cls:
+            raise ValueError(f"Agent name '{name}' is already registered by {existing.agent_cls.__name__}")
+        self._specs[name] = AgentSpec(name, priority, agent_cls)
+
+    def load(self, modules: list):
+        """Import agent modules so their @register_agent declarations run"""
+        for module in modules:
+            importlib.import_module(module)
+
+    def specs(self) -> list:
+        """Registered agents, highest priority (lowest number) first"""
+        return sorted(self._specs.values(), key=lambda spec: (spec.priority, spec.name))
+
+    def names(self) -> list:
+        return [spec.name for spec in self.specs()]
+
+    def routing_agents(self) -> list:
+        """(name, agent class) pairs in priority order, as the routers expect them"""
+        return [(spec.name, spec.agent_cls) for spec in self.specs()]
+
+    def get(self, name: str):
+        """The agent instance for `name`, created the first time it is asked for"""
+        agent = self._instances.get(name)
+        if agent is not None:
+            return agent
+        with self._lock:
+            agent = self._instances.get(name)
+            if agent is None:
+                spec = self._specs[name]
+                logger.info(f"Instantiating {spec.agent_cls.__name__} on first use")
+                agent = self._instances[name] = spec.agent_cls()
+        return agent
+
+    def instantiated(self) -> list:
+        return [name for name in self.names() if name in self._instances]
+
+
+registry = AgentRegistry()
+
+
+def register_agent(name: str, priority: int, agent_registry: AgentRegistry = None):
+    """Class decorator adding an agent to the registry under its graph node name.
+
+    Lower priorities are checked first when several agents match a message.
+    """
+    def decorator(agent_cls):
+        (agent_registry or registry).register(name, priority, agent_cls)
+        agent_cls.node_name = name
+        return agent_cls
+    return decorator
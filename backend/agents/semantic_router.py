@@ -0,0 +1,90 @@
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+from utils.embeddings import embed, normalize_message
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticRouter:
+    """Second routing tier that compares the message embedding with agent centroids.
+
+    The keyword router stays the first tier: a single keyword match is used as is.
+    Only when no agent or several agents match is the message embedded and scored
+    against every agent's centroid (one matrix-vector product). Decisions are kept
+    in an LRU keyed by the normalized message.
+    """
+
+    def __init__(self, keyword_router, agents: list, threshold: float = 0.35,
+                 cache_size: int = 4096, default: str = "fallback_agent"):
+        self.keyword_router = keyword_router
+        self.agents = agents
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.default = default
+        self._names = [name for name, _ in agents]
+        self._centroids = None
+        self._centroid_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _get_centroids(self) -> np.ndarray:
+        """Embed every agent's routing keywords once and stack the mean vectors"""
+        if self._centroids is None:
+            with self._centroid_lock:
+                if self._centroids is None:
+                    rows = []
+                    for name, agent_cls in self.agents:
+                        centroid = embed(agent_cls.routing_keywords()).mean(axis=0)
+                        rows.append(centroid / np.linalg.norm(centroid))
+                    self._centroids = np.vstack(rows).astype(np.float32)
+                    logger.info(f"Built semantic routing centroids for {len(rows)} agents")
+        return self._centroids
+
+    def warm_up(self):
+        """Load the embedding model and build the centroids ahead of the first request"""
+        self._get_centroids()
+
+    def route(self, message: str) -> tuple:
+        """Return (agent name, category) using keywords first, embeddings second"""
+        matches = self.keyword_router.scan(message)
+        if len(matches) == 1:
+            return matches[0]
+
+        key = normalize_message(message)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        try:
+            decision = self._semantic_route(key, matches)
+        except Exception as e:
+            logger.error(f"Semantic routing unavailable, using keyword routing: {e}")
+            return matches[0] if matches else (self.default, None)
+
+        with self._cache_lock:
+            self._cache[key] = decision
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return decision
+
+    def _semantic_route(self, text: str, matches: list) -> tuple:
+        scores = self._get_centroids() @ embed([text])[0]
+
+        if matches:
+            # Several keyword matches: let the embedding break the tie
+            return max(matches, key=lambda match: scores[self._names.index(match[0])])
+
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return (self.default, None)
+        return (self._names[best], None)
+
+    def plan(self, message: str, max_intents: int = 3) -> list:
+        """Multi-intent messages fan out on keywords; a single intent goes through route()"""
+        routes = self.keyword_router.plan(message, max_intents, self.default)
+        if len(routes) > 1:
+            return routes
+        return [self.route(message) + (message,)]
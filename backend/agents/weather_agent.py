@@ -1,27 +1,54 @@
 from .base_agent import BaseAgent
+from .registry import register_agent
 import requests
 import os
+import logging
+from utils.config import Config
+from utils.metrics import span
+from utils.single_flight import single_flight
+from utils.http_clients import get_async_client
 
+logger = logging.getLogger(__name__)
+
+@register_agent("weather_agent", priority=60)
 class WeatherAgent(BaseAgent):
+    # Conditions change by the hour; never answer from the response cache
+    cache_ttl = 0
+
+    keywords = [
+        'weather', 'temperature', 'forecast', 'rain', 'sunny', 'cloudy',
+        'humidity', 'wind', 'speed', 'climate', 'meteorology', 'storm',
+        'snow', 'fog', 'mist', 'drizzle', 'thunderstorm', 'hurricane',
+        'typhoon', 'cyclone', 'barometer', 'pressure', 'uv', 'index',
+        'dew point', 'visibility', 'precipitation', 'chance of rain'
+    ]
+
     def get_agent_name(self):
         return "Weather Agent"
     
     def should_handle(self, message: str) -> bool:
-        weather_keywords = [
-            'weather', 'temperature', 'forecast', 'rain', 'sunny', 'cloudy',
-            'humidity', 'wind', 'speed', 'climate', 'meteorology', 'storm',
-            'snow', 'fog', 'mist', 'drizzle', 'thunderstorm', 'hurricane',
-            'typhoon', 'cyclone', 'barometer', 'pressure', 'uv', 'index',
-            'dew point', 'visibility', 'precipitation', 'chance of rain'
-        ]
-        return any(keyword in message.lower() for keyword in weather_keywords)
+        return any(keyword in message.lower() for keyword in self.keywords)
     
     def handle_message(self, message: str, context: dict = None) -> str:
         location = self.extract_location(message)
         if not location:
-            return "Please specify a location for weather information. Example: 'weather in London' or 'temperature in Tokyo'"
+            return self.missing_location_response()
         
         weather_data = self.get_weather_data(location)
+        return self.build_response(weather_data, location)
+    
+    async def handle_message_async(self, message: str, context: dict = None) -> str:
+        location = self.extract_location(message)
+        if not location:
+            return self.missing_location_response()
+        
+        weather_data = await self.get_weather_data_async(location)
+        return self.build_response(weather_data, location)
+    
+    def missing_location_response(self) -> str:
+        return "Please specify a location for weather information. Example: 'weather in London' or 'temperature in Tokyo'"
+    
+    def build_response(self, weather_data, location: str) -> str:
         if weather_data:
             return self.format_weather_response(weather_data, location)
         else:
@@ -53,21 +80,52 @@ class WeatherAgent(BaseAgent):
         
         return None
     
+    def weather_url(self, location: str, api_key: str) -> str:
+        return f"{Config.OPENWEATHER_API_URL}?q={location}&appid={api_key}&units=metric"
+    
     def get_weather_data(self, location: str):
         api_key = os.getenv('OPENWEATHER_API_KEY')
         if not api_key:
             return None
-            
+        # Everyone asking about the same place at the same moment shares one request
+        weather_data, _ = single_flight.do(
+            "openweather", location.lower(), lambda: self.fetch_weather_data(location, api_key)
+        )
+        return weather_data
+    
+    async def get_weather_data_async(self, location: str):
+        api_key = os.getenv('OPENWEATHER_API_KEY')
+        if not api_key:
+            return None
+        weather_data, _ = await single_flight.do_async(
+            "openweather", location.lower(), lambda: self.fetch_weather_data_async(location, api_key)
+        )
+        return weather_data
+    
+    def fetch_weather_data(self, location: str, api_key: str):
+        try:
+            with span("external_api", api="openweather"):
+                response = requests.get(self.weather_url(location, api_key), timeout=10)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.warning(f"Weather API error: {response.status_code}")
+                return None
+        except Exception as e:
+            logger.warning(f"Weather API exception: {e}")
+            return None
+    
+    async def fetch_weather_data_async(self, location: str, api_key: str):
         try:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid={api_key}&units=metric"
-            response = requests.get(url, timeout=10)
+            with span("external_api", api="openweather"):
+                response = await get_async_client("openweather").get(self.weather_url(location, api_key))
             if response.status_code == 200:
                 return response.json()
             else:
-                print(f"Weather API error: {response.status_code}")
+                logger.warning(f"Weather API error: {response.status_code}")
                 return None
         except Exception as e:
-            print(f"Weather API exception: {e}")
+            logger.warning(f"Weather API exception: {e}")
             return None
     
     def format_weather_response(self, data: dict, location: str) -> str:
@@ -1,16 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from agents.agent_orchestrator import AgentOrchestrator  # ✅ Only one import
 from auth.auth import authenticate_user, register_user
 from auth.session_manager import SessionManager
-from memory.memory_manager import MemoryManager
+from memory.memory_manager import create_memory_manager
 from document_qa.document_processor import DocumentProcessor
+from utils.config import Config
+from utils.metrics import metrics
+from utils.llm_client import get_llm_client
+from utils.model_health import model_health
+from utils.logging_setup import setup_logging, start_request, request_id_var, log_payload
 import os
+import json
+import time
+import threading
 from dotenv import load_dotenv
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Queue-backed JSON logging; records are written by a background thread
+setup_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -19,9 +27,18 @@ app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key')
 CORS(app)
 
+@app.before_request
+def tag_request():
+    start_request(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def add_request_id(response):
+    response.headers['X-Request-ID'] = request_id_var.get()
+    return response
+
 # Initialize components
 try:
-    memory_manager = MemoryManager()
+    memory_manager = create_memory_manager()
     agent_orchestrator = AgentOrchestrator(memory_manager)
     document_processor = DocumentProcessor()
     session_manager = SessionManager()
@@ -30,6 +47,33 @@ except Exception as e:
     logger.error(f"Failed to initialize components: {e}")
     raise
 
+# Set once the optional warm-up is done; /api/health reports 503 until then
+ready = threading.Event()
+
+def warm_up():
+    try:
+        agent_orchestrator.warm_up(connect=Config.WARMUP_CONNECTIONS)
+        logger.info("Warm-up complete")
+    except Exception as e:
+        logger.exception(f"Warm-up failed: {e}")
+    finally:
+        ready.set()
+
+if Config.WARMUP_ON_START:
+    # In the background, so the server can already answer health checks
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+else:
+    ready.set()
+
+def expire_sessions():
+    while True:
+        time.sleep(Config.MEMORY_CLEANUP_INTERVAL)
+        memory_manager.cleanup_old_sessions(Config.MEMORY_SESSION_TTL_DAYS)
+
+if Config.MEMORY_SESSION_TTL_DAYS > 0:
+    # Cleanup pops expired sessions from an index in small slices, so requests are served meanwhile
+    threading.Thread(target=expire_sessions, name="memory-cleanup", daemon=True).start()
+
 @app.route('/')
 def home():
     return jsonify({"message": "AI Agent Platform API is running!", "status": "healthy"})
@@ -68,46 +112,115 @@ def login():
         logger.error(f"Login error: {e}")
         return jsonify({"success": False, "message": "Internal server error"}), 500
 
+def validate_chat_request(data, field='message'):
+    """Check a chat request body; returns (user_id, None) or (None, (error body, status))"""
+    if not data:
+        logger.info("Rejected chat request: no JSON data")
+        return None, ({'error': 'No JSON data provided'}, 400)
+    
+    session_id = data.get('session_id')
+    message = data.get(field)
+    
+    log_payload(logger, "Received chat request", {'session_id': session_id, field: message})
+    
+    if not session_id or not message:
+        logger.info(f"Rejected chat request: missing session_id or {field}")
+        return None, ({'error': f'Missing session_id or {field}'}, 400)
+    
+    session = session_manager.get_session(session_id)
+    if not session:
+        logger.info("Rejected chat request: invalid or expired session")
+        return None, ({'error': 'Invalid or expired session'}, 401)
+    
+    user_id = session['user_id']
+    logger.debug(f"Valid session for user: {user_id}")
+    return user_id, None
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
         data = request.get_json()
-        if not data:
-            print("❌ No JSON data received")
-            return jsonify({'error': 'No JSON data provided'}), 400
+        user_id, error = validate_chat_request(data)
+        if error:
+            body, status = error
+            return jsonify(body), status
         
-        session_id = data.get('session_id')
-        message = data.get('message')
+        session_id = data['session_id']
+        message = data['message']
         
-        print(f"📨 Received request - Session: {session_id}, Message: '{message}'")
-        
-        if not session_id or not message:
-            print("❌ Missing session_id or message")
-            return jsonify({'error': 'Missing session_id or message'}), 400
-        
-        session = session_manager.get_session(session_id)
-        if not session:
-            print("❌ Invalid or expired session")
-            return jsonify({'error': 'Invalid or expired session'}), 401
-        
-        user_id = session['user_id']
-        print(f"✅ Valid session for user: {user_id}")
-        
-        print(f"🔍 Processing message through agent orchestrator...")
         response = agent_orchestrator.process_message(user_id, message, session_id)
         
-        print(f"📤 Sending response: {response}")
+        log_payload(logger, "Sending chat response", response)
         return jsonify(response)
         
     except Exception as e:
-        print(f"💥 Chat endpoint error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Chat endpoint error: {e}")
         return jsonify({
             'response': f"I apologize, but I encountered an error: {str(e)}",
             'agent_used': 'Error', 
             'session_id': data.get('session_id') if data else 'unknown'
         }), 500
+
+def format_sse(event: dict) -> str:
+    """Encode one orchestrator stream event as a Server-Sent Event"""
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    try:
+        data = request.get_json()
+        user_id, error = validate_chat_request(data)
+        if error:
+            body, status = error
+            return jsonify(body), status
+        
+        events = agent_orchestrator.process_message_stream(user_id, data['message'], data['session_id'])
+        return Response(
+            stream_with_context(format_sse(event) for event in events),
+            mimetype='text/event-stream',
+            headers=SSE_HEADERS
+        )
+        
+    except Exception as e:
+        logger.exception(f"Chat stream endpoint error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def validate_batch_request(data):
+    """Check a batch chat body; returns (user_id, concurrency, None) or (None, None, (error body, status))"""
+    user_id, error = validate_chat_request(data, field='messages')
+    if error:
+        return None, None, error
+    
+    messages = data['messages']
+    if not isinstance(messages, list):
+        return None, None, ({'error': 'messages must be a list'}, 400)
+    if len(messages) > Config.BATCH_MAX_MESSAGES:
+        return None, None, ({'error': f'At most {Config.BATCH_MAX_MESSAGES} messages per batch'}, 400)
+    
+    try:
+        concurrency = int(data.get('concurrency', Config.BATCH_CONCURRENCY))
+    except (TypeError, ValueError):
+        return None, None, ({'error': 'concurrency must be an integer'}, 400)
+    return user_id, max(1, min(concurrency, Config.BATCH_MAX_CONCURRENCY)), None
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    try:
+        data = request.get_json()
+        user_id, concurrency, error = validate_batch_request(data)
+        if error:
+            body, status = error
+            return jsonify(body), status
+        
+        result = agent_orchestrator.process_batch(user_id, data['messages'], data['session_id'], concurrency)
+        return jsonify(result)
+        
+    except Exception as e:
+        logger.exception(f"Chat batch endpoint error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @app.route('/api/upload-document', methods=['POST'])
 def upload_document():
     try:
@@ -166,8 +279,57 @@ def logout():
         logger.error(f"Logout error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def require_admin():
+    """None when the request carries the admin token, otherwise an error response"""
+    if not Config.ADMIN_TOKEN:
+        return jsonify({'error': 'Admin API is disabled; set ADMIN_TOKEN to enable it'}), 403
+    if request.headers.get('X-Admin-Token') != Config.ADMIN_TOKEN:
+        return jsonify({'error': 'Invalid admin token'}), 401
+    return None
+
+@app.route('/api/admin/models', methods=['GET'])
+def admin_models():
+    error = require_admin()
+    if error:
+        return error
+    llm_client = get_llm_client()
+    return jsonify({
+        'order': model_health.order(llm_client.models, probe=False),
+        'models': model_health.snapshot(llm_client.models),
+        'connections': llm_client.stats()
+    })
+
+@app.route('/api/admin/cache', methods=['GET'])
+def admin_cache():
+    error = require_admin()
+    if error:
+        return error
+    from utils.semantic_cache import get_semantic_cache
+    semantic_cache = get_semantic_cache()
+    return jsonify({
+        'semantic_cache': {
+            'enabled': semantic_cache is not None,
+            'agents': semantic_cache.stats() if semantic_cache else {}
+        }
+    })
+
+@app.route('/api/admin/models/reset', methods=['POST'])
+def admin_reset_models():
+    error = require_admin()
+    if error:
+        return error
+    model = (request.get_json(silent=True) or {}).get('model')
+    model_health.reset(model)
+    return jsonify({'success': True, 'reset': model or 'all'})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    if not ready.is_set():
+        return jsonify({'status': 'warming_up', 'service': 'AI Agent Platform'}), 503
     return jsonify({
         'status': 'healthy', 
         'service': 'AI Agent Platform',
@@ -0,0 +1,99 @@
+"""
+ASGI entry point for the AI Agent Platform backend.
+
+Chat requests are served by the async orchestrator path, so a single event loop
+can hold many in-flight conversations while they wait on Groq and the external
+APIs. Every other route falls through to the Flask app.
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+from a2wsgi import WSGIMiddleware
+from app import (
+    app as flask_app, agent_orchestrator, validate_chat_request, validate_batch_request,
+    format_sse, SSE_HEADERS
+)
+from utils.logging_setup import start_request, log_payload
+from utils.http_clients import close_async_clients
+import logging
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+async def chat(request):
+    data = None
+    request_id = start_request(request.headers.get('X-Request-ID'))
+    try:
+        data = await request.json()
+        user_id, error = validate_chat_request(data)
+        if error:
+            body, status = error
+            return JSONResponse(body, status_code=status, headers={'X-Request-ID': request_id})
+
+        response = await agent_orchestrator.process_message_async(user_id, data['message'], data['session_id'])
+
+        log_payload(logger, "Sending chat response", response)
+        return JSONResponse(response, headers={'X-Request-ID': request_id})
+
+    except Exception as e:
+        logger.exception(f"Async chat endpoint error: {e}")
+        return JSONResponse({
+            'response': f"I apologize, but I encountered an error: {str(e)}",
+            'agent_used': 'Error',
+            'session_id': data.get('session_id') if isinstance(data, dict) else 'unknown'
+        }, status_code=500, headers={'X-Request-ID': request_id})
+
+
+async def chat_stream(request):
+    request_id = start_request(request.headers.get('X-Request-ID'))
+    try:
+        data = await request.json()
+    except Exception:
+        data = None
+    user_id, error = validate_chat_request(data)
+    if error:
+        body, status = error
+        return JSONResponse(body, status_code=status, headers={'X-Request-ID': request_id})
+
+    async def events():
+        async for event in agent_orchestrator.process_message_stream_async(user_id, data['message'], data['session_id']):
+            yield format_sse(event)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={**SSE_HEADERS, 'X-Request-ID': request_id})
+
+
+async def chat_batch(request):
+    request_id = start_request(request.headers.get('X-Request-ID'))
+    try:
+        data = await request.json()
+    except Exception:
+        data = None
+    user_id, concurrency, error = validate_batch_request(data)
+    if error:
+        body, status = error
+        return JSONResponse(body, status_code=status, headers={'X-Request-ID': request_id})
+
+    result = await agent_orchestrator.process_batch_async(user_id, data['messages'], data['session_id'], concurrency)
+    return JSONResponse(result, headers={'X-Request-ID': request_id})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_async_clients()
+
+
+app = Starlette(routes=[
+    Route('/api/chat', chat, methods=['POST']),
+    Route('/api/chat/stream', chat_stream, methods=['POST']),
+    Route('/api/chat/batch', chat_batch, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(flask_app)),
+], lifespan=lifespan)
+
+if __name__ == '__main__':
+    uvicorn.run(app, host='0.0.0.0', port=5000)
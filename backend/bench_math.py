@@ -0,0 +1,77 @@
+import os
+import time
+from dotenv import load_dotenv
+from agents.math_agent import MathAgent
+
+load_dotenv()
+
+# Calculations the fast path should answer, and word problems it must leave to the LLM
+MESSAGES = [
+    "what is 234 + 582",
+    "calculate 850 + 963",
+    "22 + 98",
+    "add 5 and 3",
+    "What is 20% of 150?",
+    "what is 2^10",
+    "square root of 144",
+    "cube root of 27",
+    "what is 12 x 7",
+    "subtract 10 from 20",
+    "what is 7 divided by 2",
+    "log10(1000)",
+    "Sarah has 12 apples and gives 5 to Tom. How many apples does she have left?",
+    "A shirt costs 25 dollars and is discounted by 20%, what is the final price?",
+    "solve 2x + 3 = 7",
+    "what is the derivative of x^2",
+]
+
+# Answers the fast path must get right, and expressions it must decline rather than answer wrongly
+ANSWERS = [
+    ("log(100)", "log(100) = 2"),
+    ("ln(100)", "ln(100) = 4.605170186"),
+    ("what is 5!?", "5! = 120"),
+]
+DECLINED = [
+    "(-8)**(1/3)",
+    "1e308*10",
+    "100 - 20%",
+    "3!!",
+    "factorial(1000)",
+]
+
+
+def bench_math(iterations: int = 1000):
+    print("⏱️ Benchmarking the MathAgent fast path...")
+    agent = MathAgent()
+    for message, answer in ANSWERS:
+        assert agent.answer_directly(message) == answer, message
+    for message in DECLINED:
+        assert agent.answer_directly(message) is None, message
+
+    answered = [message for message in MESSAGES if agent.answer_directly(message) is not None]
+    hit_rate = len(answered) / len(MESSAGES)
+    print(f"  {'hit rate on the sample messages':<40} {hit_rate:10.0%} ({len(answered)}/{len(MESSAGES)})")
+    for message in MESSAGES:
+        answer = agent.answer_directly(message)
+        print(f"    {'✅' if answer else '➡️ LLM'} {message!r}" + (f" → {answer}" if answer else ""))
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in answered:
+            agent.answer_directly(message)
+    fast = (time.perf_counter() - start) / (iterations * len(answered))
+    print(f"  {'fast path':<40} {fast * 1e6:10.2f} µs/message")
+
+    if os.getenv('GROQ_API_KEY'):
+        start = time.perf_counter()
+        for message in answered[:5]:
+            agent.call_llm(*agent.build_prompt(message))
+        llm = (time.perf_counter() - start) / min(5, len(answered))
+        print(f"  {'LLM answer':<40} {llm * 1e3:10.2f} ms/message")
+        print(f"  🚀 saved per answered message: {(llm - fast) * 1e3:.1f} ms ({llm / fast:,.0f}x faster)")
+    else:
+        print("  (set GROQ_API_KEY to compare with LLM answers)")
+
+
+if __name__ == "__main__":
+    bench_math()
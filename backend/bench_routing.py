@@ -0,0 +1,97 @@
+import os
+import time
+from dotenv import load_dotenv
+from agents.math_agent import MathAgent
+from agents.code_agent import CodeAgent
+from agents.finance_agent import FinanceAgent
+from agents.health_agent import HealthAgent
+from agents.poem_agent import PoemAgent
+from agents.weather_agent import WeatherAgent
+from agents.news_agent import NewsAgent
+from agents.intent_router import IntentRouter
+
+load_dotenv()
+
+AGENTS = [
+    ("math_agent", MathAgent),
+    ("code_agent", CodeAgent),
+    ("finance_agent", FinanceAgent),
+    ("health_agent", HealthAgent),
+    ("poem_agent", PoemAgent),
+    ("weather_agent", WeatherAgent),
+    ("news_agent", NewsAgent),
+]
+
+MESSAGES = [
+    "what is 234 + 582",
+    "Write a python function to reverse a linked list",
+    "What is the current AAPL stock price?",
+    "Give me some tips to improve my sleep quality",
+    "write a poem about the sea",
+    "weather in London",
+    "latest sports headlines",
+    "Tell me something interesting about octopuses",
+]
+
+# How plan() must split messages: single-intent requests whose keywords only occur
+# inside other words ("ai" in "explain") stay whole, real multi-intent ones fan out
+PLANS = [
+    ("Write a python function and explain the time complexity", ["code_agent"]),
+    ("Write a python function to reverse a list and explain how it works", ["code_agent"]),
+    ("Explain recursion, with an example in python", ["code_agent"]),
+    ("weather in Paris and the AAPL stock price", ["weather_agent", "finance_agent"]),
+    ("latest sports headlines and the weather in Tokyo", ["news_agent", "weather_agent"]),
+]
+
+
+def legacy_route(agents, message):
+    """The old per-message path: every agent re-scans its keyword lists"""
+    message_lower = message.lower()
+    for name, agent in agents:
+        if agent.should_handle(message_lower):
+            return name
+    return "fallback_agent"
+
+
+def legacy_route_with_construction(message):
+    """The old path including the per-message agent (and Groq client) construction"""
+    return legacy_route([(name, agent_cls()) for name, agent_cls in AGENTS], message)
+
+
+def bench(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in MESSAGES:
+            func(message)
+    elapsed = time.perf_counter() - start
+    per_message = elapsed / (iterations * len(MESSAGES)) * 1e6
+    print(f"  {label:<40} {per_message:10.2f} µs/message")
+    return per_message
+
+
+def bench_routing(iterations: int = 2000):
+    print("⏱️ Benchmarking message routing...")
+
+    start = time.perf_counter()
+    router = IntentRouter(AGENTS)
+    print(f"  {'IntentRouter build (once at startup)':<40} {(time.perf_counter() - start) * 1e3:10.2f} ms")
+
+    # Skip BaseAgent.__init__ so the keyword scans are measured on their own
+    prebuilt = [(name, agent_cls.__new__(agent_cls)) for name, agent_cls in AGENTS]
+    for message in MESSAGES:
+        assert router.route(message)[0] == legacy_route(prebuilt, message), message
+    for message, agents in PLANS:
+        assert [agent for agent, _, _ in router.plan(message)] == agents, message
+
+    legacy = bench("legacy keyword scans", lambda m: legacy_route(prebuilt, m), iterations)
+    compiled = bench("IntentRouter.route", router.route, iterations)
+    print(f"  🚀 speedup over keyword scans: {legacy / compiled:.1f}x")
+
+    if os.getenv('GROQ_API_KEY'):
+        bench("legacy incl. agent construction", legacy_route_with_construction, max(1, iterations // 100))
+    else:
+        print("  (set GROQ_API_KEY to also time the old per-message agent construction)")
+
+
+if __name__ == "__main__":
+    bench_routing()
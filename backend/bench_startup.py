@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Each probe runs in a fresh interpreter so nothing is already imported
+IMPORT_APP = """
+import time, json
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.agent_orchestrator.warm_up(connect=False)
+warmed = time.perf_counter()
+print(json.dumps({"import": imported - start, "warm_up": warmed - imported}))
+"""
+
+IMPORT_MODULE = """
+import time, json, importlib
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(json.dumps({{"import": time.perf_counter() - start}}))
+"""
+
+# Imported on first use instead of at startup
+DEFERRED_MODULES = ["langgraph.graph", "groq", "yfinance", "PyPDF2", "docx"]
+
+
+def run_probe(code: str) -> dict:
+    env = {**os.environ, "GROQ_API_KEY": os.getenv("GROQ_API_KEY") or "bench", "LOG_LEVEL": "WARNING"}
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median_ms(samples: list, key: str) -> float:
+    return statistics.median(sample[key] for sample in samples) * 1e3
+
+
+def bench_startup(runs: int = 5):
+    print(f"⏱️ Benchmarking backend startup (median of {runs} fresh interpreters)...")
+
+    samples = [run_probe(IMPORT_APP) for _ in range(runs)]
+    print(f"  {'import app':<40} {median_ms(samples, 'import'):10.1f} ms")
+    print(f"  {'warm-up without connections':<40} {median_ms(samples, 'warm_up'):10.1f} ms")
+
+    print("  Deferred to first use:")
+    for module in DEFERRED_MODULES:
+        try:
+            module_samples = [run_probe(IMPORT_MODULE.format(module=module)) for _ in range(runs)]
+        except subprocess.CalledProcessError:
+            print(f"    {module:<38} {'not installed':>10}")
+            continue
+        print(f"    {module:<38} {median_ms(module_samples, 'import'):10.1f} ms")
+
+
+if __name__ == "__main__":
+    bench_startup(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
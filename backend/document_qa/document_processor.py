@@ -1,17 +1,8 @@
-import PyPDF2
-import docx
 import os
-from groq import Groq
+from utils.llm_client import get_llm_client
 
 class DocumentProcessor:
     def __init__(self):
-        self.client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        self.available_models = [
-            "llama-3.3-70b-versatile",
-            "llama-3.1-8b-instant",
-            "gemma2-9b-it",
-            "qwen/qwen3-32b",
-        ]
         self.user_documents = {}
     
     def call_llm(self, prompt: str, system_message: str = None) -> str:
@@ -20,23 +11,12 @@ class DocumentProcessor:
             messages.append({"role": "system", "content": system_message})
         messages.append({"role": "user", "content": prompt})
         
-        # Try each model until one works
-        for model in self.available_models:
-            try:
-                print(f"📄 Trying model for document processing: {model}")
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.1,
-                    max_tokens=500
-                )
-                print(f"✅ Model {model} succeeded for document processing!")
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                print(f"❌ Model {model} failed for document processing: {str(e)}")
-                continue
-        
-        return "Error: All available models failed for document processing."
+        # Same pooled client and model fallback order as the agents
+        content = get_llm_client().complete(messages, caller="document_processor", temperature=0.1,
+                                            max_tokens=500, priority="document")
+        if content is None:
+            return "Error: All available models failed for document processing."
+        return content.strip()
     
     def process_document(self, user_id: str, file):
         """Process uploaded document and store text content"""
@@ -88,6 +68,7 @@ class DocumentProcessor:
     
     def extract_pdf_text(self, file_path: str) -> str:
         """Extract text from PDF file"""
+        import PyPDF2
         text = ""
         try:
             with open(file_path, 'rb') as file:
@@ -101,6 +82,7 @@ class DocumentProcessor:
     
     def extract_docx_text(self, file_path: str) -> str:
         """Extract text from Word document"""
+        import docx
         text = ""
         try:
             doc = docx.Document(file_path)
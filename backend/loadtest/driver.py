@@ -0,0 +1,334 @@
+"""Load driver for the backend API.
+
+Runs register, login, chat, chat_stream, upload and query scenarios against a
+running backend (normally started against loadtest/fake_services.py) at a
+target request rate, then reports throughput and latency percentiles per
+scenario:
+
+    python -m loadtest.driver --base-url http://127.0.0.1:5000 --rps 20 --duration 60
+
+Arrivals are open loop: requests start on schedule whether or not earlier ones
+have finished, so a slow backend shows up as latency instead of as a lower
+offered rate. `--max-in-flight` bounds the client; starts that had to wait for
+it are reported as late.
+"""
+import io
+import json
+import time
+import uuid
+import random
+import asyncio
+import zipfile
+import argparse
+import httpx
+
+MESSAGES = [
+    "what is 234 + 582",
+    "Write a python function to reverse a linked list",
+    "What is the current AAPL stock price?",
+    "Give me some tips to improve my sleep quality",
+    "write a poem about the sea",
+    "weather in London",
+    "latest sports headlines",
+    "Tell me something interesting about octopuses",
+]
+
+QUESTIONS = [
+    "What is this document about?",
+    "Summarize the main points",
+    "What does it say about the quarterly results?",
+]
+
+DEFAULT_MIX = "chat=55,chat_stream=10,query=15,login=10,upload=5,register=5"
+
+DOCUMENT_TEXT = [
+    "Quarterly report for the load test company.",
+    "Revenue grew by twelve percent while costs stayed flat.",
+    "The board approved a new office in Lisbon and two product launches.",
+]
+
+
+def make_docx(paragraphs: list) -> bytes:
+    """A minimal Word document, built with the standard library"""
+    body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+    files = {
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        ),
+        "word/document.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ),
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def percentile(ordered: list, share: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(share * len(ordered))) - 1))]
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for entry in mix.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip():
+            weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))} (known: {', '.join(SCENARIOS)})")
+    return weights
+
+
+class Results:
+    """Latencies and errors per scenario"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.late_starts = 0
+
+    def record(self, scenario: str, seconds: float, ok: bool):
+        if ok:
+            self.latencies.setdefault(scenario, []).append(seconds)
+        else:
+            self.errors[scenario] = self.errors.get(scenario, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        scenarios = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            ordered = sorted(self.latencies.get(name, []))
+            errors = self.errors.get(name, 0)
+            scenarios[name] = {
+                "requests": len(ordered) + errors,
+                "errors": errors,
+                "rps": round((len(ordered) + errors) / elapsed, 2),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+                "p90_ms": round(percentile(ordered, 0.90) * 1000, 1),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+                "max_ms": round((ordered[-1] if ordered else 0.0) * 1000, 1),
+            }
+        # Time to first token is a second measurement of chat_stream requests, not more requests
+        requests = [row for name, row in scenarios.items() if name in SCENARIOS]
+        total = sum(row["requests"] for row in requests)
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "errors": sum(row["errors"] for row in requests),
+            "throughput_rps": round(total / elapsed, 2),
+            "late_starts": self.late_starts,
+            "scenarios": scenarios,
+        }
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, results: Results, rng: random.Random):
+        self.client = client
+        self.results = results
+        self.rng = rng
+        # (email, password, session_id) of users that are logged in
+        self.users = []
+        self.run_id = uuid.uuid4().hex[:8]
+        self.document = make_docx(DOCUMENT_TEXT)
+
+    async def timed(self, scenario: str, request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.results.record(scenario, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def new_user(self) -> dict:
+        name = f"load-{self.run_id}-{uuid.uuid4().hex[:8]}"
+        return {"name": name, "email": f"{name}@loadtest.local", "password": "load-test"}
+
+    async def register(self, user: dict = None):
+        user = user or self.new_user()
+        response = await self.timed("register", self.client.post("/api/register", json=user))
+        return user if response is not None and response.json().get("success") else None
+
+    async def login(self, user: dict = None):
+        if user is None:
+            if not self.users:
+                return None
+            email, password, _ = self.rng.choice(self.users)
+            user = {"email": email, "password": password}
+        response = await self.timed("login", self.client.post(
+            "/api/login", json={"email": user["email"], "password": user["password"]}
+        ))
+        if response is None or not response.json().get("success"):
+            return None
+        return response.json()["session_id"]
+
+    def session(self):
+        return self.rng.choice(self.users)[2] if self.users else None
+
+    async def chat(self):
+        session_id = self.session()
+        if session_id:
+            await self.timed("chat", self.client.post(
+                "/api/chat", json={"session_id": session_id, "message": self.rng.choice(MESSAGES)}
+            ))
+
+    async def chat_stream(self):
+        """Streamed chat; also records the time to the first token as chat_stream_ttft"""
+        session_id = self.session()
+        if not session_id:
+            return
+        start = time.perf_counter()
+        first_token = None
+        ok = False
+        try:
+            async with self.client.stream("POST", "/api/chat/stream", json={
+                "session_id": session_id, "message": self.rng.choice(MESSAGES)
+            }) as response:
+                ok = response.status_code < 400
+                async for line in response.aiter_lines():
+                    if first_token is None and line.startswith("event: token"):
+                        first_token = time.perf_counter() - start
+        except httpx.HTTPError:
+            ok = False
+        self.results.record("chat_stream", time.perf_counter() - start, ok)
+        if ok and first_token is not None:
+            self.results.record("chat_stream_ttft", first_token, True)
+
+    async def upload(self, session_id: str = None):
+        session_id = session_id or self.session()
+        if session_id:
+            files = {"file": (f"report-{self.rng.randrange(3)}.docx", self.document,
+                              "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+            await self.timed("upload", self.client.post(
+                "/api/upload-document", data={"session_id": session_id}, files=files
+            ))
+
+    async def query(self):
+        session_id = self.session()
+        if session_id:
+            await self.timed("query", self.client.post(
+                "/api/query-document", json={"session_id": session_id, "question": self.rng.choice(QUESTIONS)}
+            ))
+
+    async def setup(self, users: int):
+        """Register and log in the user pool, each with one uploaded document.
+
+        One user at a time: registration rewrites users.json without a lock, so
+        concurrent registrations fail with 500s that would leave the pool short.
+        """
+        for _ in range(users):
+            user = await self.register()
+            session_id = await self.login(user) if user else None
+            if session_id:
+                await self.upload(session_id)
+                self.users.append((user["email"], user["password"], session_id))
+
+    async def run(self, rps: float, duration: float, mix: dict, max_in_flight: int):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        in_flight = asyncio.Semaphore(max_in_flight)
+        tasks = []
+
+        async def start(scenario: str):
+            if in_flight.locked():
+                self.results.late_starts += 1
+            async with in_flight:
+                await getattr(self, scenario)()
+
+        begin = time.perf_counter()
+        count = int(rps * duration)
+        for index in range(count):
+            # Evenly spaced arrivals; sleeping until the slot keeps the rate from drifting
+            delay = begin + index / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            scenario = self.rng.choices(names, weights)[0]
+            tasks.append(asyncio.ensure_future(start(scenario)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - begin
+
+
+SCENARIOS = ["register", "login", "chat", "chat_stream", "upload", "query"]
+
+
+def print_report(report: dict):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']}s: {report['throughput_rps']} req/s, "
+          f"{report['errors']} errors, {report['late_starts']} late starts")
+    print(f"  {'scenario':<18}{'requests':>9}{'errors':>8}{'req/s':>8}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in report["scenarios"].items():
+        print(f"  {name:<18}{row['requests']:>9}{row['errors']:>8}{row['rps']:>8}"
+              f"{row['p50_ms']:>10}{row['p90_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    if report.get("upstream_calls"):
+        print(f"  upstream calls: {report['upstream_calls']}")
+
+
+async def main_async(args):
+    results = Results()
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        load_test = LoadTest(client, results, random.Random(args.seed))
+        await load_test.setup(args.users)
+        if len(load_test.users) < args.users:
+            failed = ", ".join(f"{name} {count}" for name, count in sorted(results.errors.items()))
+            raise SystemExit(f"Only {len(load_test.users)} of {args.users} users could be set up at {args.base_url} "
+                             f"(failed requests: {failed or 'none'})")
+        print(f"{len(load_test.users)} users ready; running {args.rps} req/s for {args.duration}s")
+        # Setup traffic is not part of the measurement
+        results.latencies.clear()
+        results.errors.clear()
+        elapsed = await load_test.run(args.rps, args.duration, parse_mix(args.mix), args.max_in_flight)
+
+    report = results.report(elapsed)
+    if args.fakes_url:
+        try:
+            report["upstream_calls"] = httpx.get(f"{args.fakes_url.rstrip('/')}/stats", timeout=5).json()
+        except httpx.HTTPError:
+            pass
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive register/login/chat/upload/query load against the backend")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--rps", type=float, default=10.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--users", type=int, default=20, help="users registered and logged in up front")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. chat=80,query=20")
+    parser.add_argument("--max-in-flight", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--fakes-url", help="fake services URL, to report how many upstream calls were made")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Local stand-ins for every upstream API the backend calls, for load tests.
+
+One threaded HTTP server answers, on a single port:
+
+* Groq chat completions (plain and streamed) and the model list, with
+  configurable latency, per-token streaming delay and injected 429s and 500s
+* NewsAPI top headlines
+* OpenWeather current weather
+* a quote service replacing yfinance (GET /quote/<symbol>)
+
+Start it with `python -m loadtest.fake_services --port 8900` and start the
+backend against it:
+
+    GROQ_API_KEY=fake GROQ_BASE_URL=http://127.0.0.1:8900 \\
+    NEWS_API_KEY=fake NEWS_API_URL=http://127.0.0.1:8900/v2/top-headlines \\
+    OPENWEATHER_API_KEY=fake OPENWEATHER_API_URL=http://127.0.0.1:8900/data/2.5/weather \\
+    STOCK_QUOTE_URL=http://127.0.0.1:8900/quote python app.py
+
+GET /stats returns how many calls each fake API has answered.
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+COMPANIES = {
+    'AAPL': 'Apple Inc.', 'GOOGL': 'Alphabet Inc.', 'MSFT': 'Microsoft Corporation', 'AMZN': 'Amazon.com, Inc.',
+    'TSLA': 'Tesla, Inc.', 'META': 'Meta Platforms, Inc.', 'NFLX': 'Netflix, Inc.', 'NVDA': 'NVIDIA Corporation',
+    'BTC': 'Bitcoin', 'ETH': 'Ethereum'
+}
+
+FILLER = ("This is a simulated answer from the load test stand-in. It has roughly the length of a real "
+          "completion so that streaming, logging and memory behave as they would in production.").split()
+
+
+class FakeBehaviour:
+    """Latency and fault settings shared by all handler threads"""
+
+    def __init__(self, llm_latency: float = 0.5, llm_jitter: float = 0.3, token_delay: float = 0.01,
+                 answer_words: int = 60, rate_limit_rate: float = 0.0, error_rate: float = 0.0,
+                 retry_after: float = 2.0, api_latency: float = 0.05, seed: int = None):
+        self.llm_latency = llm_latency
+        self.llm_jitter = llm_jitter
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.api_latency = api_latency
+        self.random = random.Random(seed)
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def llm_delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.random.gauss(self.llm_latency, self.llm_latency * self.llm_jitter))
+
+    def fault(self):
+        """'rate_limit', 'error' or None for this call"""
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 'rate_limit'
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 'error'
+        return None
+
+
+def make_handler(behaviour: FakeBehaviour):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, body: dict, status: int = 200, headers: dict = None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path == "/openai/v1/models":
+                behaviour.count("groq_models")
+                return self.send_json({"object": "list", "data": [
+                    {"id": "llama-3.3-70b-versatile", "object": "model", "created": 0, "owned_by": "fake"}
+                ]})
+            if url.path == "/stats":
+                return self.send_json(dict(behaviour.counts))
+            time.sleep(behaviour.api_latency)
+            if url.path == "/v2/top-headlines":
+                behaviour.count("newsapi")
+                return self.send_json(self.headlines(query.get("category", "general")))
+            if url.path == "/data/2.5/weather":
+                behaviour.count("openweather")
+                return self.send_json(self.weather(query.get("q", "London")))
+            if url.path.startswith("/quote/"):
+                behaviour.count("quotes")
+                return self.send_json(self.quote(url.path.rsplit("/", 1)[-1].upper()))
+            self.send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if urlparse(self.path).path != "/openai/v1/chat/completions":
+                return self.send_json({"error": "not found"}, 404)
+            behaviour.count("groq_chat")
+
+            fault = behaviour.fault()
+            if fault == 'rate_limit':
+                behaviour.count("groq_429")
+                return self.send_json(
+                    {"error": {"message": f"Rate limit reached for model `{body.get('model')}`",
+                               "type": "tokens", "code": "rate_limit_exceeded"}},
+                    429, {"retry-after": str(behaviour.retry_after)}
+                )
+            time.sleep(behaviour.llm_delay())
+            if fault == 'error':
+                behaviour.count("groq_500")
+                return self.send_json({"error": {"message": "Internal server error", "type": "internal_server_error"}}, 500)
+
+            words = self.answer(body)
+            if body.get("stream"):
+                return self.stream(body, words)
+            text = " ".join(words)
+            prompt_tokens = sum(len(message.get("content") or "") for message in body.get("messages", [])) // 4
+            self.send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                          "total_tokens": prompt_tokens + len(words)}
+            })
+
+        def answer(self, body: dict) -> list:
+            """Deterministic per prompt, so response caches behave as with a real model at low temperature"""
+            prompt = (body.get("messages") or [{}])[-1].get("content") or ""
+            seed = int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+            start = seed % len(FILLER)
+            words = [f"[{body.get('model')}]"]
+            while len(words) < behaviour.answer_words:
+                words.append(FILLER[start % len(FILLER)])
+                start += 1
+            return words
+
+        def stream(self, body: dict, words: list):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write(data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            for index, word in enumerate(words):
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": (" " if index else "") + word},
+                                      "finish_reason": None}]}
+                write(f"data: {json.dumps(chunk)}\n\n".encode())
+                time.sleep(behaviour.token_delay)
+            # Like Groq, the usage comes with a last chunk under x_groq
+            prompt_tokens = sum(len(message.get("content") or "") for message in body.get("messages", [])) // 4
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     "x_groq": {"id": "req-fake", "usage": {"prompt_tokens": prompt_tokens,
+                                                            "completion_tokens": len(words),
+                                                            "total_tokens": prompt_tokens + len(words)}}}
+            write(f"data: {json.dumps(chunk)}\n\n".encode())
+            write(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def headlines(self, category: str) -> dict:
+            articles = [{
+                "source": {"id": None, "name": f"Fake Wire {index}"},
+                "title": f"{category.title()} story number {index}",
+                "description": "Simulated article for load testing.",
+                "url": f"https://example.com/{category}/{index}",
+                "publishedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            } for index in range(1, 11)]
+            return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+        def weather(self, location: str) -> dict:
+            seed = sum(map(ord, location.lower()))
+            return {
+                "name": location.title(),
+                "weather": [{"main": "Clouds", "description": "scattered clouds"}],
+                "main": {"temp": 5 + seed % 25, "feels_like": 4 + seed % 25, "humidity": 40 + seed % 50,
+                         "pressure": 1000 + seed % 30},
+                "wind": {"speed": round(1 + (seed % 70) / 10, 1)}
+            }
+
+        def quote(self, symbol: str) -> dict:
+            seed = sum(map(ord, symbol))
+            price = 50 + seed % 400 + behaviour.random.random()
+            return {"symbol": symbol, "current_price": price, "open": price - 1.5 + (seed % 3),
+                    "company_name": COMPANIES.get(symbol, symbol)}
+
+    return Handler
+
+
+def serve(port: int, behaviour: FakeBehaviour, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start the fake services in a background thread and return the server"""
+    server = ThreadingHTTPServer((host, port), make_handler(behaviour))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-services", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq, NewsAPI, OpenWeather and quote services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mean seconds before a completion starts")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="standard deviation as a share of the mean")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--answer-words", type=int, default=60)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of completions answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of completions answered with 500")
+    parser.add_argument("--retry-after", type=float, default=2.0)
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds for news, weather and quotes")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    behaviour = FakeBehaviour(
+        llm_latency=args.llm_latency, llm_jitter=args.llm_jitter, token_delay=args.token_delay,
+        answer_words=args.answer_words, rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+        retry_after=args.retry_after, api_latency=args.api_latency, seed=args.seed
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(behaviour))
+    server.daemon_threads = True
+    print(f"Fake upstream services on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(behaviour.counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
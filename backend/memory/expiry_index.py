@@ -0,0 +1,46 @@
+import heapq
+import threading
+
+
+class ExpiryIndex:
+    """Min-heap of (last interaction time, user_id, session_id), so cleanup finds expired sessions without a scan.
+
+    `touch` records a session's newest interaction by pushing a new entry; the
+    entries it supersedes stay in the heap and are skipped when they surface
+    (`_latest` knows the current time of every session). Popping k expired
+    sessions costs O(k log n) plus the stale entries passed on the way, and the
+    heap is rebuilt from `_latest` once stale entries outnumber live ones.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def touch(self, user_id: str, session_id: str, timestamp: float):
+        key = (user_id, session_id)
+        with self._lock:
+            if timestamp < self._latest.get(key, float("-inf")):
+                return
+            self._latest[key] = timestamp
+            heapq.heappush(self._heap, (timestamp, user_id, session_id))
+            if len(self._heap) > 2 * len(self._latest) + 1024:
+                self._rebuild()
+
+    def pop_expired(self, cutoff: float, limit: int) -> list:
+        """Remove and return up to `limit` (user_id, session_id) pairs last used before `cutoff`, oldest first"""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < cutoff and len(expired) < limit:
+                timestamp, user_id, session_id = heapq.heappop(self._heap)
+                if self._latest.get((user_id, session_id)) == timestamp:
+                    del self._latest[(user_id, session_id)]
+                    expired.append((user_id, session_id))
+        return expired
+
+    def _rebuild(self):
+        self._heap = [(timestamp, user_id, session_id) for (user_id, session_id), timestamp in self._latest.items()]
+        heapq.heapify(self._heap)
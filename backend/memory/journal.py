@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import logging
+import threading
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FSYNC_MODES = ("always", "batch", "never")
+# After a failed snapshot write the next compaction waits this long, doubling up to the maximum
+COMPACT_RETRY_DELAY = 5.0
+COMPACT_MAX_RETRY_DELAY = 300.0
+
+
+class MemoryJournal:
+    """Append-only JSONL log of memory changes, compacted into snapshots.
+
+    Every change is one line with an increasing sequence number, so writing it
+    costs the same however large the store is. Durability follows `fsync`:
+    `always` syncs each record, `batch` syncs at most every `fsync_interval`
+    seconds from a background thread, `never` leaves it to the OS.
+
+    Once the journal outgrows `compact_bytes` it is rotated and a background
+    thread writes the full state to the snapshot file (atomically, through a
+    temporary file) together with the sequence number it covers. Recovery
+    loads the snapshot and replays only the records after that number, so a
+    crash at any point of a compaction loses nothing and applies nothing twice.
+    """
+
+    def __init__(self, path: str, snapshot_path: str, fsync: str = "batch", fsync_interval: float = 1.0,
+                 compact_bytes: int = 8 * 1024 * 1024):
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_MODES)}, not {fsync!r}")
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.rotated_path = path + ".compacting"
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self.seq = 0
+        self._file = None
+        self._size = 0
+        self._unsynced = False
+        self._compacting = False
+        self._compact_retry_delay = 0.0
+        self._next_compaction = 0.0
+        self._closed = threading.Event()
+        self._lock = threading.RLock()
+        self._syncer = None
+
+    def recover(self, apply, base: dict = None) -> dict:
+        """Rebuild the state: the snapshot (or `base` when there is none) plus the journal after it"""
+        state, snapshot_seq = base if base is not None else {}, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            state, snapshot_seq = snapshot["state"], snapshot["seq"]
+        self.seq = snapshot_seq
+        replayed = 0
+        for path in (self.rotated_path, self.path):
+            replayed += self._replay(path, state, apply, snapshot_seq)
+        logger.info(f"Recovered memory from snapshot at seq {snapshot_seq} plus {replayed} journal records")
+
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        if self.fsync == "batch":
+            self._syncer = threading.Thread(target=self._sync_loop, name="memory-journal-fsync", daemon=True)
+            self._syncer.start()
+        if os.path.exists(self.rotated_path):
+            # A compaction was interrupted; finish it from the recovered state
+            self._start_compaction(lambda: json.dumps(state, default=str))
+        return state
+
+    def _replay(self, path: str, state: dict, apply, after_seq: int) -> int:
+        if not os.path.exists(path):
+            return 0
+        replayed = 0
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Only the last line can be torn, by a crash in the middle of an append
+                    logger.warning(f"Ignoring a partly written record at the end of {path}")
+                    break
+                good_offset += len(line)
+                self.seq = max(self.seq, record["seq"])
+                if record["seq"] > after_seq:
+                    apply(state, record)
+                    replayed += 1
+        if good_offset < os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+        return replayed
+
+    def append(self, records: list):
+        """Append records as one write with at most one fsync; all of them or, on error, none.
+
+        Records must reach the journal in the order they are applied to any
+        one user, and `compact`'s `dump_state` must not see a record journaled
+        but not yet applied; MemoryManager holds the users' locks across both.
+        """
+        with self._lock:
+            seq = self.seq
+            lines = []
+            for record in records:
+                seq += 1
+                lines.append(json.dumps({"seq": seq, **record}, default=str) + "\n")
+            data = "".join(lines)
+            try:
+                self._file.write(data)
+                self._file.flush()
+            except Exception:
+                # A torn record is only tolerated at the very end, so cut it off before anything follows it
+                self._discard_partial_write()
+                raise
+            self.seq = seq
+            self._size += len(data)
+            if self.fsync == "always":
+                os.fsync(self._file.fileno())
+            else:
+                self._unsynced = True
+        for record in records:
+            metrics.inc("memory_journal_records_total", help_text="Records appended to the memory journal",
+                        op=record.get("op", "unknown"))
+
+    def _discard_partial_write(self):
+        """Drop whatever part of a failed append reached the file and reopen it; the journal lock is held"""
+        try:
+            self._file.close()
+        except Exception:
+            pass
+        with open(self.path, 'r+b') as f:
+            f.truncate(self._size)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def should_compact(self) -> bool:
+        return self._size >= self.compact_bytes and not self._compacting \
+            and time.monotonic() >= self._next_compaction
+
+    def compact(self, dump_state):
+        """Rotate the journal and write a snapshot of `dump_state()` in the background.
+
+        `dump_state` is called with the journal lock held, so no record can be
+        appended between the state it returns and the sequence number stored
+        with it; it should return a copy (or JSON text) of the state. Returns
+        the snapshot thread, or None when a compaction is already running.
+        """
+        return self._start_compaction(dump_state)
+
+    def _start_compaction(self, dump_state):
+        with self._lock:
+            if self._compacting:
+                return None
+            self._compacting = True
+            state, seq = dump_state(), self.seq
+            self._sync()
+            if not os.path.exists(self.rotated_path):
+                self._file.close()
+                os.replace(self.path, self.rotated_path)
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self._size = 0
+        thread = threading.Thread(target=self._write_snapshot, args=(state, seq), name="memory-compaction",
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def _write_snapshot(self, state, seq: int):
+        start = time.perf_counter()
+        try:
+            state_json = state if isinstance(state, str) else json.dumps(state, default=str)
+            temporary = self.snapshot_path + ".tmp"
+            with open(temporary, 'w', encoding='utf-8') as f:
+                f.write(f'{{"seq": {seq}, "state": {state_json}}}')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.snapshot_path)
+            os.remove(self.rotated_path)
+            logger.info(f"Compacted memory journal into a snapshot at seq {seq}")
+            self._compact_retry_delay = 0.0
+        except Exception as e:
+            # The rotated journal stays and is folded into the next attempt; until then
+            # should_compact() would stay true and every write would start another one
+            self._compact_retry_delay = min(COMPACT_MAX_RETRY_DELAY, self._compact_retry_delay * 2 or COMPACT_RETRY_DELAY)
+            self._next_compaction = time.monotonic() + self._compact_retry_delay
+            logger.error(f"Memory journal compaction failed, retrying in {self._compact_retry_delay:.0f}s: {e}")
+        finally:
+            self._compacting = False
+        metrics.observe("memory_compaction_seconds", time.perf_counter() - start,
+                        help_text="Time to write a memory snapshot")
+
+    def _sync(self):
+        with self._lock:
+            if self._unsynced and self._file and not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._unsynced = False
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self._sync()
+            except Exception as e:
+                logger.error(f"Memory journal fsync failed: {e}")
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._sync()
+                self._file.close()
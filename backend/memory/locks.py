@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+
+
+class LockStripes:
+    """A fixed set of locks shared out by key, so work on different users rarely waits.
+
+    `lock(key)` is the lock for one key. `holding(keys)` and `holding_all()`
+    take several in a fixed order, so two threads taking overlapping sets
+    cannot deadlock. The locks are re-entrant: a thread holding a key's lock
+    may take it again, including through `holding_all()`.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.RLock() for _ in range(max(1, stripes))]
+
+    def _index(self, key) -> int:
+        return hash(key) % len(self._locks)
+
+    def lock(self, key) -> threading.RLock:
+        return self._locks[self._index(key)]
+
+    @contextmanager
+    def holding(self, keys):
+        locks = [self._locks[index] for index in sorted({self._index(key) for key in keys})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    @contextmanager
+    def holding_all(self):
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
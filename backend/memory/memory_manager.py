@@ -1,76 +1,191 @@
 import json
 import os
-import numpy as np
+import atexit
 from datetime import datetime
 import logging
+from utils.config import Config
+from .journal import MemoryJournal
+from .locks import LockStripes
+from .expiry_index import ExpiryIndex
 
 logger = logging.getLogger(__name__)
 
+
+def new_user_memory(timestamp: str) -> dict:
+    return {
+        "conversations": {},
+        "preferences": {},
+        "created_at": timestamp,
+        "last_active": timestamp
+    }
+
+
+def new_interaction(user_message: str, agent_response: str, agent_used: str, timestamp: str = None) -> dict:
+    return {
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "user_message": user_message,
+        "agent_response": agent_response,
+        "agent_used": agent_used
+    }
+
+
+def apply_record(memory: dict, record: dict):
+    """Apply one journal record to the in-memory store; used for live writes and for replay alike"""
+    op = record["op"]
+    if op == "drop_sessions":
+        for user_id, session_id in record["sessions"]:
+            memory.get(user_id, {}).get("conversations", {}).pop(session_id, None)
+        return
+
+    user_memory = memory.get(record["user_id"])
+    if user_memory is None:
+        user_memory = memory[record["user_id"]] = new_user_memory(record["timestamp"])
+    if op == "interaction":
+        user_memory["conversations"].setdefault(record["session_id"], []).append(record["interaction"])
+        user_memory["last_active"] = record["timestamp"]
+    elif op == "preferences":
+        user_memory["preferences"].update(record["preferences"])
+
+
 class MemoryManager:
-    def __init__(self):
-        self.memory_file = "user_memory.json"
+    """Per-user conversation history and preferences.
+
+    The store lives in memory; every change is appended to a journal (see
+    MemoryJournal) instead of rewriting `user_memory.json`, which is only read
+    once, to seed the store when there is no snapshot yet.
+
+    Changes to a user happen under that user's stripe of `LockStripes`, so
+    request threads writing for different users do not wait for each other
+    beyond the journal append itself, and reads take no lock. A compaction
+    takes every stripe for as long as it takes to copy the store; it is
+    serialized and written in the background.
+
+    Every session's last interaction time is kept in an ExpiryIndex, so
+    cleanup pops just the expired sessions, a slice at a time.
+    """
+
+    def __init__(self, memory_file: str = None, journal_file: str = None, snapshot_file: str = None):
+        self.memory_file = memory_file or Config.MEMORY_FILE
+        self._stripes = LockStripes(Config.MEMORY_LOCK_STRIPES)
+        self.expiry = ExpiryIndex()
+        self.journal = MemoryJournal(
+            journal_file or Config.MEMORY_JOURNAL_FILE,
+            snapshot_file or Config.MEMORY_SNAPSHOT_FILE,
+            fsync=Config.MEMORY_FSYNC,
+            fsync_interval=Config.MEMORY_FSYNC_INTERVAL,
+            compact_bytes=Config.MEMORY_COMPACT_BYTES
+        )
         self.load_memory()
-    
+        atexit.register(self.close)
+
     def load_memory(self):
-        """Load user memory from JSON file"""
+        """Recover user memory from the snapshot and journal (or the legacy JSON file on first start)"""
+        legacy = None
         try:
-            if os.path.exists(self.memory_file):
+            if not os.path.exists(self.journal.snapshot_path) and os.path.exists(self.memory_file):
                 with open(self.memory_file, 'r') as f:
-                    self.memory = json.load(f)
-                logger.info(f"Loaded memory with {len(self.memory)} users")
-            else:
-                self.memory = {}
-                logger.info("Created new memory storage")
+                    legacy = json.load(f)
+            self.memory = self.journal.recover(apply_record, legacy)
+            for user_id, user_data in self.memory.items():
+                for session_id, conversations in user_data["conversations"].items():
+                    if conversations:
+                        self.expiry.touch(user_id, session_id,
+                                          datetime.fromisoformat(conversations[-1]["timestamp"]).timestamp())
+            logger.info(f"Loaded memory with {len(self.memory)} users")
         except Exception as e:
+            # Starting empty would let the next compaction overwrite the stored history
             logger.error(f"Error loading memory: {e}")
-            self.memory = {}
-    
+            raise
+
     def save_memory(self):
-        """Save user memory to JSON file"""
+        """Write a snapshot of the whole store now and start a fresh journal"""
         try:
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.memory, f, indent=2, default=str)
+            thread = self._compact()
+            if thread is not None:
+                thread.join()
         except Exception as e:
             logger.error(f"Error saving memory: {e}")
-    
+
+    def _copy_memory(self) -> dict:
+        """A copy of the store that later changes do not reach, for the snapshot thread to serialize.
+
+        Only the containers that change are copied; interactions are never
+        modified once stored, so they are shared.
+        """
+        return {
+            user_id: {
+                **user_memory,
+                "conversations": {session_id: list(conversation)
+                                  for session_id, conversation in user_memory["conversations"].items()},
+                "preferences": dict(user_memory["preferences"])
+            }
+            for user_id, user_memory in self.memory.items()
+        }
+
+    def _compact(self):
+        # With every stripe held no record is journaled but not yet applied
+        with self._stripes.holding_all():
+            return self.journal.compact(self._copy_memory)
+
+    def _commit(self, records: list, user_ids):
+        """Journal records and apply them to the store, holding the locks of the users they touch.
+
+        Records are applied only once the journal has them, so a failed append
+        changes nothing and the same records can be committed again.
+        """
+        with self._stripes.holding(user_ids):
+            self.journal.append(records)
+            for record in records:
+                apply_record(self.memory, record)
+                if record["op"] == "interaction":
+                    self.expiry.touch(record["user_id"], record["session_id"],
+                                      datetime.fromisoformat(record["timestamp"]).timestamp())
+
+    def _maybe_compact(self):
+        # Only call with no stripe held: two threads each holding one while taking all would deadlock
+        if self.journal.should_compact():
+            self._compact()
+
+    def close(self):
+        """Sync the journal to disk; called at exit"""
+        self.journal.close()
+
     def get_user_memory(self, user_id: str) -> dict:
         """Get or create user memory"""
-        if user_id not in self.memory:
-            self.memory[user_id] = {
-                "conversations": {},
-                "preferences": {},
-                "created_at": datetime.now().isoformat(),
-                "last_active": datetime.now().isoformat()
-            }
-            self.save_memory()
-        
-        # Update last active time
-        self.memory[user_id]["last_active"] = datetime.now().isoformat()
-        return self.memory[user_id]
-    
-    def store_interaction(self, user_id: str, session_id: str, user_message: str, 
+        now = datetime.now().isoformat()
+        user_memory = self.memory.get(user_id)
+        if user_memory is None:
+            with self._stripes.lock(user_id):
+                if user_id not in self.memory:
+                    self._commit([{"op": "user", "user_id": user_id, "timestamp": now}], [user_id])
+                user_memory = self.memory[user_id]
+            self._maybe_compact()
+
+        # Update last active time; persisted with the next snapshot
+        user_memory["last_active"] = now
+        return user_memory
+
+    def store_interaction(self, user_id: str, session_id: str, user_message: str,
                          agent_response: str, agent_used: str):
         """Store a conversation interaction"""
         try:
-            user_memory = self.get_user_memory(user_id)
-            
-            if session_id not in user_memory["conversations"]:
-                user_memory["conversations"][session_id] = []
-            
-            interaction = {
-                "timestamp": datetime.now().isoformat(),
-                "user_message": user_message,
-                "agent_response": agent_response,
-                "agent_used": agent_used
-            }
-            
-            user_memory["conversations"][session_id].append(interaction)
-            self.save_memory()
+            self.store_interactions([(user_id, session_id, new_interaction(user_message, agent_response, agent_used))])
             logger.info(f"Stored interaction for user {user_id} in session {session_id}")
-            
+
         except Exception as e:
             logger.error(f"Error storing interaction: {e}")
-    
+
+    def store_interactions(self, items: list):
+        """Store (user_id, session_id, interaction) triples as one journal write"""
+        self._commit([{
+            "op": "interaction",
+            "user_id": user_id,
+            "session_id": session_id,
+            "timestamp": interaction["timestamp"],
+            "interaction": interaction
+        } for user_id, session_id, interaction in items], {user_id for user_id, _, _ in items})
+        self._maybe_compact()
+
     def get_conversation_history(self, user_id: str, session_id: str, limit: int = 10) -> list:
         """Get conversation history for a user session"""
         try:
@@ -80,41 +195,79 @@ class MemoryManager:
         except Exception as e:
             logger.error(f"Error getting conversation history: {e}")
             return []
-    
+
     def update_user_preferences(self, user_id: str, preferences: dict):
         """Update user preferences"""
         try:
-            user_memory = self.get_user_memory(user_id)
-            user_memory["preferences"].update(preferences)
-            self.save_memory()
+            self._commit([{
+                "op": "preferences",
+                "user_id": user_id,
+                "timestamp": datetime.now().isoformat(),
+                "preferences": preferences
+            }], [user_id])
+            self._maybe_compact()
             logger.info(f"Updated preferences for user {user_id}")
         except Exception as e:
             logger.error(f"Error updating preferences: {e}")
-    
+
     def get_all_users(self) -> list:
         """Get list of all user IDs"""
-        return list(self.memory.keys())
-    
-    def cleanup_old_sessions(self, days_old: int = 30):
-        """Clean up sessions older than specified days"""
+        return list(self.memory)
+
+    def cleanup_old_sessions(self, days_old: int = 30, slice_size: int = None):
+        """Clean up sessions older than specified days, popping them from the expiry index a slice at a time"""
         try:
             cutoff_date = datetime.now().timestamp() - (days_old * 24 * 60 * 60)
+            slice_size = slice_size or Config.MEMORY_CLEANUP_SLICE
             cleaned_count = 0
-            
-            for user_id, user_data in self.memory.items():
-                for session_id, conversations in list(user_data["conversations"].items()):
-                    if conversations:
-                        last_interaction = conversations[-1]["timestamp"]
-                        last_timestamp = datetime.fromisoformat(last_interaction).timestamp()
-                        
-                        if last_timestamp < cutoff_date:
-                            del user_data["conversations"][session_id]
-                            cleaned_count += 1
-            
-            self.save_memory()
+
+            while True:
+                candidates = self.expiry.pop_expired(cutoff_date, slice_size)
+                if not candidates:
+                    break
+                sessions_by_user = {}
+                for user_id, session_id in candidates:
+                    sessions_by_user.setdefault(user_id, []).append(session_id)
+
+                # Only this slice's users are locked; requests for everyone else carry on
+                with self._stripes.holding(sessions_by_user):
+                    expired = []
+                    for user_id, session_ids in sessions_by_user.items():
+                        conversations = self.memory.get(user_id, {}).get("conversations", {})
+                        for session_id in session_ids:
+                            # A session used since it was popped has been indexed again; keep it
+                            conversation = conversations.get(session_id)
+                            if conversation and \
+                                    datetime.fromisoformat(conversation[-1]["timestamp"]).timestamp() < cutoff_date:
+                                expired.append([user_id, session_id])
+                    if expired:
+                        self._commit([{"op": "drop_sessions", "sessions": expired}], sessions_by_user)
+                cleaned_count += len(expired)
+                self._maybe_compact()
+
             logger.info(f"Cleaned up {cleaned_count} old sessions")
             return cleaned_count
-            
+
         except Exception as e:
             logger.error(f"Error cleaning old sessions: {e}")
-            return 0
\ No newline at end of file
+            return 0
+
+
+def create_memory_manager():
+    """The memory backend selected by MEMORY_BACKEND, behind a write-behind queue with MEMORY_WRITE_BEHIND"""
+    if Config.MEMORY_BACKEND == "sqlite":
+        from .sqlite_memory import SQLiteMemoryManager
+        manager = SQLiteMemoryManager(Config.MEMORY_DB_PATH)
+    elif Config.MEMORY_BACKEND == "sharded":
+        from .sharded_memory import ShardedMemoryManager
+        manager = ShardedMemoryManager(Config.MEMORY_DIR, Config.MEMORY_RESIDENT_USERS, Config.MEMORY_FLUSH_INTERVAL,
+                                       Config.MEMORY_LOCK_STRIPES)
+    elif Config.MEMORY_BACKEND == "json":
+        manager = MemoryManager()
+    else:
+        raise ValueError(f"Unknown MEMORY_BACKEND {Config.MEMORY_BACKEND!r}; use json, sqlite or sharded")
+    if Config.MEMORY_WRITE_BEHIND:
+        from .write_behind import WriteBehindMemory
+        manager = WriteBehindMemory(manager, Config.MEMORY_QUEUE_SIZE, Config.MEMORY_BATCH_SIZE,
+                                    Config.MEMORY_BATCH_DELAY)
+    return manager
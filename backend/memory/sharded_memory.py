@@ -0,0 +1,330 @@
+import os
+import json
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import quote, unquote
+from utils.config import Config
+from utils.metrics import metrics
+from .memory_manager import new_user_memory, new_interaction
+from .locks import LockStripes
+from .expiry_index import ExpiryIndex
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedMemoryManager:
+    """MemoryManager with one JSON file per user, loaded on first use.
+
+    Startup reads nothing; a user's file is read when they are first touched
+    and kept in an LRU of at most `max_resident` users. Changes mark the user
+    dirty; dirty users are written (atomically, through a temporary file)
+    every `flush_interval` seconds, when they are evicted and at exit, so RAM
+    and write cost follow the active users rather than everyone ever seen.
+    With `flush_interval` 0 every change is written through immediately.
+
+    Reading, changing and writing a user happen under that user's stripe of
+    `LockStripes`; `_lock` only guards the LRU bookkeeping and is never held
+    for file I/O, so threads serving different users do not wait for each
+    other. Evicted users wait in `_evicting` until their file is written, so
+    a user touched again meanwhile is taken back rather than read stale.
+
+    Cleanup pops expired sessions from an ExpiryIndex. Building it means
+    reading every file, so that happens on the first cleanup, not at startup;
+    from then on every stored interaction keeps it current.
+    """
+
+    def __init__(self, directory: str = "user_memory", max_resident: int = 1000, flush_interval: float = 1.0,
+                 lock_stripes: int = 64):
+        self.directory = directory
+        self.max_resident = max(1, max_resident)
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        self._resident = OrderedDict()
+        self._evicting = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stripes = LockStripes(lock_stripes)
+        self._closed = threading.Event()
+        self.expiry = ExpiryIndex()
+        self._expiry_built = False
+        if flush_interval > 0:
+            threading.Thread(target=self._flush_loop, name="memory-flush", daemon=True).start()
+        atexit.register(self.close)
+        logger.info(f"Using sharded memory in {directory} (up to {self.max_resident} resident users)")
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.directory, quote(user_id, safe='@') + ".json")
+
+    def _read(self, user_id: str):
+        try:
+            with open(self._path(user_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, user_id: str, user_memory: dict):
+        path = self._path(user_id)
+        temporary = path + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump(user_memory, f, default=str)
+        os.replace(temporary, path)
+
+    def _resident_user(self, user_id: str) -> dict:
+        """The user's memory, loading it (or creating it) and making it the most recently used.
+
+        The caller holds the user's stripe.
+        """
+        with self._lock:
+            user_memory = self._resident.get(user_id)
+            if user_memory is not None:
+                self._resident.move_to_end(user_id)
+                return user_memory
+            user_memory = self._evicting.pop(user_id, None)
+            if user_memory is not None:
+                # Evicted but not written yet: take it back, still dirty
+                self._resident[user_id] = user_memory
+                self._dirty.add(user_id)
+                return user_memory
+
+        user_memory = self._read(user_id)
+        with self._lock:
+            if user_memory is None:
+                user_memory = new_user_memory(datetime.now().isoformat())
+                self._dirty.add(user_id)
+            else:
+                metrics.inc("memory_user_loads_total", help_text="User memory files read into RAM")
+            self._resident[user_id] = user_memory
+            self._evict()
+            metrics.set_gauge("memory_resident_users", len(self._resident), help_text="Users held in RAM")
+        return user_memory
+
+    def _evict(self):
+        """Drop least recently used users past `max_resident`; dirty ones wait in `_evicting` for a write"""
+        while len(self._resident) > self.max_resident:
+            user_id, user_memory = self._resident.popitem(last=False)
+            if user_id in self._dirty:
+                self._evicting[user_id] = user_memory
+                self._dirty.discard(user_id)
+            metrics.inc("memory_user_evictions_total", help_text="Users evicted from RAM")
+
+    def _write_evicted(self):
+        """Write the users waiting in `_evicting`; call with no stripe held"""
+        while self._evicting:
+            with self._lock:
+                if not self._evicting:
+                    break
+                user_id = next(iter(self._evicting))
+            with self._stripes.lock(user_id):
+                with self._lock:
+                    user_memory = self._evicting.get(user_id)
+                if user_memory is not None:
+                    self._write(user_id, user_memory)
+                    with self._lock:
+                        self._evicting.pop(user_id, None)
+
+    def _write_user(self, user_id: str):
+        """Write one user if dirty; the caller holds the user's stripe"""
+        with self._lock:
+            if user_id not in self._dirty or user_id not in self._resident:
+                return False
+            self._dirty.discard(user_id)
+            user_memory = self._resident[user_id]
+        try:
+            self._write(user_id, user_memory)
+        except Exception:
+            with self._lock:
+                self._dirty.add(user_id)
+            raise
+        return True
+
+    def _changed(self, user_id: str, user_memory: dict):
+        """Mark a user changed; the caller holds the user's stripe"""
+        with self._lock:
+            if user_id in self._resident:
+                self._dirty.add(user_id)
+            else:
+                # Evicted by another thread while we were changing it
+                self._evicting[user_id] = user_memory
+        if self.flush_interval <= 0:
+            self._write_user(user_id)
+
+    def flush(self) -> int:
+        """Write every dirty user; returns how many were written"""
+        with self._lock:
+            dirty = list(self._dirty)
+        written = 0
+        for user_id in dirty:
+            with self._stripes.lock(user_id):
+                written += self._write_user(user_id)
+        self._write_evicted()
+        return written
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing memory: {e}")
+
+    def load_memory(self):
+        """Nothing to load up front; users are read on first use"""
+
+    def save_memory(self):
+        self.flush()
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+    def get_user_memory(self, user_id: str) -> dict:
+        """Get or create user memory"""
+        with self._stripes.lock(user_id):
+            user_memory = self._resident_user(user_id)
+            # Update last active time; persisted with the user's next write
+            user_memory["last_active"] = datetime.now().isoformat()
+        self._write_evicted()
+        return user_memory
+
+    def store_interaction(self, user_id: str, session_id: str, user_message: str,
+                          agent_response: str, agent_used: str):
+        """Store a conversation interaction"""
+        try:
+            self.store_interactions([(user_id, session_id, new_interaction(user_message, agent_response, agent_used))])
+            logger.info(f"Stored interaction for user {user_id} in session {session_id}")
+        except Exception as e:
+            logger.error(f"Error storing interaction: {e}")
+
+    def store_interactions(self, items: list):
+        """Store (user_id, session_id, interaction) triples, each user under their own lock.
+
+        Interactions a session already ends with are skipped, so a batch that
+        failed partway through can be stored again without duplicates.
+        """
+        by_user = {}
+        for user_id, session_id, interaction in items:
+            by_user.setdefault(user_id, []).append((session_id, interaction))
+        for user_id, interactions in by_user.items():
+            with self._stripes.lock(user_id):
+                user_memory = self._resident_user(user_id)
+                for session_id, interaction in interactions:
+                    conversation = user_memory["conversations"].setdefault(session_id, [])
+                    if interaction in conversation[-len(interactions):]:
+                        # Stored by an earlier attempt at this batch that failed for another user
+                        continue
+                    conversation.append(interaction)
+                    user_memory["last_active"] = interaction["timestamp"]
+                    self.expiry.touch(user_id, session_id, datetime.fromisoformat(interaction["timestamp"]).timestamp())
+                self._changed(user_id, user_memory)
+        self._write_evicted()
+
+    def get_conversation_history(self, user_id: str, session_id: str, limit: int = 10) -> list:
+        """Get conversation history for a user session"""
+        try:
+            user_memory = self.get_user_memory(user_id)
+            conversations = user_memory["conversations"].get(session_id, [])
+            return conversations[-limit:]
+        except Exception as e:
+            logger.error(f"Error getting conversation history: {e}")
+            return []
+
+    def update_user_preferences(self, user_id: str, preferences: dict):
+        """Update user preferences"""
+        try:
+            with self._stripes.lock(user_id):
+                user_memory = self._resident_user(user_id)
+                user_memory["preferences"].update(preferences)
+                user_memory["last_active"] = datetime.now().isoformat()
+                self._changed(user_id, user_memory)
+            self._write_evicted()
+            logger.info(f"Updated preferences for user {user_id}")
+        except Exception as e:
+            logger.error(f"Error updating preferences: {e}")
+
+    def get_all_users(self) -> list:
+        """Get list of all user IDs, on disk or not yet written"""
+        with self._lock:
+            users = set(self._resident)
+        users.update(unquote(name[:-len(".json")]) for name in os.listdir(self.directory) if name.endswith(".json"))
+        return list(users)
+
+    def _user_data(self, user_id: str):
+        """The user's memory and whether it is resident, without making it resident; the caller holds the stripe"""
+        with self._lock:
+            user_data = self._resident.get(user_id) or self._evicting.get(user_id)
+            resident = user_id in self._resident
+        if user_data is None:
+            user_data = self._read(user_id)
+        return user_data, resident
+
+    def _build_expiry_index(self):
+        for user_id in self.get_all_users():
+            with self._stripes.lock(user_id):
+                user_data, _ = self._user_data(user_id)
+                for session_id, conversations in list((user_data or {}).get("conversations", {}).items()):
+                    if conversations:
+                        self.expiry.touch(user_id, session_id,
+                                          datetime.fromisoformat(conversations[-1]["timestamp"]).timestamp())
+        self._expiry_built = True
+
+    def cleanup_old_sessions(self, days_old: int = 30, slice_size: int = None):
+        """Clean up sessions older than specified days, popping them from the expiry index a slice at a time.
+
+        Cold users are read and rewritten without becoming resident.
+        """
+        try:
+            cutoff_date = datetime.now().timestamp() - (days_old * 24 * 60 * 60)
+            slice_size = slice_size or Config.MEMORY_CLEANUP_SLICE
+            cleaned_count = 0
+            if not self._expiry_built:
+                self._build_expiry_index()
+
+            while True:
+                candidates = self.expiry.pop_expired(cutoff_date, slice_size)
+                if not candidates:
+                    break
+                sessions_by_user = {}
+                for user_id, session_id in candidates:
+                    sessions_by_user.setdefault(user_id, []).append(session_id)
+
+                for user_id, session_ids in sessions_by_user.items():
+                    with self._stripes.lock(user_id):
+                        user_data, resident = self._user_data(user_id)
+                        if user_data is None:
+                            continue
+                        conversations = user_data["conversations"]
+                        # A session used since it was popped has been indexed again; keep it
+                        expired = [
+                            session_id for session_id in session_ids
+                            if conversations.get(session_id) and
+                            datetime.fromisoformat(conversations[session_id][-1]["timestamp"]).timestamp() < cutoff_date
+                        ]
+                        for session_id in expired:
+                            del conversations[session_id]
+                        if expired:
+                            if resident:
+                                self._changed(user_id, user_data)
+                            else:
+                                self._write(user_id, user_data)
+                        cleaned_count += len(expired)
+                self._write_evicted()
+
+            logger.info(f"Cleaned up {cleaned_count} old sessions")
+            return cleaned_count
+
+        except Exception as e:
+            logger.error(f"Error cleaning old sessions: {e}")
+            return 0
+
+    def import_memory(self, memory: dict) -> int:
+        """Write every user of a JSON-format memory dict to its own file; returns the number of users"""
+        for user_id, user_memory in memory.items():
+            with self._stripes.lock(user_id):
+                self._write(user_id, user_memory)
+                with self._lock:
+                    self._resident.pop(user_id, None)
+                    self._evicting.pop(user_id, None)
+                    self._dirty.discard(user_id)
+        return len(memory)
@@ -0,0 +1,268 @@
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from utils.config import Config
+from .memory_manager import new_interaction
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    preferences TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL,
+    last_active TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    last_interaction REAL NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+);
+CREATE INDEX IF NOT EXISTS sessions_last_interaction ON sessions (last_interaction);
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    user_message TEXT,
+    agent_response TEXT,
+    agent_used TEXT
+);
+CREATE INDEX IF NOT EXISTS interactions_history ON interactions (user_id, session_id, timestamp);
+"""
+
+
+class SQLiteMemoryManager:
+    """MemoryManager on a SQLite database, so history is queried instead of held in RAM.
+
+    Users, sessions and interactions are separate tables; reading a session's
+    history is one range scan of the (user_id, session_id, timestamp) index
+    and cleanup deletes by the sessions' last interaction time. The database
+    runs in WAL mode with one connection per thread, so readers never wait
+    for the writer.
+    """
+
+    def __init__(self, db_path: str = "user_memory.sqlite3"):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._db().executescript(SCHEMA)
+        logger.info(f"Opened SQLite memory store {db_path}")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            with self._connections_lock:
+                self._connections.append(db)
+        return db
+
+    def _transaction(self, statements):
+        """Run (sql, params) pairs as one write transaction"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                db.execute(sql, params)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def load_memory(self):
+        """Nothing to load; kept so every memory backend has the same interface"""
+
+    def save_memory(self):
+        """Every change is committed as it happens; kept so every memory backend has the same interface"""
+
+    def close(self):
+        with self._connections_lock:
+            for db in self._connections:
+                try:
+                    db.close()
+                except sqlite3.ProgrammingError:
+                    # Created in another thread; closed when that thread's connection is collected
+                    pass
+            self._connections.clear()
+
+    def _ensure_user(self, user_id: str, now: str) -> tuple:
+        return ("INSERT OR IGNORE INTO users (user_id, created_at, last_active) VALUES (?, ?, ?)",
+                (user_id, now, now))
+
+    def get_user_memory(self, user_id: str) -> dict:
+        """Get or create user memory, assembled from the tables"""
+        now = datetime.now().isoformat()
+        self._transaction([
+            self._ensure_user(user_id, now),
+            ("UPDATE users SET last_active = ? WHERE user_id = ?", (now, user_id))
+        ])
+        db = self._db()
+        preferences, created_at, last_active = db.execute(
+            "SELECT preferences, created_at, last_active FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        conversations = {}
+        for session_id, timestamp, user_message, agent_response, agent_used in db.execute(
+            "SELECT session_id, timestamp, user_message, agent_response, agent_used FROM interactions "
+            "WHERE user_id = ? ORDER BY session_id, timestamp, id", (user_id,)
+        ):
+            conversations.setdefault(session_id, []).append({
+                "timestamp": timestamp,
+                "user_message": user_message,
+                "agent_response": agent_response,
+                "agent_used": agent_used
+            })
+        return {
+            "conversations": conversations,
+            "preferences": json.loads(preferences),
+            "created_at": created_at,
+            "last_active": last_active
+        }
+
+    def store_interaction(self, user_id: str, session_id: str, user_message: str,
+                          agent_response: str, agent_used: str):
+        """Store a conversation interaction"""
+        try:
+            self.store_interactions([(user_id, session_id, new_interaction(user_message, agent_response, agent_used))])
+            logger.info(f"Stored interaction for user {user_id} in session {session_id}")
+        except Exception as e:
+            logger.error(f"Error storing interaction: {e}")
+
+    def store_interactions(self, items: list):
+        """Store (user_id, session_id, interaction) triples in one transaction"""
+        statements = []
+        for user_id, session_id, interaction in items:
+            timestamp = interaction["timestamp"]
+            statements += [
+                self._ensure_user(user_id, timestamp),
+                ("UPDATE users SET last_active = ? WHERE user_id = ?", (timestamp, user_id)),
+                ("INSERT INTO sessions (user_id, session_id, started_at, last_interaction) VALUES (?, ?, ?, ?) "
+                 "ON CONFLICT (user_id, session_id) DO UPDATE SET last_interaction = excluded.last_interaction",
+                 (user_id, session_id, timestamp, datetime.fromisoformat(timestamp).timestamp())),
+                ("INSERT INTO interactions (user_id, session_id, timestamp, user_message, agent_response, agent_used) "
+                 "VALUES (?, ?, ?, ?, ?, ?)", (user_id, session_id, timestamp, interaction["user_message"],
+                                                interaction["agent_response"], interaction["agent_used"]))
+            ]
+        self._transaction(statements)
+
+    def get_conversation_history(self, user_id: str, session_id: str, limit: int = 10) -> list:
+        """Get conversation history for a user session"""
+        try:
+            rows = self._db().execute(
+                "SELECT timestamp, user_message, agent_response, agent_used FROM interactions "
+                "WHERE user_id = ? AND session_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (user_id, session_id, limit)
+            ).fetchall()
+            return [{
+                "timestamp": timestamp,
+                "user_message": user_message,
+                "agent_response": agent_response,
+                "agent_used": agent_used
+            } for timestamp, user_message, agent_response, agent_used in reversed(rows)]
+        except Exception as e:
+            logger.error(f"Error getting conversation history: {e}")
+            return []
+
+    def update_user_preferences(self, user_id: str, preferences: dict):
+        """Update user preferences"""
+        try:
+            now = datetime.now().isoformat()
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(*self._ensure_user(user_id, now))
+                current = json.loads(db.execute(
+                    "SELECT preferences FROM users WHERE user_id = ?", (user_id,)
+                ).fetchone()[0])
+                current.update(preferences)
+                db.execute("UPDATE users SET preferences = ?, last_active = ? WHERE user_id = ?",
+                           (json.dumps(current, default=str), now, user_id))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            logger.info(f"Updated preferences for user {user_id}")
+        except Exception as e:
+            logger.error(f"Error updating preferences: {e}")
+
+    def get_all_users(self) -> list:
+        """Get list of all user IDs"""
+        return [row[0] for row in self._db().execute("SELECT user_id FROM users")]
+
+    def cleanup_old_sessions(self, days_old: int = 30, slice_size: int = None):
+        """Clean up sessions older than specified days, oldest first and a slice per transaction.
+
+        The sessions come from the last_interaction index, and each short
+        transaction lets request threads write in between.
+        """
+        try:
+            cutoff = datetime.now().timestamp() - (days_old * 24 * 60 * 60)
+            slice_size = slice_size or Config.MEMORY_CLEANUP_SLICE
+            cleaned_count = 0
+            db = self._db()
+            while True:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    expired = db.execute(
+                        "SELECT user_id, session_id FROM sessions WHERE last_interaction < ? "
+                        "ORDER BY last_interaction LIMIT ?", (cutoff, slice_size)
+                    ).fetchall()
+                    db.executemany("DELETE FROM interactions WHERE user_id = ? AND session_id = ?", expired)
+                    db.executemany("DELETE FROM sessions WHERE user_id = ? AND session_id = ?", expired)
+                    db.execute("COMMIT")
+                except Exception:
+                    db.execute("ROLLBACK")
+                    raise
+                cleaned_count += len(expired)
+                if len(expired) < slice_size:
+                    break
+            logger.info(f"Cleaned up {cleaned_count} old sessions")
+            return cleaned_count
+        except Exception as e:
+            logger.error(f"Error cleaning old sessions: {e}")
+            return 0
+
+    def import_memory(self, memory: dict) -> tuple:
+        """Bulk-load a JSON-format memory dict; returns (users, sessions, interactions) imported"""
+        users = sessions = interactions = 0
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for user_id, user_data in memory.items():
+                now = datetime.now().isoformat()
+                db.execute(
+                    "INSERT OR REPLACE INTO users (user_id, preferences, created_at, last_active) VALUES (?, ?, ?, ?)",
+                    (user_id, json.dumps(user_data.get("preferences", {}), default=str),
+                     user_data.get("created_at", now), user_data.get("last_active", now))
+                )
+                users += 1
+                for session_id, conversation in user_data.get("conversations", {}).items():
+                    if not conversation:
+                        continue
+                    db.execute("DELETE FROM interactions WHERE user_id = ? AND session_id = ?", (user_id, session_id))
+                    db.executemany(
+                        "INSERT INTO interactions (user_id, session_id, timestamp, user_message, agent_response, "
+                        "agent_used) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(user_id, session_id, item["timestamp"], item.get("user_message"),
+                          item.get("agent_response"), item.get("agent_used")) for item in conversation]
+                    )
+                    db.execute(
+                        "INSERT OR REPLACE INTO sessions (user_id, session_id, started_at, last_interaction) "
+                        "VALUES (?, ?, ?, ?)",
+                        (user_id, session_id, conversation[0]["timestamp"],
+                         datetime.fromisoformat(conversation[-1]["timestamp"]).timestamp())
+                    )
+                    sessions += 1
+                    interactions += len(conversation)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return users, sessions, interactions
@@ -1,12 +1,13 @@
-import faiss
 import numpy as np
 import json
 import os
-from sentence_transformers import SentenceTransformer
 from datetime import datetime
 
 class VectorStore:
     def __init__(self, embedding_model='all-MiniLM-L6-v2'):
+        # Both libraries take seconds to import; only load them when a store is created
+        import faiss
+        from sentence_transformers import SentenceTransformer
         self.model = SentenceTransformer(embedding_model)
         self.embedding_dim = 384
         self.index = faiss.IndexFlatIP(self.embedding_dim)
@@ -0,0 +1,180 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+from utils.metrics import metrics
+from .memory_manager import new_interaction
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# A failed batch is retried after RETRY_DELAY seconds, doubling up to MAX_RETRY_DELAY;
+# once the wrapper is closing it is given up after SHUTDOWN_RETRIES attempts
+RETRY_DELAY = 0.1
+MAX_RETRY_DELAY = 5.0
+SHUTDOWN_RETRIES = 3
+
+
+class WriteBehindMemory:
+    """Wraps a memory backend so storing an interaction does not wait for the write.
+
+    `store_interaction` puts the interaction on a bounded queue and returns; a
+    background writer hands them to the backend's `store_interactions` in
+    batches of up to `batch_size`, at most `batch_delay` seconds after the
+    first of them arrived, so many requests share one journal write, one
+    SQLite transaction or one file flush. A full queue makes callers wait
+    rather than dropping interactions. A batch the backend fails to store is
+    retried with backoff and stays queued (and visible to reads) meanwhile.
+
+    Queued interactions are merged into `get_conversation_history`, so a user
+    always sees their own last turn. `close` (also run at exit) commits
+    everything still queued before closing the backend.
+    """
+
+    def __init__(self, backend, max_queue: int = 10000, batch_size: int = 100, batch_delay: float = 0.05):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+        logger.info(f"Memory write-behind enabled (batches of {self.batch_size}, {batch_delay}s)")
+
+    def store_interaction(self, user_id: str, session_id: str, user_message: str,
+                          agent_response: str, agent_used: str):
+        """Queue a conversation interaction for the background writer"""
+        interaction = new_interaction(user_message, agent_response, agent_used)
+        if self._closed:
+            # Shutting down: nothing would drain the queue any more
+            self.backend.store_interactions([(user_id, session_id, interaction)])
+            return
+        with self._lock:
+            self._pending.setdefault((user_id, session_id), []).append(interaction)
+        if self._queue.full():
+            metrics.inc("memory_write_queue_full_total", help_text="Interactions that waited for room in the queue")
+        self._queue.put((user_id, session_id, interaction))
+        metrics.set_gauge("memory_write_queue_depth", self._queue.qsize(), help_text="Interactions waiting to be stored")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: list):
+        """Store a batch, retrying with backoff until it is stored; gives up only when closing"""
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                self.backend.store_interactions(batch)
+                metrics.inc("memory_committed_interactions_total", len(batch), help_text="Interactions stored by the writer")
+                break
+            except Exception as e:
+                attempt += 1
+                metrics.inc("memory_write_errors_total", len(batch), help_text="Queued interactions that failed to store")
+                if self._closed and attempt >= SHUTDOWN_RETRIES:
+                    logger.error(f"Dropping {len(batch)} queued interactions after {attempt} failed attempts: {e}")
+                    metrics.inc("memory_dropped_interactions_total", len(batch),
+                                help_text="Queued interactions given up on at shutdown")
+                    break
+                delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (attempt - 1))
+                logger.error(f"Error storing {len(batch)} queued interactions, retrying in {delay:.1f}s: {e}")
+                # The batch stays pending meanwhile: reads still see it and flush() keeps waiting
+                time.sleep(delay)
+            finally:
+                metrics.observe("memory_commit_seconds", time.perf_counter() - start,
+                                help_text="Time to store one batch of queued interactions")
+
+        with self._lock:
+            for user_id, session_id, interaction in batch:
+                pending = self._pending.get((user_id, session_id))
+                if pending:
+                    pending.remove(interaction)
+                    if not pending:
+                        del self._pending[(user_id, session_id)]
+        for _ in batch:
+            self._queue.task_done()
+        metrics.set_gauge("memory_write_queue_depth", self._queue.qsize(),
+                          help_text="Interactions waiting to be stored")
+
+    def flush(self):
+        """Wait until every queued interaction has been stored"""
+        if self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Store everything still queued, stop the writer and close the backend; called at exit"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+        # Anything queued behind the stop marker
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._commit(leftover)
+        metrics.set_gauge("memory_write_queue_depth", 0, help_text="Interactions waiting to be stored")
+        self.backend.close()
+
+    def get_conversation_history(self, user_id: str, session_id: str, limit: int = 10) -> list:
+        """Get conversation history for a user session, including interactions not stored yet"""
+        # Read the queue before the backend: an interaction stored in between is
+        # then seen twice (and dropped below) rather than not at all
+        with self._lock:
+            pending = list(self._pending.get((user_id, session_id), ()))
+        history = self.backend.get_conversation_history(user_id, session_id, limit)
+        if not pending:
+            return history
+        stored = {(item["timestamp"], item["user_message"]) for item in history}
+        history += [item for item in pending if (item["timestamp"], item["user_message"]) not in stored]
+        return history[-limit:]
+
+    def store_interactions(self, items: list):
+        self.flush()
+        self.backend.store_interactions(items)
+
+    def load_memory(self):
+        self.backend.load_memory()
+
+    def save_memory(self):
+        self.flush()
+        self.backend.save_memory()
+
+    def get_user_memory(self, user_id: str) -> dict:
+        """The backend's user memory; queued interactions appear once the writer stores them"""
+        return self.backend.get_user_memory(user_id)
+
+    def update_user_preferences(self, user_id: str, preferences: dict):
+        self.backend.update_user_preferences(user_id, preferences)
+
+    def get_all_users(self) -> list:
+        return self.backend.get_all_users()
+
+    def cleanup_old_sessions(self, days_old: int = 30, slice_size: int = None):
+        return self.backend.cleanup_old_sessions(days_old, slice_size)
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+from memory.memory_manager import MemoryManager
+from utils.config import Config
+
+
+def migrate_memory(memory_file: str, journal_file: str, snapshot_file: str, backend: str, target_path: str):
+    """Copy every user, session and interaction of the JSON memory store into the sqlite or sharded backend"""
+    print(f"🔄 Migrating {memory_file} (+ {snapshot_file}, {journal_file}) to {backend} at {target_path}...")
+    if not any(os.path.exists(path) for path in (memory_file, journal_file, snapshot_file)):
+        sys.exit(f"❌ No JSON memory found at {memory_file}")
+
+    start = time.perf_counter()
+    # Recovers the latest state: the legacy file or snapshot plus the journal
+    source = MemoryManager(memory_file, journal_file, snapshot_file)
+    source.close()
+    if backend == "sqlite":
+        from memory.sqlite_memory import SQLiteMemoryManager
+        target = SQLiteMemoryManager(target_path)
+        users, sessions, interactions = target.import_memory(source.memory)
+        print(f"  ✅ {users} users, {sessions} sessions, {interactions} interactions "
+              f"in {time.perf_counter() - start:.2f}s")
+        setting = f"MEMORY_DB_PATH={target_path}"
+    else:
+        from memory.sharded_memory import ShardedMemoryManager
+        target = ShardedMemoryManager(target_path, flush_interval=0)
+        users = target.import_memory(source.memory)
+        print(f"  ✅ {users} user files in {time.perf_counter() - start:.2f}s")
+        setting = f"MEMORY_DIR={target_path}"
+    target.close()
+    print(f"  Set MEMORY_BACKEND={backend} and {setting} to use it")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the JSON conversation memory to SQLite or per-user files")
+    parser.add_argument("--memory-file", default=Config.MEMORY_FILE)
+    parser.add_argument("--journal-file", default=Config.MEMORY_JOURNAL_FILE)
+    parser.add_argument("--snapshot-file", default=Config.MEMORY_SNAPSHOT_FILE)
+    parser.add_argument("--to", choices=["sqlite", "sharded"], default="sqlite", dest="backend")
+    parser.add_argument("--target", help="database path or directory (MEMORY_DB_PATH or MEMORY_DIR by default)")
+    args = parser.parse_args()
+    target = args.target or (Config.MEMORY_DB_PATH if args.backend == "sqlite" else Config.MEMORY_DIR)
+    migrate_memory(args.memory_file, args.journal_file, args.snapshot_file, args.backend, target)
@@ -0,0 +1,192 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from memory.memory_manager import MemoryManager
+from memory.sqlite_memory import SQLiteMemoryManager
+from memory.sharded_memory import ShardedMemoryManager
+from memory.write_behind import WriteBehindMemory
+
+
+class ErrorCounter(logging.Handler):
+    """The backends log and swallow their errors; count them so they fail the run"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def backends(directory: str) -> dict:
+    """Factories for every backend, each opening the same files when called again"""
+    json_files = [os.path.join(directory, name) for name in ("memory.json", "journal.jsonl", "snapshot.json")]
+    return {
+        "json": lambda: MemoryManager(*json_files),
+        "sqlite": lambda: SQLiteMemoryManager(os.path.join(directory, "memory.sqlite3")),
+        # Few resident users, so threads keep evicting and reloading each other's users
+        "sharded": lambda: ShardedMemoryManager(os.path.join(directory, "shards"), max_resident=8,
+                                                flush_interval=0.05),
+        "json+write-behind": lambda: WriteBehindMemory(MemoryManager(*[path + ".wb" for path in json_files])),
+    }
+
+
+def stress(manager, threads: int, users: int, per_thread: int, sessions: int) -> float:
+    """Every thread stores interactions for every user while others read and clean up"""
+    errors = []
+    stop = threading.Event()
+
+    def write(thread: int):
+        try:
+            for i in range(per_thread):
+                user_id = f"user{(thread + i) % users}"
+                manager.store_interaction(user_id, f"session{i % sessions}", f"t{thread}-{i}", "ok", "stress")
+                manager.get_conversation_history(user_id, f"session{i % sessions}")
+                if i % 50 == 0:
+                    manager.update_user_preferences(user_id, {f"t{thread}": i})
+        except Exception as e:
+            errors.append(e)
+
+    def churn():
+        # Readers and cleanup iterate the store while it changes
+        try:
+            while not stop.is_set():
+                for user_id in manager.get_all_users():
+                    manager.get_user_memory(user_id)
+                manager.cleanup_old_sessions(days_old=1)
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    background = threading.Thread(target=churn)
+    background.start()
+    workers = [threading.Thread(target=write, args=(thread,)) for thread in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    stop.set()
+    background.join()
+    if errors:
+        raise errors[0]
+    return time.perf_counter() - start
+
+
+def count(manager, users: int, sessions: int) -> int:
+    return sum(len(manager.get_conversation_history(f"user{user}", f"session{session}", limit=10 ** 9))
+               for user in range(users) for session in range(sessions))
+
+
+class TornFile:
+    """Journal file whose next write stores half of the data and then fails, like a full disk"""
+
+    def __init__(self, file):
+        self.file = file
+        self.failures = 1
+
+    def write(self, data):
+        if self.failures:
+            self.failures -= 1
+            self.file.write(data[:len(data) // 2])
+            self.file.flush()
+            raise OSError("No space left on device")
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def fail_once(manager):
+    """Make the backend's next batch fail partway through"""
+    if isinstance(manager, MemoryManager):
+        manager.journal._file = TornFile(manager.journal._file)
+    elif isinstance(manager, ShardedMemoryManager):
+        # The first user of the batch is stored, loading the second one fails
+        load = manager._resident_user
+        failures = [1]
+
+        def flaky(user_id):
+            if user_id == "retry1" and failures[0]:
+                failures[0] -= 1
+                raise OSError("Input/output error")
+            return load(user_id)
+        manager._resident_user = flaky
+
+
+def check_retries(directory: str) -> bool:
+    """A batch the write-behind writer retries after a failed commit is stored exactly once"""
+    print("🔁 Retrying batches that failed partway through...")
+    ok = True
+    for name, factory in backends(os.path.join(directory, "retries")).items():
+        if name not in ("json", "sharded"):
+            continue
+        os.makedirs(os.path.join(directory, "retries"), exist_ok=True)
+        manager = factory()
+        fail_once(manager)
+        # One batch: delay long enough for all of them to be queued together
+        memory = WriteBehindMemory(manager, batch_delay=0.5)
+        for user in range(2):
+            for i in range(3):
+                memory.store_interaction(f"retry{user}", "session", f"m{i}", "ok", "stress")
+        memory.flush()
+        live = [len(manager.get_conversation_history(f"retry{user}", "session")) for user in range(2)]
+        memory.close()
+        reopened = factory()
+        stored = [len(reopened.get_conversation_history(f"retry{user}", "session")) for user in range(2)]
+        reopened.close()
+        passed = live == stored == [3, 3]
+        ok = ok and passed
+        print(f"  {'✅' if passed else '❌'} {name:<20} in memory {live}, after reopening {stored}, expected [3, 3]")
+    return ok
+
+
+def stress_memory(threads: int, users: int, per_thread: int, sessions: int) -> bool:
+    print(f"🧵 {threads} threads × {per_thread} interactions over {users} users...")
+    expected = threads * per_thread
+    directory = tempfile.mkdtemp(prefix="stress_memory_")
+    errors = ErrorCounter()
+    logging.getLogger("memory").addHandler(errors)
+    ok = True
+    try:
+        for name, factory in backends(directory).items():
+            manager = factory()
+            # An old session, which cleanup must drop without touching the others
+            old = (datetime.now() - timedelta(days=3)).isoformat()
+            manager.store_interactions([("user0", "expired", {
+                "timestamp": old, "user_message": "old", "agent_response": "old", "agent_used": "stress"
+            })])
+            errors.messages.clear()
+            elapsed = stress(manager, threads, users, per_thread, sessions)
+            live = count(manager, users, sessions)
+            if manager.get_conversation_history("user0", "expired"):
+                errors.messages.append("the expired session survived cleanup")
+            manager.close()
+            reopened = factory()
+            stored = count(reopened, users, sessions)
+            reopened.close()
+            passed = live == stored == expected and not errors.messages
+            ok = ok and passed
+            print(f"  {'✅' if passed else '❌'} {name:<20} {expected / elapsed:10,.0f} interactions/s   "
+                  f"in memory {live}, after reopening {stored}, expected {expected}, errors {len(errors.messages)}")
+            for message in sorted(set(errors.messages))[:3]:
+                print(f"      {message}")
+        ok = check_retries(directory) and ok
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that concurrent writers lose no interactions")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--users", type=int, default=24)
+    parser.add_argument("--interactions", type=int, default=300, help="per thread")
+    parser.add_argument("--sessions", type=int, default=3, help="per user")
+    args = parser.parse_args()
+    sys.exit(0 if stress_memory(args.threads, args.users, args.interactions, args.sessions) else 1)
@@ -7,4 +7,136 @@ class Config:
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
     OPENWEATHER_API_KEY = os.getenv('OPENWEATHER_API_KEY')
     NEWS_API_KEY = os.getenv('NEWS_API_KEY')
-    SECRET_KEY = os.getenv('SECRET_KEY')
\ No newline at end of file
+    SECRET_KEY = os.getenv('SECRET_KEY')
+
+    # Upstream endpoints; point them at loadtest/fake_services.py to test without spending API quota
+    GROQ_BASE_URL = os.getenv('GROQ_BASE_URL')
+    OPENWEATHER_API_URL = os.getenv('OPENWEATHER_API_URL', 'http://api.openweathermap.org/data/2.5/weather')
+    NEWS_API_URL = os.getenv('NEWS_API_URL', 'https://newsapi.org/v2/top-headlines')
+    # Quote service answering GET <url>/<symbol>, used instead of yfinance when set
+    STOCK_QUOTE_URL = os.getenv('STOCK_QUOTE_URL')
+
+    # Groq models in fallback order, shared by every agent and the document processor
+    LLM_MODELS = [model.strip() for model in os.getenv(
+        'LLM_MODELS', 'llama-3.3-70b-versatile,llama-3.1-8b-instant,gemma2-9b-it,qwen/qwen3-32b'
+    ).split(',') if model.strip()]
+    # Keep-alive connection pool of the shared LLM client
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '100'))
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '20'))
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv('LLM_POOL_KEEPALIVE_EXPIRY', '60'))
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '60'))
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+    # Keep-alive pools for the weather and news APIs on the async path, one per service
+    EXTERNAL_API_TIMEOUT = float(os.getenv('EXTERNAL_API_TIMEOUT', '10'))
+    EXTERNAL_POOL_MAX_CONNECTIONS = int(os.getenv('EXTERNAL_POOL_MAX_CONNECTIONS', '50'))
+    EXTERNAL_POOL_MAX_KEEPALIVE = int(os.getenv('EXTERNAL_POOL_MAX_KEEPALIVE', '10'))
+    # SDK-level retries per model; the fallback to the next model already covers
+    # transient errors, and retrying a rate-limited model only waits out its retry-after
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '0'))
+
+    # Exact-match LLM response cache (SQLite); agents can override the TTL or opt out
+    LLM_CACHE = os.getenv('LLM_CACHE', 'true').lower() == 'true'
+    LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite3')
+    LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '86400'))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+
+    # Semantic response cache for near-duplicate questions (needs sentence-transformers)
+    SEMANTIC_CACHE = os.getenv('SEMANTIC_CACHE', 'false').lower() == 'true'
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+    SEMANTIC_CACHE_TTL = float(os.getenv('SEMANTIC_CACHE_TTL', '3600'))
+    # Entries per agent
+    SEMANTIC_CACHE_CAPACITY = int(os.getenv('SEMANTIC_CACHE_CAPACITY', '1000'))
+
+    # Identical concurrent LLM and external API calls share one upstream call
+    SINGLE_FLIGHT = os.getenv('SINGLE_FLIGHT', 'true').lower() == 'true'
+
+    # Rate limit scheduler: per-model requests and tokens per minute, as
+    # LLM_RATE_LIMITS=model=rpm:tpm,... with the defaults for unlisted models
+    LLM_SCHEDULER = os.getenv('LLM_SCHEDULER', 'true').lower() == 'true'
+    LLM_DEFAULT_RPM = float(os.getenv('LLM_DEFAULT_RPM', '30'))
+    LLM_DEFAULT_TPM = float(os.getenv('LLM_DEFAULT_TPM', '6000'))
+    LLM_RATE_LIMITS = {
+        model.strip(): tuple(float(limit) for limit in limits.split(':'))
+        for model, limits in (entry.split('=') for entry in os.getenv('LLM_RATE_LIMITS', '').split(',') if entry.strip())
+    }
+    # Longest a call waits in the queue for a model with capacity
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '30'))
+
+    # Hedged LLM requests: after the agent's p90 latency, also ask the next model
+    LLM_HEDGING = os.getenv('LLM_HEDGING', 'false').lower() == 'true'
+    LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0.9'))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+    LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '0.25'))
+    # At most this share of requests is sent a second time
+    LLM_HEDGE_MAX_RATIO = float(os.getenv('LLM_HEDGE_MAX_RATIO', '0.1'))
+    # Threads for the hedge requests themselves; the first request never waits for one
+    LLM_HEDGE_WORKERS = int(os.getenv('LLM_HEDGE_WORKERS', '32'))
+
+    # Model health: circuit breaker and adaptive model order
+    MODEL_FAILURE_THRESHOLD = int(os.getenv('MODEL_FAILURE_THRESHOLD', '3'))
+    MODEL_CIRCUIT_COOLDOWN = float(os.getenv('MODEL_CIRCUIT_COOLDOWN', '30'))
+    MODEL_HEALTH_WINDOW = int(os.getenv('MODEL_HEALTH_WINDOW', '20'))
+    # How much cheaper a model must be to be tried ahead of the one listed before it
+    MODEL_ORDER_PREFERENCE = float(os.getenv('MODEL_ORDER_PREFERENCE', '1.5'))
+
+    # Token for the /api/admin endpoints; they are disabled when unset
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+    # Semantic routing tier (needs sentence-transformers)
+    SEMANTIC_ROUTING = os.getenv('SEMANTIC_ROUTING', 'false').lower() == 'true'
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    SEMANTIC_ROUTING_THRESHOLD = float(os.getenv('SEMANTIC_ROUTING_THRESHOLD', '0.35'))
+    SEMANTIC_ROUTING_CACHE_SIZE = int(os.getenv('SEMANTIC_ROUTING_CACHE_SIZE', '4096'))
+
+    # Most agents a single multi-intent message may fan out to
+    MAX_PARALLEL_INTENTS = int(os.getenv('MAX_PARALLEL_INTENTS', '3'))
+
+    # /api/chat/batch limits
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+    BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '16'))
+    BATCH_MAX_MESSAGES = int(os.getenv('BATCH_MAX_MESSAGES', '100'))
+
+    # Extra agent modules to register, comma separated import paths (e.g. plugins.translate_agent)
+    AGENT_MODULES = [module.strip() for module in os.getenv('AGENT_MODULES', '').split(',') if module.strip()]
+
+    # Conversation memory backend: json (in-memory store with a journal), sqlite or sharded
+    MEMORY_BACKEND = os.getenv('MEMORY_BACKEND', 'json').lower()
+    # Per-user changes are serialized by one of MEMORY_LOCK_STRIPES locks (json and sharded backends)
+    MEMORY_LOCK_STRIPES = int(os.getenv('MEMORY_LOCK_STRIPES', '64'))
+    # Sessions idle for MEMORY_SESSION_TTL_DAYS are dropped every MEMORY_CLEANUP_INTERVAL seconds
+    # (0 days turns it off), MEMORY_CLEANUP_SLICE sessions at a time
+    MEMORY_SESSION_TTL_DAYS = float(os.getenv('MEMORY_SESSION_TTL_DAYS', '0'))
+    MEMORY_CLEANUP_INTERVAL = float(os.getenv('MEMORY_CLEANUP_INTERVAL', '3600'))
+    MEMORY_CLEANUP_SLICE = int(os.getenv('MEMORY_CLEANUP_SLICE', '500'))
+    MEMORY_DB_PATH = os.getenv('MEMORY_DB_PATH', 'user_memory.sqlite3')
+    # sharded backend: one file per user, at most MEMORY_RESIDENT_USERS of them in RAM,
+    # changes written every MEMORY_FLUSH_INTERVAL seconds (0 writes every change through)
+    MEMORY_DIR = os.getenv('MEMORY_DIR', 'user_memory')
+    MEMORY_RESIDENT_USERS = int(os.getenv('MEMORY_RESIDENT_USERS', '1000'))
+    MEMORY_FLUSH_INTERVAL = float(os.getenv('MEMORY_FLUSH_INTERVAL', '1'))
+    # json backend: an append-only journal compacted into a snapshot.
+    # MEMORY_FSYNC is always (every record), batch (every MEMORY_FSYNC_INTERVAL s) or never
+    MEMORY_FILE = os.getenv('MEMORY_FILE', 'user_memory.json')
+    MEMORY_JOURNAL_FILE = os.getenv('MEMORY_JOURNAL_FILE', 'user_memory.journal.jsonl')
+    MEMORY_SNAPSHOT_FILE = os.getenv('MEMORY_SNAPSHOT_FILE', 'user_memory.snapshot.json')
+    MEMORY_FSYNC = os.getenv('MEMORY_FSYNC', 'batch').lower()
+    MEMORY_FSYNC_INTERVAL = float(os.getenv('MEMORY_FSYNC_INTERVAL', '1'))
+    MEMORY_COMPACT_BYTES = int(os.getenv('MEMORY_COMPACT_BYTES', str(8 * 1024 * 1024)))
+    # Write-behind: interactions are queued (at most MEMORY_QUEUE_SIZE) and committed by a background
+    # writer in batches of up to MEMORY_BATCH_SIZE, at most MEMORY_BATCH_DELAY seconds after they arrive
+    MEMORY_WRITE_BEHIND = os.getenv('MEMORY_WRITE_BEHIND', 'false').lower() == 'true'
+    MEMORY_QUEUE_SIZE = int(os.getenv('MEMORY_QUEUE_SIZE', '10000'))
+    MEMORY_BATCH_SIZE = int(os.getenv('MEMORY_BATCH_SIZE', '100'))
+    MEMORY_BATCH_DELAY = float(os.getenv('MEMORY_BATCH_DELAY', '0.05'))
+
+    # Logging pipeline
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    # Fraction of requests whose full messages and responses are logged
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))
+    LOG_MAX_PAYLOAD_CHARS = int(os.getenv('LOG_MAX_PAYLOAD_CHARS', '500'))
+
+    # Warm-up before /api/health reports ready: compile the graph, create every
+    # agent and (with WARMUP_CONNECTIONS) open the upstream connections
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'false').lower() == 'true'
+    WARMUP_CONNECTIONS = os.getenv('WARMUP_CONNECTIONS', 'true').lower() == 'true'
@@ -0,0 +1,28 @@
+import re
+import threading
+import numpy as np
+from utils.config import Config
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Load the sentence-transformers model once per process"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(Config.EMBEDDING_MODEL)
+    return _model
+
+
+def normalize_message(message: str) -> str:
+    return re.sub(r'\s+', ' ', message.lower()).strip()
+
+
+def embed(texts: list) -> np.ndarray:
+    """Embed texts into unit-length float32 rows, so dot products are cosine similarities"""
+    vectors = get_embedding_model().encode(texts, normalize_embeddings=True)
+    return np.asarray(vectors, dtype=np.float32)
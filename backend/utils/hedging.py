@@ -0,0 +1,61 @@
+import threading
+from collections import deque
+from utils.metrics import metrics
+
+
+class HedgePolicy:
+    """When to send a backup LLM request, and how many of them we can afford.
+
+    Each caller (agent) gets its own hedge delay: the `percentile` of its recent
+    successful call latencies, never below `min_delay`, and only once
+    `min_samples` calls have been seen. Extra load is capped by a token bucket
+    that earns `max_ratio` of a hedge per request and holds at most `burst`, so
+    over time at most that share of requests is ever sent twice.
+    """
+
+    def __init__(self, percentile: float = 0.9, window: int = 200, min_samples: int = 20,
+                 min_delay: float = 0.25, max_ratio: float = 0.1, burst: float = 5.0):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self._latencies = {}
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def observe(self, caller: str, latency: float):
+        with self._lock:
+            samples = self._latencies.get(caller)
+            if samples is None:
+                samples = self._latencies[caller] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def delay(self, caller: str):
+        """Seconds to wait before hedging this caller's request, None when there is too little data"""
+        with self._lock:
+            samples = self._latencies.get(caller)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        threshold = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+        return max(self.min_delay, threshold)
+
+    def on_request(self):
+        """Every request earns a fraction of a hedge"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.max_ratio)
+
+    def acquire(self, caller: str) -> bool:
+        """Take one hedge from the budget; False (and counted) when it is spent"""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+        metrics.inc("llm_hedges_total", help_text="Hedged LLM requests by outcome", agent=caller, outcome="over_budget")
+        return False
+
+    def record(self, caller: str, outcome: str):
+        """outcome is `won` when the hedge answered first, `lost` when the primary did"""
+        metrics.inc("llm_hedges_total", help_text="Hedged LLM requests by outcome", agent=caller, outcome=outcome)
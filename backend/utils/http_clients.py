@@ -0,0 +1,40 @@
+import asyncio
+import threading
+import httpx
+from utils.config import Config
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_async_client(service: str) -> httpx.AsyncClient:
+    """The pooled AsyncClient for one external service, created on first use.
+
+    Connections belong to the event loop that opened them, so a client is
+    shared only within one loop; a new loop (a test, a restarted server) gets
+    a fresh client.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        entry = _clients.get(service)
+        if entry is None or entry[1] is not loop:
+            client = httpx.AsyncClient(
+                timeout=Config.EXTERNAL_API_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=Config.EXTERNAL_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.EXTERNAL_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=Config.LLM_POOL_KEEPALIVE_EXPIRY
+                )
+            )
+            entry = _clients[service] = (client, loop)
+    return entry[0]
+
+
+async def close_async_clients():
+    """Close every client opened on the running loop; called at server shutdown"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        closing = [service for service, (_, client_loop) in _clients.items() if client_loop is loop]
+        clients = [_clients.pop(service)[0] for service in closing]
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,496 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, wait, as_completed
+from utils.config import Config
+from utils.metrics import metrics, span
+from utils.model_health import model_health
+from utils.hedging import HedgePolicy
+from utils.response_cache import get_response_cache, cache_key
+from utils.llm_scheduler import LLMScheduler, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class TruncatedCompletion(Exception):
+    """A streamed completion that failed after part of it had already been passed to on_token.
+
+    Falling back to another model would stream a second answer after the
+    first one's beginning, so the partial text is handed back instead, for
+    the caller to finish off and never to cache.
+    """
+
+    def __init__(self, model: str, partial: str, error: Exception):
+        super().__init__(f"{model} failed mid-stream: {error}")
+        self.model = model
+        self.partial = partial
+
+
+def stream_usage(chunk):
+    """Token usage reported by a streamed chunk; Groq sends it with the last one, under x_groq"""
+    if getattr(chunk, "usage", None) is not None:
+        return chunk.usage
+    x_groq = getattr(chunk, "x_groq", None)
+    return getattr(x_groq, "usage", None)
+
+
+class LLMCall:
+    """One completion request, the same whichever model ends up answering it"""
+
+    def __init__(self, messages: list, caller: str, temperature: float, max_tokens: int,
+                 cache_ttl: float = None, priority: str = None):
+        self.messages = messages
+        self.caller = caller
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.cache_ttl = Config.LLM_CACHE_TTL if cache_ttl is None else cache_ttl
+        self.priority = priority
+        self.tokens = estimate_tokens(messages, max_tokens)
+
+    def estimated_usage(self, content: str) -> int:
+        """Tokens the call used by the look of it, for when the API did not report them: prompt plus output"""
+        return self.tokens - self.max_tokens + len(content or "") // 4
+
+    def params(self) -> dict:
+        return {"messages": self.messages, "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def cache_key(self, model: str) -> str:
+        return cache_key(self.messages, model, self.temperature, self.max_tokens)
+
+
+class LLMClient:
+    """One Groq client pair for the whole process, on a shared keep-alive pool.
+
+    Every agent and the document processor send their completions through
+    complete()/acomplete(), so connections (and their TLS sessions) are reused
+    across callers instead of each holding a pool of its own. httpcore trace
+    events count how many requests went out and how many of them had to open
+    a new connection.
+    """
+
+    def __init__(self, models: list = None, health=None):
+        import httpx
+        from groq import Groq, AsyncGroq
+
+        self.models = list(models or Config.LLM_MODELS)
+        self.health = health or model_health
+        # Opt-in: a backup request to the next model when the first one is slow
+        self.hedging = HedgePolicy(
+            percentile=Config.LLM_HEDGE_PERCENTILE,
+            min_samples=Config.LLM_HEDGE_MIN_SAMPLES,
+            min_delay=Config.LLM_HEDGE_MIN_DELAY,
+            max_ratio=Config.LLM_HEDGE_MAX_RATIO
+        ) if Config.LLM_HEDGING else None
+        # Keeps calls within each model's requests and tokens per minute
+        self.scheduler = LLMScheduler(
+            limits=Config.LLM_RATE_LIMITS,
+            default_rpm=Config.LLM_DEFAULT_RPM,
+            default_tpm=Config.LLM_DEFAULT_TPM,
+            timeout=Config.LLM_QUEUE_TIMEOUT
+        ) if Config.LLM_SCHEDULER else None
+        self._executor = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            transport: {"requests": 0, "connections_opened": 0}
+            for transport in ("sync", "async")
+        }
+
+        limits = httpx.Limits(
+            max_connections=Config.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=Config.LLM_POOL_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(Config.LLM_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT)
+
+        def traced(transport):
+            trace = self._trace(transport)
+
+            def attach(request):
+                request.extensions["trace"] = trace
+
+            # The async transport awaits both its event hooks and its trace callback
+            async def atrace(event, info):
+                trace(event, info)
+
+            async def attach_async(request):
+                request.extensions["trace"] = atrace
+
+            return {"request": [attach_async if transport == "async" else attach]}
+
+        api_key = os.getenv('GROQ_API_KEY')
+        # base_url None keeps the SDK default
+        options = {"api_key": api_key, "base_url": Config.GROQ_BASE_URL, "max_retries": Config.LLM_MAX_RETRIES}
+        self.client = Groq(**options, http_client=httpx.Client(
+            limits=limits, timeout=timeout, event_hooks=traced("sync")
+        ))
+        self.async_client = AsyncGroq(**options, http_client=httpx.AsyncClient(
+            limits=limits, timeout=timeout, event_hooks=traced("async")
+        ))
+
+    def _trace(self, transport: str):
+        def trace(event: str, info: dict):
+            # Every request sends headers once; only a fresh connection does a TCP connect
+            if event == "http11.send_request_headers.started" or event == "http2.send_request_headers.started":
+                self._count(transport, "requests", "llm_http_requests_total",
+                            "HTTP requests sent to the LLM provider")
+            elif event == "connection.connect_tcp.complete":
+                self._count(transport, "connections_opened", "llm_http_connections_opened_total",
+                            "New connections opened to the LLM provider")
+        return trace
+
+    def _count(self, transport: str, stat: str, metric: str, help_text: str):
+        with self._stats_lock:
+            self._stats[transport][stat] += 1
+        metrics.inc(metric, help_text=help_text, transport=transport)
+
+    def stats(self) -> dict:
+        """Requests sent, connections opened and the share of requests that reused one"""
+        with self._stats_lock:
+            stats = {transport: dict(counts) for transport, counts in self._stats.items()}
+        for counts in stats.values():
+            reused = max(0, counts["requests"] - counts["connections_opened"])
+            counts["reused"] = reused
+            counts["reuse_ratio"] = round(reused / counts["requests"], 3) if counts["requests"] else 0.0
+        return stats
+
+    def _record_failure(self, model: str, call: LLMCall, error: Exception):
+        """Rate limits and unknown or retired models open the model's circuit right away"""
+        import groq
+        rate_limited = isinstance(error, groq.RateLimitError)
+        fatal = rate_limited or isinstance(error, groq.NotFoundError) or (
+            isinstance(error, groq.BadRequestError) and 'decommissioned' in str(error)
+        )
+        cooldown = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                cooldown = float(response.headers.get('retry-after', ''))
+            except ValueError:
+                pass
+        self.health.record_failure(model, f"{type(error).__name__}: {error}"[:200], fatal=fatal, cooldown=cooldown)
+        if self.scheduler:
+            if rate_limited:
+                self.scheduler.rate_limited(model)
+            else:
+                self.scheduler.settle(model, call.tokens, 0)
+
+    def _record_success(self, model: str, call: LLMCall, content: str, latency: float, usage=None):
+        logger.debug(f"[{call.caller}] Model {model} succeeded")
+        self.health.record_success(model, latency)
+        if self.hedging:
+            self.hedging.observe(call.caller, latency)
+        if self.scheduler:
+            # Streams that do not report their usage are charged an estimate of what they used
+            used = usage.total_tokens if usage is not None else call.estimated_usage(content)
+            self.scheduler.settle(model, call.tokens, used)
+        cache = get_response_cache() if call.cache_ttl else None
+        if cache and content:
+            cache.set(call.cache_key(model), call.caller, model, content, call.cache_ttl)
+
+    def _record_cancelled(self, model: str, call: LLMCall, content: str):
+        """An attempt cancelled before its outcome was known, like the slower request of a hedged call.
+
+        Neither a success nor a failure of the model, but its token reservation
+        is settled and a half-open probe claim is given back.
+        """
+        logger.debug(f"[{call.caller}] Request to {model} cancelled")
+        self.health.release(model)
+        if self.scheduler:
+            # The prompt has been sent and counts against the limit, as does whatever was generated
+            self.scheduler.settle(model, call.tokens, call.estimated_usage(content))
+
+    def _claim(self, model: str, call: LLMCall) -> bool:
+        """Claim the model for this call; False when another request is probing its half-open circuit"""
+        if self.health.claim(model):
+            return True
+        logger.debug(f"[{call.caller}] Skipping {model}, another request is probing it")
+        if self.scheduler:
+            self.scheduler.settle(model, call.tokens, 0)
+        return False
+
+    def _attempt(self, model: str, call: LLMCall, on_token=None):
+        """One call to one model: the text, or None when it failed.
+
+        Raises TruncatedCompletion when a stream fails after its first tokens.
+        """
+        if not self._claim(model, call):
+            return None
+        content = ""
+        start = time.perf_counter()
+        try:
+            logger.debug(f"[{call.caller}] Trying model: {model}")
+            with span("llm_attempt", agent=call.caller, model=model):
+                response = self.client.chat.completions.create(
+                    model=model, stream=on_token is not None, **call.params()
+                )
+                usage = None
+                if on_token is None:
+                    content = response.choices[0].message.content
+                    usage = response.usage
+                else:
+                    for chunk in response:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            content += delta
+                            on_token(delta)
+                        usage = stream_usage(chunk) or usage
+            self._record_success(model, call, content, time.perf_counter() - start, usage)
+            return content
+        except Exception as e:
+            logger.warning(f"[{call.caller}] Model {model} failed: {e}")
+            self._record_failure(model, call, e)
+            if content:
+                # Part of the answer has already been streamed to the user
+                raise TruncatedCompletion(model, content, e) from e
+            return None
+
+    async def _attempt_async(self, model: str, call: LLMCall, on_token=None):
+        if not self._claim(model, call):
+            return None
+        content = ""
+        start = time.perf_counter()
+        try:
+            logger.debug(f"[{call.caller}] Trying model: {model}")
+            with span("llm_attempt", agent=call.caller, model=model):
+                response = await self.async_client.chat.completions.create(
+                    model=model, stream=on_token is not None, **call.params()
+                )
+                usage = None
+                if on_token is None:
+                    content = response.choices[0].message.content
+                    usage = response.usage
+                else:
+                    async for chunk in response:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            content += delta
+                            on_token(delta)
+                        usage = stream_usage(chunk) or usage
+            self._record_success(model, call, content, time.perf_counter() - start, usage)
+            return content
+        except asyncio.CancelledError:
+            self._record_cancelled(model, call, content)
+            raise
+        except Exception as e:
+            logger.warning(f"[{call.caller}] Model {model} failed: {e}")
+            self._record_failure(model, call, e)
+            if content:
+                raise TruncatedCompletion(model, content, e) from e
+            return None
+
+    def _cached(self, models: list, call: LLMCall, on_token):
+        """A stored answer from any of the candidate models, preferring the first"""
+        cache = get_response_cache() if call.cache_ttl else None
+        if cache is None:
+            return None
+        # Answers stay valid while a model's circuit is open, so every model is looked up
+        candidates = models + [model for model in self.models if model not in models]
+        content = cache.get([call.cache_key(model) for model in candidates], call.caller)
+        if content is not None and on_token is not None:
+            on_token(content)
+        return content
+
+    def cached(self, messages: list, caller: str, temperature: float = 0.7, max_tokens: int = 1024,
+               cache_ttl: float = None):
+        """The exact-match cached answer complete() would return, or None; never calls a model"""
+        call = LLMCall(messages, caller, temperature, max_tokens, cache_ttl)
+        return self._cached(self.health.order(self.models, probe=False), call, None)
+
+    def _hedge_delay(self, models: list, call: LLMCall, on_token):
+        """Seconds after which to hedge this call, or None to call the models one by one"""
+        if not self.hedging or on_token is not None or len(models) < 2:
+            # Two streams would both write tokens to the client
+            return None
+        self.hedging.on_request()
+        return self.hedging.delay(call.caller)
+
+    def _admit(self, models: list, call: LLMCall):
+        """The model to call next: the first one with rate limit room, waiting for one if need be"""
+        if self.scheduler is None:
+            return models[0]
+        return self.scheduler.acquire(models, call.tokens, call.priority)
+
+    async def _admit_async(self, models: list, call: LLMCall):
+        if self.scheduler is None:
+            return models[0]
+        return await self.scheduler.acquire_async(models, call.tokens, call.priority)
+
+    def _admit_hedge(self, models: list, call: LLMCall):
+        """A model for a hedge, only if one has room right now; hedges never queue"""
+        if not self.hedging.acquire(call.caller):
+            return None
+        if self.scheduler is None:
+            return models[0]
+        return self.scheduler.try_acquire(models, call.tokens)
+
+    def complete(self, messages: list, caller: str, temperature: float = 0.7, max_tokens: int = 1024,
+                 on_token=None, cache_ttl: float = None, priority: str = None):
+        """Get a completion, trying models in health order; None when every model failed.
+
+        When on_token is given the completion is streamed and every text chunk is
+        passed to it as it arrives; the full text is still returned at the end.
+        A stream that breaks off raises TruncatedCompletion.
+
+        Answers are cached for `cache_ttl` seconds (LLM_CACHE_TTL when None, not
+        at all when 0). `priority` places the call in the rate limit queue and
+        defaults to the current request's (see llm_scheduler.priority_var).
+        """
+        call = LLMCall(messages, caller, temperature, max_tokens, cache_ttl, priority)
+        # Only looks at the order; the probe of a recovering model is claimed in _attempt
+        models = self.health.order(self.models, probe=False)
+
+        content = self._cached(models, call, on_token)
+        if content is not None:
+            return content
+
+        delay = self._hedge_delay(models, call, on_token)
+        if delay is not None:
+            content, models = self._complete_hedged(models, call, delay)
+            if content is not None:
+                return content
+
+        while models:
+            model = self._admit(models, call)
+            if model is None:
+                break
+            models = [candidate for candidate in models if candidate != model]
+            content = self._attempt(model, call, on_token)
+            if content is not None:
+                return content
+        return None
+
+    def _complete_hedged(self, models: list, call: LLMCall, delay: float) -> tuple:
+        """Call the first model and, if it is still busy after `delay`, a second one too.
+
+        Returns the first answer and the models left to fall back on. A sync call
+        cannot be interrupted, so the slower request is left to finish in the
+        background and its answer is dropped. The first request runs on a thread
+        of its own, so the hedge delay is measured from when it really starts;
+        only hedges go through the (bounded) hedge pool.
+        """
+        primary_model = self._admit(models, call)
+        if primary_model is None:
+            return None, []
+        tried = [primary_model]
+        primary = Future()
+        context = contextvars.copy_context()
+
+        def run_primary():
+            primary.set_running_or_notify_cancel()
+            try:
+                primary.set_result(context.run(self._attempt, primary_model, call))
+            except BaseException as e:
+                primary.set_exception(e)
+
+        threading.Thread(target=run_primary, name="llm-primary", daemon=True).start()
+        futures = [primary]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            hedge_model = self._admit_hedge([model for model in models if model not in tried], call)
+            if hedge_model:
+                logger.debug(f"[{call.caller}] No answer from {primary_model} after {delay:.2f}s, "
+                             f"hedging with {hedge_model}")
+                tried.append(hedge_model)
+                futures.append(self._hedge_executor().submit(
+                    contextvars.copy_context().run, self._attempt, hedge_model, call
+                ))
+
+        for future in as_completed(futures):
+            content = future.result()
+            if content is not None:
+                if len(futures) > 1:
+                    self.hedging.record(call.caller, "lost" if future is primary else "won")
+                for other in futures:
+                    other.cancel()
+                return content, []
+        return None, [model for model in models if model not in tried]
+
+    async def acomplete(self, messages: list, caller: str, temperature: float = 0.7, max_tokens: int = 1024,
+                        on_token=None, cache_ttl: float = None, priority: str = None):
+        """Async counterpart of complete(), without blocking the event loop"""
+        call = LLMCall(messages, caller, temperature, max_tokens, cache_ttl, priority)
+        # Only looks at the order; the probe of a recovering model is claimed in _attempt
+        models = self.health.order(self.models, probe=False)
+
+        content = self._cached(models, call, on_token)
+        if content is not None:
+            return content
+
+        delay = self._hedge_delay(models, call, on_token)
+        if delay is not None:
+            content, models = await self._complete_hedged_async(models, call, delay)
+            if content is not None:
+                return content
+
+        while models:
+            model = await self._admit_async(models, call)
+            if model is None:
+                break
+            models = [candidate for candidate in models if candidate != model]
+            content = await self._attempt_async(model, call, on_token)
+            if content is not None:
+                return content
+        return None
+
+    async def _complete_hedged_async(self, models: list, call: LLMCall, delay: float) -> tuple:
+        """Async counterpart of _complete_hedged; the slower request is cancelled"""
+        primary_model = await self._admit_async(models, call)
+        if primary_model is None:
+            return None, []
+        tried = [primary_model]
+        primary = asyncio.ensure_future(self._attempt_async(primary_model, call))
+        tasks = [primary]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            hedge_model = self._admit_hedge([model for model in models if model not in tried], call)
+            if hedge_model:
+                logger.debug(f"[{call.caller}] No answer from {primary_model} after {delay:.2f}s, "
+                             f"hedging with {hedge_model}")
+                tried.append(hedge_model)
+                tasks.append(asyncio.ensure_future(self._attempt_async(hedge_model, call)))
+
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    content = task.result()
+                    if content is not None:
+                        if len(tasks) > 1:
+                            self.hedging.record(call.caller, "lost" if task is primary else "won")
+                        return content, []
+            return None, [model for model in models if model not in tried]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._stats_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=Config.LLM_HEDGE_WORKERS,
+                                                        thread_name_prefix="llm-hedge")
+        return self._executor
+
+    def warm_up(self):
+        """Open a pooled connection to Groq before the first real request needs it"""
+        try:
+            self.client.models.list()
+        except Exception as e:
+            logger.warning(f"LLM client warm-up request failed: {e}")
+
+
+def get_llm_client() -> LLMClient:
+    """The process-wide LLM client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
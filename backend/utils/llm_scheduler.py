@@ -0,0 +1,199 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+import contextvars
+from utils.config import Config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "batch": 1, "document": 2}
+
+# Priority of the LLM calls made from the current request; batch and document work lower it
+priority_var = contextvars.ContextVar('llm_priority', default='interactive')
+
+# How often a queued request that is not first in line looks again
+POLL_INTERVAL = 0.02
+
+
+def estimate_tokens(messages: list, max_tokens: int) -> int:
+    """Upper bound of what a call counts against a tokens-per-minute limit"""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + len(messages) * 4 + max_tokens
+
+
+class TokenBucket:
+    """Continuously refilling allowance of `per_minute` units, holding at most a minute's worth"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 when it is available now)"""
+        self._refill(now)
+        # A request bigger than the whole bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self):
+        self.tokens = 0.0
+
+
+class LLMScheduler:
+    """Admission control for LLM calls against per-model RPM and TPM limits.
+
+    Every call first asks for a model: the scheduler hands out the most
+    preferred candidate whose request and token buckets both have room and
+    charges them, so limits are respected up front instead of being found by
+    a 429. When no candidate has room the call queues; queued calls are served
+    strictly by priority (interactive, then batch, then document) and arrival
+    order, and the head of the queue takes the first model to free up.
+    """
+
+    def __init__(self, limits: dict = None, default_rpm: float = 30, default_tpm: float = 6000,
+                 timeout: float = 30.0):
+        self.limits = limits or {}
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.timeout = timeout
+        self._buckets = {}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _model_buckets(self, model: str) -> tuple:
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            rpm, tpm = self.limits.get(model, (self.default_rpm, self.default_tpm))
+            buckets = self._buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return buckets
+
+    def _try_acquire(self, ticket: tuple, models: list, tokens: int) -> tuple:
+        """(model, 0) when a model was charged for this call, else (None, seconds to wait). Holds the lock."""
+        if self._queue[0] != ticket:
+            return None, POLL_INTERVAL
+        now = time.monotonic()
+        wait = None
+        for model in models:
+            requests, token_bucket = self._model_buckets(model)
+            model_wait = max(requests.wait_time(1, now), token_bucket.wait_time(tokens, now))
+            if model_wait == 0:
+                requests.take(1)
+                token_bucket.take(tokens)
+                heapq.heappop(self._queue)
+                self._changed.notify_all()
+                return model, 0.0
+            wait = model_wait if wait is None else min(wait, model_wait)
+        return None, wait if wait is not None else POLL_INTERVAL
+
+    def _enqueue(self, priority: str) -> tuple:
+        ticket = (PRIORITIES.get(priority, 0), next(self._sequence))
+        heapq.heappush(self._queue, ticket)
+        metrics.set_gauge("llm_queue_depth", len(self._queue), help_text="LLM calls waiting for rate limit capacity")
+        return ticket
+
+    def _leave(self, ticket: tuple):
+        """Drop a ticket that timed out or was cancelled while queued. Holds the lock."""
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._changed.notify_all()
+        metrics.set_gauge("llm_queue_depth", len(self._queue), help_text="LLM calls waiting for rate limit capacity")
+
+    def _finish(self, model, priority: str, start: float):
+        waited = time.monotonic() - start
+        metrics.observe("llm_queue_wait_seconds", waited, help_text="Time LLM calls waited for rate limit capacity",
+                        priority=priority)
+        if model is None:
+            metrics.inc("llm_queue_timeouts_total", help_text="LLM calls that gave up waiting for capacity",
+                        priority=priority)
+            logger.warning(f"No model had capacity within {self.timeout}s for a {priority} call")
+        elif waited > POLL_INTERVAL:
+            logger.debug(f"Waited {waited:.2f}s for capacity on {model}")
+
+    def acquire(self, models: list, tokens: int, priority: str = None):
+        """Block until one of `models` can take the call; that model, or None after the timeout"""
+        priority = priority or priority_var.get()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        model = None
+        with self._changed:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    model, wait = self._try_acquire(ticket, models, tokens)
+                    remaining = deadline - time.monotonic()
+                    if model or remaining <= 0:
+                        break
+                    self._changed.wait(min(wait, remaining))
+            finally:
+                self._leave(ticket)
+        self._finish(model, priority, start)
+        return model
+
+    async def acquire_async(self, models: list, tokens: int, priority: str = None):
+        """acquire() for the event loop: waits with asyncio.sleep instead of blocking"""
+        priority = priority or priority_var.get()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        model = None
+        with self._lock:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._lock:
+                    model, wait = self._try_acquire(ticket, models, tokens)
+                remaining = deadline - time.monotonic()
+                if model or remaining <= 0:
+                    break
+                await asyncio.sleep(min(wait, remaining, POLL_INTERVAL * 5))
+        finally:
+            with self._lock:
+                self._leave(ticket)
+        self._finish(model, priority, start)
+        return model
+
+    def try_acquire(self, models: list, tokens: int):
+        """Charge the first model with room right now, without queueing; None when none has"""
+        now = time.monotonic()
+        with self._lock:
+            for model in models:
+                requests, token_bucket = self._model_buckets(model)
+                if requests.wait_time(1, now) == 0 and token_bucket.wait_time(tokens, now) == 0:
+                    requests.take(1)
+                    token_bucket.take(tokens)
+                    return model
+        return None
+
+    def settle(self, model: str, reserved: int, used: int):
+        """Return the part of a token reservation the call did not use"""
+        if used < reserved:
+            with self._changed:
+                self._model_buckets(model)[1].give_back(reserved - used)
+                self._changed.notify_all()
+
+    def rate_limited(self, model: str):
+        """Upstream said 429 after all: treat the model's allowance as used up"""
+        with self._lock:
+            for bucket in self._model_buckets(model):
+                bucket.drain()
@@ -0,0 +1,121 @@
+import sys
+import copy
+import json
+import uuid
+import queue
+import atexit
+import random
+import logging
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from utils.config import Config
+from utils.metrics import metrics
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+payload_sampled_var = contextvars.ContextVar('payload_sampled', default=False)
+
+_listener = None
+_exception_formatter = logging.Formatter()
+
+
+def start_request(request_id: str = None) -> str:
+    """Tag everything logged from this context with a request ID and decide,
+    once per request, whether its verbose payloads are logged"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    payload_sampled_var.set(random.random() < Config.LOG_PAYLOAD_SAMPLE_RATE)
+    return request_id
+
+
+def truncate(value, limit: int = None):
+    """Shorten long strings, also inside dicts and lists, so payload records stay small"""
+    limit = limit or Config.LOG_MAX_PAYLOAD_CHARS
+    if isinstance(value, str):
+        if len(value) <= limit:
+            return value
+        return value[:limit] + f"...(+{len(value) - limit} chars)"
+    if isinstance(value, dict):
+        return {key: truncate(item, limit) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [truncate(item, limit) for item in value]
+    return value
+
+
+def log_payload(logger: logging.Logger, message: str, payload):
+    """Log a request/response payload, only for sampled requests and truncated"""
+    if payload_sampled_var.get():
+        logger.info(message, extra={"payload": truncate(payload)})
+
+
+class RequestIdFilter(logging.Filter):
+    """Runs in the calling thread, where the request's context variables are set"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        if getattr(record, "payload", None) is not None:
+            entry["payload"] = record.payload
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Never blocks a request thread: records are dropped (and counted) when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolve the message and render the traceback in the calling thread, keeping them apart.
+
+        QueueHandler.prepare would fold the traceback into the message, which
+        leaves JsonFormatter nothing to put in its "exception" field.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total", help_text="Log records dropped because the log queue was full")
+
+
+def setup_logging():
+    """Route all logging through a bounded queue drained by a background writer thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(Config.LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(_listener.stop)
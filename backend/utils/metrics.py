@@ -0,0 +1,131 @@
+import time
+import asyncio
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "agent_platform"
+
+# Latency buckets in seconds, from in-process work up to slow LLM completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(label_key: tuple, extra: tuple = ()) -> str:
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escape = lambda value: value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """In-process counters, gauges and latency histograms rendered in Prometheus text format"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+
+    def _name(self, name: str) -> str:
+        return f"{METRIC_PREFIX}_{name}"
+
+    def inc(self, name: str, value: float = 1, help_text: str = "", **labels):
+        name = self._name(name)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def set_gauge(self, name: str, value: float, help_text: str = "", **labels):
+        name = self._name(name)
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def observe(self, name: str, value: float, help_text: str = "", **labels):
+        name = self._name(name)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def get(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge series (0 when it was never set)"""
+        name = self._name(name)
+        key = _label_key(labels)
+        with self._lock:
+            for family in (self._counters, self._gauges):
+                if name in family:
+                    return family[name].get(key, 0)
+        return 0
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for kind, family in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(family):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in family[name].items():
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in self._histograms[name].items():
+                    for bound, count in zip(self.buckets, histogram["buckets"]):
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', str(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {histogram['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram['sum']}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block of work into the `<name>_seconds` histogram.
+
+    An `outcome` label records whether the block raised, so the histogram's
+    _count series doubles as a success/error counter per label set.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe(f"{name}_seconds", elapsed, help_text=f"Duration of {name.replace('_', ' ')} spans",
+                        outcome=outcome, **labels)
+        logger.debug(f"span {name} {labels} {outcome} {elapsed * 1000:.1f}ms")
@@ -0,0 +1,199 @@
+import time
+import logging
+import threading
+from collections import deque
+from utils.config import Config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values for the circuit state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ModelHealth:
+    """Recent outcomes, latency and circuit state of one model"""
+
+    def __init__(self, model: str, window: int):
+        self.model = model
+        self.outcomes = deque(maxlen=window)
+        self.latency = None
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.probe_started = None
+        self.last_error = None
+
+    def success_rate(self) -> float:
+        """Share of recent calls that succeeded, smoothed so one call is not the whole story"""
+        return (sum(self.outcomes) + 1) / (len(self.outcomes) + 2)
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "model": self.model,
+            "state": self.state,
+            "success_rate": round(self.success_rate(), 3),
+            "recent_calls": len(self.outcomes),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "reopens_in_s": round(max(0.0, self.open_until - now), 1) if self.state == OPEN else 0.0,
+            "last_error": self.last_error
+        }
+
+
+class ModelHealthTracker:
+    """Shared record of how every model has been doing, used to pick the call order.
+
+    A model whose calls fail `failure_threshold` times in a row (or once, for
+    errors that will not go away by retrying, such as a rate limit or a
+    decommissioned model) has its circuit opened: it is skipped for `cooldown`
+    seconds, after which a single request tries it first to decide whether to
+    close the circuit again. That request claims the probe with claim() right
+    before it calls the model, so a call answered from a cache, or sent to a
+    different model, never uses up the probe.
+
+    The remaining models are ordered by expected cost, smoothed latency divided
+    by recent success rate. Each step down the configured list multiplies that
+    cost by `preference`, so a fallback model has to be clearly faster or more
+    reliable before it is tried ahead of a preferred one.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0, window: int = 20,
+                 latency_alpha: float = 0.2, preference: float = 1.5):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.window = window
+        self.latency_alpha = latency_alpha
+        self.preference = preference
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _health(self, model: str) -> ModelHealth:
+        health = self._models.get(model)
+        if health is None:
+            health = self._models[model] = ModelHealth(model, self.window)
+        return health
+
+    def order(self, models: list, probe: bool = True) -> list:
+        """Models to try, best first, leaving out those whose circuit is open.
+
+        When every circuit is open the one that reopens soonest is still
+        returned, so callers are never left without a model to try. With
+        `probe` off the order is only looked at, no half-open probe is claimed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            healths = [self._health(model) for model in models]
+            known = [health.latency for health in healths if health.latency is not None]
+            # Models without a latency yet are assumed to be typical
+            default_latency = sorted(known)[len(known) // 2] if known else 1.0
+
+            candidates = []
+            for position, health in enumerate(healths):
+                if health.state == OPEN and now >= health.open_until:
+                    health.state = HALF_OPEN
+                    health.probe_started = None
+                if health.state == OPEN:
+                    continue
+                probing = health.state == HALF_OPEN
+                if probing:
+                    if health.probe_started is not None and now - health.probe_started < self.cooldown:
+                        continue  # Another request is already probing it
+                    if probe:
+                        health.probe_started = now
+                latency = health.latency if health.latency is not None else default_latency
+                cost = latency / health.success_rate() * self.preference ** position
+                # The probe goes first, otherwise a healthy model would answer and it never runs
+                candidates.append((not probing, cost, position, health.model))
+
+            if not candidates:
+                soonest = min(healths, key=lambda health: health.open_until)
+                return [soonest.model]
+        return [candidate[-1] for candidate in sorted(candidates)]
+
+    def claim(self, model: str) -> bool:
+        """Whether a call to the model may go ahead now; a half-open model takes one probe at a time.
+
+        An open model is let through: order() only returns one when every
+        circuit is open and something has to be tried.
+        """
+        now = time.monotonic()
+        with self._lock:
+            health = self._health(model)
+            if health.state == OPEN and now >= health.open_until:
+                health.state = HALF_OPEN
+                health.probe_started = None
+            if health.state == HALF_OPEN:
+                if health.probe_started is not None and now - health.probe_started < self.cooldown:
+                    return False
+                health.probe_started = now
+            return True
+
+    def release(self, model: str):
+        """Give back a claim whose call was abandoned without an outcome, so another request can probe"""
+        with self._lock:
+            health = self._health(model)
+            if health.state == HALF_OPEN:
+                health.probe_started = None
+
+    def record_success(self, model: str, latency: float):
+        with self._lock:
+            health = self._health(model)
+            health.outcomes.append(1)
+            health.consecutive_failures = 0
+            if health.latency is None:
+                health.latency = latency
+            else:
+                health.latency += self.latency_alpha * (latency - health.latency)
+            if health.state != CLOSED:
+                logger.info(f"Circuit for model {model} closed")
+            health.state = CLOSED
+            health.probe_started = None
+        self._export(health)
+
+    def record_failure(self, model: str, error: str = None, fatal: bool = False, cooldown: float = None):
+        """Count a failed call; `fatal` opens the circuit at once, for `cooldown` if given"""
+        with self._lock:
+            health = self._health(model)
+            health.outcomes.append(0)
+            health.consecutive_failures += 1
+            health.last_error = error
+            if fatal or health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                health.state = OPEN
+                health.open_until = time.monotonic() + max(cooldown or 0.0, self.cooldown)
+                health.probe_started = None
+                logger.warning(f"Circuit for model {model} opened: {error}")
+        self._export(health)
+
+    def reset(self, model: str = None):
+        """Forget the history of one model (or all of them), closing its circuit"""
+        with self._lock:
+            models = [model] if model else list(self._models)
+            for name in models:
+                self._models[name] = ModelHealth(name, self.window)
+        for name in models:
+            self._export(self._models[name])
+
+    def snapshot(self, models: list = None) -> list:
+        now = time.monotonic()
+        with self._lock:
+            names = models or list(self._models)
+            return [self._health(model).snapshot(now) for model in names]
+
+    def _export(self, health: ModelHealth):
+        metrics.set_gauge("model_circuit_state", STATE_VALUES[health.state],
+                          help_text="Circuit state per model (0 closed, 1 half open, 2 open)", model=health.model)
+        metrics.set_gauge("model_success_rate", health.success_rate(),
+                          help_text="Smoothed recent success rate per model", model=health.model)
+
+
+model_health = ModelHealthTracker(
+    failure_threshold=Config.MODEL_FAILURE_THRESHOLD,
+    cooldown=Config.MODEL_CIRCUIT_COOLDOWN,
+    window=Config.MODEL_HEALTH_WINDOW,
+    preference=Config.MODEL_ORDER_PREFERENCE
+)
@@ -0,0 +1,116 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from utils.config import Config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache_key(messages: list, model: str, temperature: float, max_tokens: int) -> str:
+    """Hash of everything that decides a completion: system message, prompt, model and sampling settings"""
+    payload = json.dumps([messages, model, temperature, max_tokens], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Exact-match LLM response cache in a local SQLite file.
+
+    Entries expire after the TTL they were stored with, and once the table
+    holds more than `max_entries` rows the least recently used ones are
+    evicted. Lookups and writes are a single indexed statement each, so they
+    run inline, also on the event loop.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                agent TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, keys: list, agent: str):
+        """The cached response of the first key with a live entry, or None"""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                row = self._db.execute(
+                    "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                if row[1] <= now:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._entries -= 1
+                    continue
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                metrics.inc("llm_cache_requests_total", help_text="LLM response cache lookups",
+                            agent=agent, result="hit")
+                return row[0]
+        metrics.inc("llm_cache_requests_total", help_text="LLM response cache lookups", agent=agent, result="miss")
+        return None
+
+    def set(self, key: str, agent: str, model: str, response: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            # Only a new key adds an entry; replacing one must not grow the count
+            inserted = self._db.execute(
+                "INSERT INTO responses (key, agent, model, response, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO NOTHING",
+                (key, agent, model, response, now + ttl, now)
+            ).rowcount
+            if not inserted:
+                self._db.execute(
+                    "UPDATE responses SET agent = ?, model = ?, response = ?, expires_at = ?, last_used = ? "
+                    "WHERE key = ?",
+                    (agent, model, response, now + ttl, now, key)
+                )
+            self._entries += inserted
+            if self._entries > self.max_entries:
+                self._evict()
+            metrics.set_gauge("llm_cache_entries", self._entries, help_text="Entries in the LLM response cache")
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used ones down to 90% of the bound"""
+        expired = self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+        self._entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = self._entries - int(self.max_entries * 0.9)
+        evicted = 0
+        if excess > 0:
+            evicted = self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (excess,)
+            ).rowcount
+            self._entries -= evicted
+        metrics.inc("llm_cache_evictions_total", expired + evicted, help_text="LLM response cache evictions")
+        logger.debug(f"Response cache evicted {expired} expired and {evicted} least recently used entries")
+
+
+def get_response_cache():
+    """The process-wide response cache, or None when LLM_CACHE is off"""
+    global _cache
+    if not Config.LLM_CACHE:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(Config.LLM_CACHE_PATH, Config.LLM_CACHE_MAX_ENTRIES)
+    return _cache
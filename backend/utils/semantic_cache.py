@@ -0,0 +1,113 @@
+import time
+import logging
+import threading
+import numpy as np
+from utils.config import Config
+from utils.metrics import metrics
+from utils.embeddings import embed, normalize_message
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class AgentIndex:
+    """Fixed-capacity matrix of question embeddings with their answers, for one agent"""
+
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity)
+        self.responses = [None] * capacity
+        self.size = 0
+
+    def search(self, vector: np.ndarray, now: float) -> tuple:
+        """(similarity, response) of the closest live entry, or (-1, None)"""
+        if not self.size:
+            return -1.0, None
+        scores = self.vectors[:self.size] @ vector
+        scores[self.expires_at[:self.size] <= now] = -1.0
+        best = int(np.argmax(scores))
+        if scores[best] < 0:
+            return -1.0, None
+        return float(scores[best]), self.responses[best]
+
+    def add(self, vector: np.ndarray, response: str, expires_at: float):
+        if self.size < len(self.vectors):
+            slot = self.size
+            self.size += 1
+        else:
+            # Full: overwrite whatever expires first, expired entries included
+            slot = int(np.argmin(self.expires_at))
+        self.vectors[slot] = vector
+        self.expires_at[slot] = expires_at
+        self.responses[slot] = response
+
+
+class SemanticCache:
+    """Answers near-duplicate questions from earlier answers of the same agent.
+
+    Questions are normalized and embedded; a new question whose cosine
+    similarity with a stored one reaches `threshold` gets the stored answer.
+    Every agent has its own small index, so a poem is never served for a code
+    question, and each index holds at most `capacity` entries for `ttl` seconds.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 3600, capacity: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.capacity = capacity
+        self._indexes = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return embed([normalize_message(query)])[0]
+
+    def lookup(self, agent: str, vector: np.ndarray):
+        with self._lock:
+            index = self._indexes.get(agent)
+            score, response = index.search(vector, time.time()) if index else (-1.0, None)
+            hit = response is not None and score >= self.threshold
+            stats = self._stats.setdefault(agent, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+            hit_rate = stats["hits"] / (stats["hits"] + stats["misses"])
+        metrics.inc("semantic_cache_requests_total", help_text="Semantic response cache lookups",
+                    agent=agent, result="hit" if hit else "miss")
+        metrics.set_gauge("semantic_cache_hit_ratio", hit_rate,
+                          help_text="Share of semantic cache lookups answered from the cache", agent=agent)
+        if hit:
+            logger.debug(f"[{agent}] Semantic cache hit (similarity {score:.3f})")
+            return response
+        return None
+
+    def store(self, agent: str, vector: np.ndarray, response: str):
+        with self._lock:
+            index = self._indexes.get(agent)
+            if index is None:
+                index = self._indexes[agent] = AgentIndex(self.capacity, len(vector))
+            index.add(vector, response, time.time() + self.ttl)
+
+    def stats(self) -> dict:
+        """Hits, misses and hit rate per agent"""
+        with self._lock:
+            return {
+                agent: {**counts, "hit_rate": round(counts["hits"] / max(1, counts["hits"] + counts["misses"]), 3)}
+                for agent, counts in self._stats.items()
+            }
+
+
+def get_semantic_cache():
+    """The process-wide semantic cache, or None when SEMANTIC_CACHE is off"""
+    global _cache
+    if not Config.SEMANTIC_CACHE:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(
+                    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+                    ttl=Config.SEMANTIC_CACHE_TTL,
+                    capacity=Config.SEMANTIC_CACHE_CAPACITY
+                )
+    return _cache
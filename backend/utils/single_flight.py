@@ -0,0 +1,116 @@
+import json
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from utils.config import Config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderCancelled(Exception):
+    """The call everyone was waiting on was cancelled before it finished"""
+
+
+def payload_key(payload) -> str:
+    """Canonical form of a request payload: key order and runs of whitespace do not matter"""
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        return value
+    return json.dumps(normalize(payload), ensure_ascii=False, sort_keys=True)
+
+
+class SingleFlight:
+    """Lets identical concurrent calls share one upstream call.
+
+    The first caller for a key (the leader) runs the call; anyone asking for
+    the same key before it returns waits for that result instead of making
+    their own call, and gets the leader's exception if it raised. Nothing is
+    kept once the call returns, so this only collapses calls that overlap in
+    time; caching answers is left to the caches.
+
+    Sync and async callers share the same flights: an async request can wait
+    on a call a worker thread is making and the other way round.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, name: str, key: str) -> tuple:
+        """(future, whether this caller leads)"""
+        with self._lock:
+            future = self._flights.get((name, key))
+            leader = future is None
+            if leader:
+                future = self._flights[(name, key)] = Future()
+        metrics.inc("single_flight_calls_total", help_text="Calls that went through single flight", call=name)
+        if not leader:
+            metrics.inc("single_flight_collapsed_total", help_text="Calls that shared another caller's in-flight call",
+                        call=name)
+        return future, leader
+
+    def _land(self, name: str, key: str, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            self._flights.pop((name, key), None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, name: str, key: str, fn) -> tuple:
+        """(fn()'s result, whether it was shared with an earlier caller); `name` labels the metrics"""
+        if not Config.SINGLE_FLIGHT:
+            return fn(), False
+        future, leader = self._join(name, key)
+        if not leader:
+            try:
+                return future.result(), True
+            except LeaderCancelled:
+                return fn(), False
+        try:
+            result = fn()
+        except Exception as e:
+            self._land(name, key, future, error=e)
+            raise
+        except BaseException:
+            self._land(name, key, future, error=LeaderCancelled())
+            raise
+        self._land(name, key, future, result)
+        return result, False
+
+    async def do_async(self, name: str, key: str, coroutine_fn) -> tuple:
+        """do() for coroutines: `coroutine_fn()` is only awaited by the leader"""
+        if not Config.SINGLE_FLIGHT:
+            return await coroutine_fn(), False
+        future, leader = self._join(name, key)
+        if not leader:
+            try:
+                # A follower that is cancelled must not cancel the call the others wait for
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except LeaderCancelled:
+                return await coroutine_fn(), False
+        try:
+            result = await coroutine_fn()
+        except Exception as e:
+            self._land(name, key, future, error=e)
+            raise
+        except BaseException:
+            # Cancelled: the followers make their own call
+            self._land(name, key, future, error=LeaderCancelled())
+            raise
+        self._land(name, key, future, result)
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+single_flight = SingleFlight()
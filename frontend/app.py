@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import time
 
 # Configuration
@@ -45,6 +46,22 @@ def make_api_call(url, method='POST', json_data=None, files=None):
         print(f"❌ API call failed: {str(e)}")
         return None, False
 
+def stream_chat(message):
+    """Yield (event, data) pairs from the backend's Server-Sent-Events chat endpoint"""
+    with requests.post(
+        f"{BACKEND_URL}/chat/stream",
+        json={"session_id": st.session_state.session_id, "message": message},
+        stream=True,
+        timeout=60
+    ) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event:
+                yield event, json.loads(line[len("data: "):])
+
 def main():
     st.set_page_config(
         page_title="AI Agent Platform",
@@ -193,36 +210,41 @@ def render_chat_interface():
         # Mark as processing
         st.session_state.processing = True
         
-        # Add to chat history with thinking placeholder
+        with st.chat_message("user"):
+            st.write(current_message)
+        
+        # Stream the answer; the agent is known as soon as routing is done
+        with st.chat_message("assistant"):
+            caption = st.empty()
+            placeholder = st.empty()
+            placeholder.write("Thinking... 🤖")
+            response_text = ""
+            agent_used = "Unknown"
+            # Multi-intent messages stream several agents at once
+            agent_texts = {}
+            try:
+                for event, data in stream_chat(current_message):
+                    if event == "agent":
+                        agent_used = data["agent_used"]
+                        caption.caption(f"🤖 Agent: {agent_used}")
+                    elif event == "token":
+                        agent_texts[data["agent"]] = agent_texts.get(data["agent"], "") + data["text"]
+                        response_text = "\n\n".join(agent_texts.values())
+                        placeholder.write(response_text)
+                    elif event in ("done", "error"):
+                        response_text = data.get("response", response_text)
+                        agent_used = data.get("agent_used", agent_used)
+            except Exception as e:
+                print(f"❌ Streaming chat failed: {str(e)}")
+                response_text = "❌ Failed to get response from AI agent. Please try again."
+                agent_used = "Error"
+        
         st.session_state.chat_history.append({
             "user": current_message,
-            "agent": "Thinking... 🤖",
-            "agent_used": "Processing"
+            "agent": response_text or "No response received",
+            "agent_used": agent_used
         })
         
-        # Make API call
-        result, success = make_api_call(
-            f"{BACKEND_URL}/chat",
-            json_data={
-                "session_id": st.session_state.session_id,
-                "message": current_message
-            }
-        )
-        
-        # Update chat history with actual response
-        if success:
-            st.session_state.chat_history[-1] = {
-                "user": current_message,
-                "agent": result.get("response", "No response received"),
-                "agent_used": result.get("agent_used", "Unknown")
-            }
-        else:
-            st.session_state.chat_history[-1] = {
-                "user": current_message,
-                "agent": "❌ Failed to get response from AI agent. Please try again.",
-                "agent_used": "Error"
-            }
-        
         # Move message from pending to processed
         st.session_state.pending_messages.pop(0)
         st.session_state.processed_messages.add(current_message)